@@ -0,0 +1,545 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+archivo_frio.py
+
+Archivo en frío de transacciones antiguas en archivos Parquet.
+
+archivar_transacciones() mueve por lotes las transacciones con fecha anterior
+a un corte desde MySQL a archivos Parquet comprimidos (zstd), particionados
+por fecha en carpetas estilo Hive:
+
+    archivo_transacciones/anio=2021/mes=03/part-000000001234.parquet
+
+Cada lote se escribe primero en disco (archivo temporal + rename) y luego,
+en una sola transacción de MySQL, se borran sus filas, se registran sus
+archivos en archivo_manifiesto y se avanza la marca `ultimo_id` en la tabla
+archivo_estado. Al leer solo se abren los archivos del manifiesto: los que
+dejó un lote interrumpido antes de confirmarse se ignoran (y la siguiente
+corrida los elimina), así que ninguna fila se cuenta dos veces.
+
+preparar_archivo() crea las tablas de control; se ejecuta una vez, al
+archivar, y las lecturas no ejecutan DDL.
+
+Los reportes que abarcan el corte combinan el archivo (leído con pyarrow y
+filtros empujados a las particiones y estadísticas de Parquet) con la tabla
+viva: el top de clientes, el ranking y la red de transferencias. El libro
+mayor no lee el archivo: archivar_transacciones() se niega a archivar más
+allá del último checkpoint de saldo_checkpoint, y construir_checkpoints()
+reconstruye a partir del checkpoint que cubre lo archivado. Requiere pyarrow
+(dependencia opcional).
+"""
+from typing import List, Dict, Optional, Iterable
+from decimal import Decimal
+import datetime as dt
+import os
+from database import get_connection
+
+
+ARCHIVO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'archivo_transacciones')
+
+CREAR_TABLA_ESTADO = """
+    CREATE TABLE IF NOT EXISTS archivo_estado (
+        tabla VARCHAR(64) NOT NULL PRIMARY KEY,
+        ultimo_id BIGINT NOT NULL,
+        fecha_max DATETIME NULL
+    )
+"""
+
+CREAR_TABLA_MANIFIESTO = """
+    CREATE TABLE IF NOT EXISTS archivo_manifiesto (
+        ruta VARCHAR(255) NOT NULL PRIMARY KEY,
+        id_desde BIGINT NOT NULL,
+        id_hasta BIGINT NOT NULL,
+        filas INT NOT NULL,
+        KEY idx_hasta (id_hasta)
+    )
+"""
+
+# Error de MySQL cuando una tabla no existe (nunca se archivó nada)
+ER_NO_SUCH_TABLE = 1146
+
+COLUMNAS = ['id_transaccion', 'id_cuenta_origen', 'id_cuenta_destino',
+            'monto', 'fecha', 'tipo', 'descripcion']
+
+
+def _pyarrow():
+    """Importa pyarrow o informa cómo instalarlo."""
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.dataset
+        import pyarrow.parquet
+        return pyarrow
+    except ImportError as e:
+        raise ImportError("El archivo en frío requiere pyarrow: "
+                          "pip install pyarrow") from e
+
+
+def _esquema(pa):
+    """Esquema Arrow de las transacciones archivadas."""
+    return pa.schema([
+        ('id_transaccion', pa.int64()),
+        ('id_cuenta_origen', pa.int32()),
+        ('id_cuenta_destino', pa.int32()),
+        ('monto', pa.decimal128(15, 2)),
+        ('fecha', pa.timestamp('s')),
+        ('tipo', pa.string()),
+        ('descripcion', pa.string()),
+    ])
+
+
+def preparar_archivo(host: str = None, port: int = None,
+                     user: str = None, password: str = None,
+                     database: str = None) -> None:
+    """Crea las tablas de control del archivo (archivo_estado y archivo_manifiesto)."""
+    conn = get_connection(host, port, user, password, database)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(CREAR_TABLA_ESTADO)
+        cursor.execute(CREAR_TABLA_MANIFIESTO)
+        cursor.execute("""
+            INSERT IGNORE INTO archivo_estado (tabla, ultimo_id, fecha_max)
+            VALUES ('transaccion', 0, NULL)
+        """)
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def estado_archivo(host: str = None, port: int = None,
+                   user: str = None, password: str = None,
+                   database: str = None) -> Dict:
+    """Retorna la marca del archivo: {'ultimo_id': int, 'fecha_max': datetime}.
+
+    Si nunca se archivó nada, ultimo_id es 0 y fecha_max None.
+    """
+    conn = get_connection(host, port, user, password, database)
+    cursor = conn.cursor()
+    try:
+        try:
+            cursor.execute("SELECT ultimo_id, fecha_max FROM archivo_estado "
+                           "WHERE tabla = 'transaccion'")
+        except Exception as e:
+            if getattr(e, 'errno', None) != ER_NO_SUCH_TABLE:
+                raise
+            return {'ultimo_id': 0, 'fecha_max': None}
+        fila = cursor.fetchone()
+        if not fila:
+            return {'ultimo_id': 0, 'fecha_max': None}
+        return {'ultimo_id': fila[0], 'fecha_max': fila[1]}
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def archivos_confirmados(ultimo_id: int, host: str = None, port: int = None,
+                         user: str = None, password: str = None,
+                         database: str = None) -> List[str]:
+    """Rutas absolutas de los archivos del manifiesto hasta la marca ultimo_id."""
+    conn = get_connection(host, port, user, password, database)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT ruta FROM archivo_manifiesto WHERE id_hasta <= %s",
+                       (ultimo_id,))
+        return [os.path.join(ARCHIVO_DIR, ruta) for (ruta,) in cursor.fetchall()]
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _registrar_previos(pa, cursor) -> int:
+    """Registra en el manifiesto los archivos escritos antes de que existiera.
+
+    Solo actúa con el manifiesto vacío y una marca ya avanzada; se registran
+    los archivos cuyas filas quedan todas por debajo de la marca (los demás
+    son de lotes no confirmados).
+    """
+    cursor.execute("SELECT COUNT(*) FROM archivo_manifiesto")
+    if cursor.fetchone()[0] or not os.path.isdir(ARCHIVO_DIR):
+        return 0
+    cursor.execute("SELECT ultimo_id FROM archivo_estado WHERE tabla = 'transaccion'")
+    (ultimo_id,) = cursor.fetchone()
+    previos = []
+    for carpeta, _, nombres in os.walk(ARCHIVO_DIR):
+        for nombre in nombres:
+            if nombre.startswith('.') or not nombre.endswith('.parquet'):
+                continue
+            ruta = os.path.join(carpeta, nombre)
+            ids = pa.parquet.read_table(ruta, columns=['id_transaccion']).column(0)
+            if len(ids) and pa.compute.max(ids).as_py() <= ultimo_id:
+                previos.append((os.path.relpath(ruta, ARCHIVO_DIR).replace(os.sep, '/'),
+                                pa.compute.min(ids).as_py(), pa.compute.max(ids).as_py(),
+                                len(ids)))
+    if previos:
+        cursor.executemany("""
+            INSERT INTO archivo_manifiesto (ruta, id_desde, id_hasta, filas)
+            VALUES (%s, %s, %s, %s)
+        """, previos)
+    return len(previos)
+
+
+def _limpiar_huerfanos(cursor) -> int:
+    """Elimina los Parquet que no figuran en el manifiesto (lotes no confirmados)."""
+    if not os.path.isdir(ARCHIVO_DIR):
+        return 0
+    cursor.execute("SELECT ruta FROM archivo_manifiesto")
+    confirmados = {ruta for (ruta,) in cursor.fetchall()}
+    eliminados = 0
+    for carpeta, _, nombres in os.walk(ARCHIVO_DIR):
+        for nombre in nombres:
+            ruta = os.path.relpath(os.path.join(carpeta, nombre), ARCHIVO_DIR)
+            if ruta.replace(os.sep, '/') not in confirmados:
+                os.remove(os.path.join(carpeta, nombre))
+                eliminados += 1
+    if eliminados:
+        print(f"🧹 {eliminados} archivos de lotes no confirmados eliminados")
+    return eliminados
+
+
+def _escribir_lote(pa, filas: List[tuple]) -> List[tuple]:
+    """Escribe un lote en un archivo Parquet por cada (año, mes).
+
+    Returns:
+        List[tuple]: (ruta relativa, id_desde, id_hasta, filas) de cada archivo
+    """
+    pq = pa.parquet
+    grupos: Dict[tuple, List[tuple]] = {}
+    for fila in filas:
+        fecha = fila[4]
+        grupos.setdefault((fecha.year, fecha.month), []).append(fila)
+
+    esquema = _esquema(pa)
+    escritos = []
+    for (anio, mes), grupo in grupos.items():
+        carpeta = os.path.join(ARCHIVO_DIR, f"anio={anio}", f"mes={mes:02d}")
+        os.makedirs(carpeta, exist_ok=True)
+        nombre = f"part-{grupo[0][0]:012d}.parquet"
+        destino = os.path.join(carpeta, nombre)
+        # El prefijo '.' hace que pyarrow ignore temporales abandonados
+        temporal = os.path.join(carpeta, f".{nombre}.tmp")
+
+        columnas = list(zip(*grupo))
+        tabla = pa.table([pa.array(columnas[i], type=esquema.field(i).type)
+                          for i in range(len(COLUMNAS))], schema=esquema)
+        pq.write_table(tabla, temporal, compression='zstd')
+        with open(temporal, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(temporal, destino)
+        escritos.append((f"anio={anio}/mes={mes:02d}/{nombre}",
+                         grupo[0][0], grupo[-1][0], len(grupo)))
+    return escritos
+
+
+def archivar_transacciones(corte, tam_lote: int = 50_000,
+                           host: str = None, port: int = None,
+                           user: str = None, password: str = None,
+                           database: str = None) -> int:
+    """Mueve a Parquet las transacciones con fecha anterior al corte.
+
+    El corte no puede ser posterior al último corte de saldo_checkpoint
+    (libro_mayor.construir_checkpoints()): los saldos reproducidos de las
+    filas archivadas quedan en esos checkpoints, que el libro mayor, la
+    conciliación y los extractos usan en lugar de la tabla viva.
+
+    Args:
+        corte: Fecha límite (exclusiva); se archivan las filas con fecha < corte
+        tam_lote: Filas por lote (un lote = archivos + una transacción MySQL)
+        host: Servidor MySQL (opcional)
+        port: Puerto MySQL (opcional)
+        user: Usuario MySQL (opcional)
+        password: Contraseña MySQL (opcional)
+        database: Base de datos (opcional)
+
+    Returns:
+        int: Cantidad de transacciones archivadas (-1 si hubo error)
+
+    Ejemplo:
+        >>> archivar_transacciones(dt.date(2022, 1, 1))
+        2950
+    """
+    try:
+        pa = _pyarrow()
+        conn = get_connection(host, port, user, password, database)
+        cursor = conn.cursor()
+        ultimo_checkpoint = _ultimo_checkpoint(cursor)
+        limite = corte.date() if isinstance(corte, dt.datetime) else corte
+        if isinstance(limite, str):
+            limite = dt.date.fromisoformat(limite[:10])
+        if ultimo_checkpoint is None or limite > ultimo_checkpoint:
+            print(f"❌ No se archiva hasta {corte}: el último checkpoint de saldos es "
+                  f"{ultimo_checkpoint or 'inexistente'}; ejecute antes "
+                  f"libro_mayor.construir_checkpoints()")
+            cursor.close()
+            conn.close()
+            return -1
+        preparar_archivo(host, port, user, password, database)
+        _registrar_previos(pa, cursor)
+        conn.commit()
+        _limpiar_huerfanos(cursor)
+
+        total = 0
+        while True:
+            cursor.execute("SELECT ultimo_id FROM archivo_estado "
+                           "WHERE tabla = 'transaccion'")
+            (ultimo_id,) = cursor.fetchone()
+
+            cursor.execute(f"""
+                SELECT {', '.join(COLUMNAS)}
+                FROM transaccion
+                WHERE fecha < %s AND id_transaccion > %s
+                ORDER BY id_transaccion
+                LIMIT %s
+            """, (corte, ultimo_id, tam_lote))
+            filas = cursor.fetchall()
+            if not filas:
+                break
+
+            escritos = _escribir_lote(pa, filas)
+
+            primero, ultimo = filas[0][0], filas[-1][0]
+            fecha_max = max(f[4] for f in filas)
+            cursor.execute("""
+                DELETE FROM transaccion
+                WHERE id_transaccion BETWEEN %s AND %s AND fecha < %s
+            """, (primero, ultimo, corte))
+            cursor.execute("""
+                UPDATE archivo_estado
+                SET ultimo_id = %s,
+                    fecha_max = GREATEST(COALESCE(fecha_max, %s), %s)
+                WHERE tabla = 'transaccion'
+            """, (ultimo, fecha_max, fecha_max))
+            cursor.executemany("""
+                INSERT INTO archivo_manifiesto (ruta, id_desde, id_hasta, filas)
+                VALUES (%s, %s, %s, %s)
+            """, escritos)
+            conn.commit()
+            total += len(filas)
+
+        cursor.close()
+        conn.close()
+        return total
+
+    except Exception as e:
+        print(f"❌ Error en archivar_transacciones: {e}")
+        return -1
+
+
+def _ultimo_checkpoint(cursor) -> Optional[dt.date]:
+    """Último corte de saldo_checkpoint (None si no hay checkpoints)."""
+    try:
+        cursor.execute("SELECT MAX(corte) FROM saldo_checkpoint")
+    except Exception as e:
+        if getattr(e, 'errno', None) != ER_NO_SUCH_TABLE:
+            raise
+        return None
+    return cursor.fetchone()[0]
+
+
+def transferencias_archivadas(desde=None, hasta=None, ultimo_id: Optional[int] = None,
+                              host: str = None, port: int = None,
+                              user: str = None, password: str = None,
+                              database: str = None):
+    """Transferencias archivadas (con destino) dentro de una ventana.
+
+    Args:
+        desde: Fecha mínima (inclusiva, opcional)
+        hasta: Fecha máxima (exclusiva, opcional)
+        ultimo_id: Marca del archivo (si es None se lee de archivo_estado)
+        host: Servidor MySQL (opcional)
+        port: Puerto MySQL (opcional)
+        user: Usuario MySQL (opcional)
+        password: Contraseña MySQL (opcional)
+        database: Base de datos (opcional)
+
+    Returns:
+        pyarrow.Table: Columnas id_cuenta_origen, id_cuenta_destino y monto
+            (None si no hay nada archivado)
+    """
+    if not os.path.isdir(ARCHIVO_DIR):
+        return None
+    if ultimo_id is None:
+        ultimo_id = estado_archivo(host, port, user, password, database)['ultimo_id']
+    archivos = archivos_confirmados(ultimo_id, host, port, user, password, database)
+    if not archivos:
+        return None
+    pa = _pyarrow()
+    ds = pa.dataset
+
+    dataset = ds.dataset(archivos, format='parquet', partitioning='hive',
+                         partition_base_dir=ARCHIVO_DIR)
+    filtro = ((ds.field('tipo') == 'transferencia')
+              & ds.field('id_cuenta_destino').is_valid()
+              & (ds.field('id_transaccion') <= ultimo_id))
+    if desde is not None:
+        filtro = filtro & (ds.field('anio') >= desde.year) \
+            & (ds.field('fecha') >= pa.scalar(desde, type=pa.timestamp('s')))
+    if hasta is not None:
+        filtro = filtro & (ds.field('fecha') < pa.scalar(hasta, type=pa.timestamp('s')))
+    return dataset.to_table(columns=['id_cuenta_origen', 'id_cuenta_destino', 'monto'],
+                            filter=filtro)
+
+
+def sumar_por_cuenta_origen(desde, tipos: Iterable[str],
+                            hasta=None, ultimo_id: Optional[int] = None,
+                            host: str = None, port: int = None,
+                            user: str = None, password: str = None,
+                            database: str = None) -> Dict[int, Decimal]:
+    """Suma el monto archivado por cuenta origen dentro de una ventana.
+
+    Solo se leen los archivos del manifiesto. Los filtros de año y fecha se
+    empujan al escaneo de pyarrow, que descarta carpetas anio=... completas y
+    grupos de filas por sus estadísticas.
+
+    Args:
+        desde: Fecha mínima (inclusiva)
+        tipos: Tipos de transacción a incluir
+        hasta: Fecha máxima (exclusiva, opcional)
+        ultimo_id: Marca del archivo (si es None se lee de archivo_estado)
+        host: Servidor MySQL (opcional)
+        port: Puerto MySQL (opcional)
+        user: Usuario MySQL (opcional)
+        password: Contraseña MySQL (opcional)
+        database: Base de datos (opcional)
+
+    Returns:
+        Dict[int, Decimal]: Monto total por id_cuenta_origen
+    """
+    if not os.path.isdir(ARCHIVO_DIR):
+        return {}
+    if ultimo_id is None:
+        ultimo_id = estado_archivo(host, port, user, password, database)['ultimo_id']
+    archivos = archivos_confirmados(ultimo_id, host, port, user, password, database)
+    if not archivos:
+        return {}
+    pa = _pyarrow()
+    ds, pc = pa.dataset, pa.compute
+
+    dataset = ds.dataset(archivos, format='parquet', partitioning='hive',
+                         partition_base_dir=ARCHIVO_DIR)
+    inicio = pa.scalar(desde, type=pa.timestamp('s'))
+    filtro = ((ds.field('anio') >= desde.year)
+              & (ds.field('fecha') >= inicio)
+              & (ds.field('id_transaccion') <= ultimo_id)
+              & ds.field('tipo').isin(list(tipos)))
+    if hasta is not None:
+        filtro = filtro & (ds.field('fecha') < pa.scalar(hasta, type=pa.timestamp('s')))
+
+    tabla = dataset.to_table(columns=['id_cuenta_origen', 'monto'], filter=filtro)
+    if tabla.num_rows == 0:
+        return {}
+    agregado = tabla.group_by('id_cuenta_origen').aggregate([('monto', 'sum')])
+    return dict(zip(agregado.column('id_cuenta_origen').to_pylist(),
+                    agregado.column('monto_sum').to_pylist()))
+
+
+def ventana_con_archivo(desde, host: str = None, port: int = None,
+                        user: str = None, password: str = None,
+                        database: str = None) -> Optional[int]:
+    """Indica si una ventana que empieza en `desde` debe leer el archivo.
+
+    Args:
+        desde: Inicio de la ventana del reporte
+        host: Servidor MySQL (opcional)
+        port: Puerto MySQL (opcional)
+        user: Usuario MySQL (opcional)
+        password: Contraseña MySQL (opcional)
+        database: Base de datos (opcional)
+
+    Returns:
+        Optional[int]: La marca ultimo_id si hay filas archivadas con fecha
+            >= desde, o None si basta con la tabla viva
+    """
+    if not os.path.isdir(ARCHIVO_DIR):
+        return None
+    estado = estado_archivo(host, port, user, password, database)
+    if estado['ultimo_id'] == 0 or estado['fecha_max'] is None:
+        return None
+    if estado['fecha_max'] < desde:
+        return None
+    return estado['ultimo_id']
+
+
+def top_clientes_federado(desde, tipos: Iterable[str], ultimo_id: int,
+                          limite: int = 5,
+                          host: str = None, port: int = None,
+                          user: str = None, password: str = None,
+                          database: str = None) -> List[tuple]:
+    """Ranking de clientes por monto movido combinando archivo y tabla viva.
+
+    Args:
+        desde: Inicio de la ventana (inclusivo)
+        tipos: Tipos de transacción a incluir
+        ultimo_id: Marca del archivo (ver ventana_con_archivo)
+        limite: Cantidad de clientes a retornar
+        host: Servidor MySQL (opcional)
+        port: Puerto MySQL (opcional)
+        user: Usuario MySQL (opcional)
+        password: Contraseña MySQL (opcional)
+        database: Base de datos (opcional)
+
+    Returns:
+        List[tuple]: Filas (nombre, apellido, total_movido) ordenadas de
+            mayor a menor, igual que la consulta SQL del Punto 4
+    """
+    tipos = list(tipos)
+    totales = sumar_por_cuenta_origen(desde, tipos, ultimo_id=ultimo_id, host=host,
+                                      port=port, user=user, password=password,
+                                      database=database)
+
+    conn = get_connection(host, port, user, password, database)
+    cursor = conn.cursor()
+    try:
+        marcadores = ', '.join(['%s'] * len(tipos))
+        cursor.execute(f"""
+            SELECT t.id_cuenta_origen, SUM(t.monto)
+            FROM transaccion t
+            WHERE t.tipo IN ({marcadores})
+              AND t.fecha >= %s
+            GROUP BY t.id_cuenta_origen
+        """, (*tipos, desde))
+        for id_cuenta, monto in cursor.fetchall():
+            totales[id_cuenta] = totales.get(id_cuenta, Decimal('0')) + monto
+
+        cursor.execute("""
+            SELECT c.id_cuenta, u.id_usuario, u.nombre, u.apellido
+            FROM cuenta c
+            JOIN usuario u ON c.id_usuario = u.id_usuario
+        """)
+        por_usuario: Dict[int, list] = {}
+        for id_cuenta, id_usuario, nombre, apellido in cursor.fetchall():
+            if id_cuenta in totales:
+                fila = por_usuario.setdefault(id_usuario, [nombre, apellido, Decimal('0')])
+                fila[2] += totales[id_cuenta]
+    finally:
+        cursor.close()
+        conn.close()
+
+    ranking = sorted(por_usuario.values(), key=lambda f: f[2], reverse=True)
+    return [(nombre, apellido, round(total, 2))
+            for nombre, apellido, total in ranking[:limite]]
+
+
+def main():
+    """Archiva las transacciones anteriores a la ventana de 48 meses."""
+    # consultas importa este módulo: la importación va acá
+    from consultas import MESES_VENTANA, _restar_meses
+
+    print("="*70)
+    print("  ARCHIVO EN FRÍO DE TRANSACCIONES")
+    print("="*70)
+
+    inicio_mes = dt.datetime.combine(dt.date.today().replace(day=1), dt.time())
+    corte = _restar_meses(inicio_mes, MESES_VENTANA).date()
+    print(f"\n📦 Archivando transacciones anteriores a {corte}...")
+
+    archivadas = archivar_transacciones(corte)
+    if archivadas >= 0:
+        print(f"✅ Transacciones archivadas: {archivadas}")
+        print(f"   Carpeta: {ARCHIVO_DIR}")
+
+
+if __name__ == '__main__':
+    main()
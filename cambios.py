@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+cambios.py
+
+Feed de cambios por marcas de agua (high-water marks) para mantener datos
+derivados de forma incremental.
+
+Para cada tabla seguida se entregan:
+- Filas nuevas: id mayor a la marca de agua local. La marca avanza hasta un
+  tope seguro (tope_seguro()): el mayor id por debajo del cual ya no puede
+  confirmarse ninguna fila, aunque los ids se asignen al insertar y las
+  transacciones confirmen en otro orden.
+- Filas actualizadas y eliminadas de las tablas con columnas mutables
+  (saldo en cuenta, estado/fecha_pago en cuota, estado en prestamo). Triggers
+  AFTER UPDATE/DELETE (ver preparar()) marcan cada fila modificada en
+  cambio_fila con una versión; la sincronización lee solo las marcas
+  pendientes y las limpia si la versión no cambió mientras tanto.
+
+Así el trabajo es proporcional al volumen de cambios y no al tamaño de la
+tabla. Las filas se leen y entregan por lotes de `tam_lote` (paginando por
+id), de modo que ni la primera sincronización, que entrega la tabla
+completa, la carga entera en memoria. Las filas "actualizadas" deben
+tratarse como upserts idempotentes.
+
+Las bajas de Transaccion no se siguen: solo ocurren al purgar o archivar
+particiones viejas (particiones.py, archivo_frio.py), que no disparan
+triggers y no son bajas de negocio. Las marcas de cambio_fila están en la
+base, así que se asume un solo feed por base de datos.
+"""
+from typing import List, Dict, Callable, Iterator, Optional, Tuple
+import json
+import os
+import time
+from database import get_connection
+
+
+# tabla → (columna id, columnas entregadas, columnas mutables a vigilar)
+TABLAS_SEGUIDAS: Dict[str, Tuple[str, List[str], List[str]]] = {
+    'transaccion': ('id_transaccion',
+                    ['id_transaccion', 'id_cuenta_origen', 'id_cuenta_destino',
+                     'monto', 'fecha', 'tipo'],
+                    []),
+    'cuota': ('id_cuota',
+              ['id_cuota', 'id_prestamo', 'numero_cuota', 'monto',
+               'fecha_vencimiento', 'fecha_pago', 'estado'],
+              ['estado', 'fecha_pago']),
+    'prestamo': ('id_prestamo',
+                 ['id_prestamo', 'id_usuario', 'monto_total', 'tasa_interes',
+                  'fecha_inicio', 'fecha_fin', 'estado', 'id_moneda'],
+                 ['estado']),
+    'cuenta': ('id_cuenta',
+               ['id_cuenta', 'numero_cuenta', 'saldo', 'fecha_apertura',
+                'id_usuario', 'id_producto', 'id_sede'],
+               ['saldo']),
+}
+
+CREAR_TABLA_CAMBIOS = """
+    CREATE TABLE IF NOT EXISTS cambio_fila (
+        tabla VARCHAR(32) NOT NULL,
+        id_fila INT NOT NULL,
+        version BIGINT UNSIGNED NOT NULL DEFAULT 0,
+        pendiente TINYINT NOT NULL DEFAULT 1,
+        PRIMARY KEY (tabla, id_fila),
+        KEY idx_cambio_fila_pendiente (tabla, pendiente, id_fila)
+    )
+"""
+
+MARCAR_CAMBIO = """
+    INSERT INTO cambio_fila (tabla, id_fila) VALUES ('{tabla}', {fila}.{columna_id})
+    ON DUPLICATE KEY UPDATE version = version + 1, pendiente = 1
+"""
+
+ESPERA_TOPE = 10.0
+
+# Consumidor: recibe (tabla, filas_nuevas, filas_actualizadas, ids_eliminados)
+Consumidor = Callable[[str, List[Dict], List[Dict], List[int]], None]
+
+
+def tope_seguro(conn, tabla: str, columna_id: str,
+                espera: float = ESPERA_TOPE) -> Optional[int]:
+    """Mayor id hasta el cual todas las filas que van a existir ya están confirmadas.
+
+    AUTO_INCREMENT asigna el id al insertar, pero la fila se ve recién al
+    confirmar, así que MAX(id) puede dejar atrás un id menor todavía sin
+    confirmar. Después de leer MAX(id) se espera a que terminen las
+    transacciones de escritura que estaban abiertas en ese momento (las únicas
+    que pueden tener ids menores pendientes). Al final se confirma la
+    transacción de `conn` para que las lecturas siguientes vean esas filas.
+
+    Args:
+        conn: Conexión (requiere el privilegio PROCESS para ver innodb_trx)
+        tabla: Tabla con id AUTO_INCREMENT
+        columna_id: Columna id
+        espera: Segundos máximos de espera
+
+    Returns:
+        Optional[int]: El tope, o None si alguna transacción no terminó a tiempo
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"SELECT COALESCE(MAX({columna_id}), 0) FROM {tabla}")
+        (tope,) = cursor.fetchone()
+        consulta = """
+            SELECT trx_id FROM information_schema.innodb_trx
+            WHERE trx_mysql_thread_id <> CONNECTION_ID() AND trx_rows_modified > 0
+        """
+        cursor.execute(consulta)
+        abiertas = [f[0] for f in cursor.fetchall()]
+        limite = time.monotonic() + espera
+        while abiertas:
+            if time.monotonic() >= limite:
+                return None
+            time.sleep(0.05)
+            cursor.execute(f"""
+                SELECT trx_id FROM information_schema.innodb_trx
+                WHERE trx_id IN ({', '.join(['%s'] * len(abiertas))})
+            """, tuple(abiertas))
+            abiertas = [f[0] for f in cursor.fetchall()]
+        conn.commit()
+        return tope
+    finally:
+        cursor.close()
+
+
+class FeedCambios:
+    """Detecta filas nuevas, modificadas y eliminadas y las reparte a consumidores.
+
+    Las marcas de agua se persisten en un archivo JSON, por defecto
+    `.marcas_agua.json` junto a este módulo. Cada lote se confirma (marcas de
+    cambio limpiadas) solo después de que todos los consumidores lo procesaron
+    sin errores, y la marca de agua solo avanza cuando se entregaron todos los
+    lotes de la tabla, de modo que un fallo provoca la reentrega en la
+    siguiente corrida.
+    """
+
+    def __init__(self, ruta_estado: Optional[str] = None, tam_lote: int = 10_000):
+        here = os.path.dirname(os.path.abspath(__file__))
+        self.ruta_estado = ruta_estado or os.path.join(here, '.marcas_agua.json')
+        self.tam_lote = tam_lote
+        self.consumidores: Dict[str, List[Consumidor]] = {}
+        self.estado: Dict[str, Dict] = self._cargar_estado()
+
+    def _cargar_estado(self) -> Dict[str, Dict]:
+        """Lee el estado persistido (vacío si no existe)."""
+        if not os.path.exists(self.ruta_estado):
+            return {}
+        with open(self.ruta_estado, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _guardar_estado(self) -> None:
+        """Persiste el estado de forma atómica (archivo temporal + rename)."""
+        temporal = self.ruta_estado + '.tmp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(self.estado, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, self.ruta_estado)
+
+    @staticmethod
+    def preparar(host: str = None, port: int = None,
+                 user: str = None, password: str = None,
+                 database: str = None) -> None:
+        """Crea cambio_fila y los triggers que falten en las tablas con columnas mutables.
+
+        Se ejecuta una vez al instalar el feed; volver a llamarlo no hace nada
+        si ya está todo creado (sincronizar() no hace DDL). Los cambios
+        anteriores a la creación de los triggers no se detectan. Si cambian
+        las columnas mutables de una tabla, hay que borrar sus triggers
+        trg_cambio_<tabla>_* antes de llamarlo.
+        """
+        conn = get_connection(host, port, user, password, database)
+        cursor = conn.cursor()
+        try:
+            cursor.execute(CREAR_TABLA_CAMBIOS)
+            cursor.execute("""
+                SELECT trigger_name FROM information_schema.triggers
+                WHERE trigger_schema = DATABASE() AND trigger_name LIKE 'trg\\_cambio\\_%'
+            """)
+            existentes = {f[0] for f in cursor.fetchall()}
+            for tabla, (columna_id, _, mutables) in TABLAS_SEGUIDAS.items():
+                if not mutables:
+                    continue
+                distinto = ' OR '.join(f"NOT (OLD.{c} <=> NEW.{c})" for c in mutables)
+                if f"trg_cambio_{tabla}_upd" not in existentes:
+                    cursor.execute(f"""
+                        CREATE TRIGGER trg_cambio_{tabla}_upd AFTER UPDATE ON {tabla}
+                        FOR EACH ROW BEGIN
+                            IF {distinto} THEN
+                                {MARCAR_CAMBIO.format(tabla=tabla, fila='NEW', columna_id=columna_id)};
+                            END IF;
+                        END
+                    """)
+                if f"trg_cambio_{tabla}_del" not in existentes:
+                    cursor.execute(f"""
+                        CREATE TRIGGER trg_cambio_{tabla}_del AFTER DELETE ON {tabla}
+                        FOR EACH ROW
+                        {MARCAR_CAMBIO.format(tabla=tabla, fila='OLD', columna_id=columna_id)}
+                    """)
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+
+    def registrar(self, tabla: str, consumidor: Consumidor) -> None:
+        """Registra un consumidor incremental para una tabla seguida.
+
+        Args:
+            tabla: Nombre de la tabla (ver TABLAS_SEGUIDAS)
+            consumidor: Función (tabla, nuevas, actualizadas, eliminadas) -> None;
+                se llama una vez por lote
+
+        Raises:
+            ValueError: Si la tabla no está en TABLAS_SEGUIDAS
+        """
+        if tabla not in TABLAS_SEGUIDAS:
+            raise ValueError(f"Tabla no seguida: {tabla}")
+        self.consumidores.setdefault(tabla, []).append(consumidor)
+
+    def marca_agua(self, tabla: str) -> int:
+        """Retorna el mayor id entregado para la tabla (0 si nunca se leyó)."""
+        return self.estado.get(tabla, {}).get('marca', 0)
+
+    def _lotes_nuevas(self, cursor, tabla: str, marca: int,
+                      tope: int) -> Iterator[List[Dict]]:
+        """Filas con id en (marca, tope], por lotes paginados por id."""
+        columna_id, columnas, _ = TABLAS_SEGUIDAS[tabla]
+        ultimo = marca
+        while True:
+            cursor.execute(f"""
+                SELECT {', '.join(columnas)}
+                FROM {tabla}
+                WHERE {columna_id} > %s AND {columna_id} <= %s
+                ORDER BY {columna_id}
+                LIMIT %s
+            """, (ultimo, tope, self.tam_lote))
+            lote = [dict(zip(columnas, fila)) for fila in cursor.fetchall()]
+            if not lote:
+                return
+            ultimo = lote[-1][columna_id]
+            yield lote
+
+    def _lotes_cambios(self, cursor, tabla: str) -> Iterator[List[Tuple]]:
+        """Marcas pendientes con el contenido actual de la fila, por lotes.
+
+        Cada elemento es (id_fila, version, fila o None si fue eliminada).
+        """
+        columna_id, columnas, _ = TABLAS_SEGUIDAS[tabla]
+        ultimo = 0
+        while True:
+            cursor.execute(f"""
+                SELECT m.id_fila, m.version, t.{columna_id},
+                       {', '.join(f't.{c}' for c in columnas)}
+                FROM cambio_fila m
+                LEFT JOIN {tabla} t ON t.{columna_id} = m.id_fila
+                WHERE m.tabla = %s AND m.pendiente = 1 AND m.id_fila > %s
+                ORDER BY m.id_fila
+                LIMIT %s
+            """, (tabla, ultimo, self.tam_lote))
+            lote = [(f[0], f[1], None if f[2] is None else dict(zip(columnas, f[3:])))
+                    for f in cursor.fetchall()]
+            if not lote:
+                return
+            ultimo = lote[-1][0]
+            yield lote
+
+    @staticmethod
+    def _limpiar(cursor, tabla: str, lote: List[Tuple]) -> None:
+        """Limpia las marcas entregadas que no cambiaron desde que se leyeron."""
+        vivas = [(tabla, i, v) for i, v, fila in lote if fila is not None]
+        bajas = [(tabla, i, v) for i, v, fila in lote if fila is None]
+        if vivas:
+            cursor.executemany("""
+                UPDATE cambio_fila SET pendiente = 0
+                WHERE tabla = %s AND id_fila = %s AND version = %s
+            """, vivas)
+        if bajas:
+            cursor.executemany("""
+                DELETE FROM cambio_fila
+                WHERE tabla = %s AND id_fila = %s AND version = %s
+            """, bajas)
+
+    def sincronizar(self, host: str = None, port: int = None,
+                    user: str = None, password: str = None,
+                    database: str = None) -> Dict[str, Dict[str, int]]:
+        """Entrega a los consumidores los cambios desde la última sincronización.
+
+        Solo se procesan las tablas con al menos un consumidor registrado.
+        Requiere haber ejecutado preparar() una vez.
+
+        Args:
+            host: Servidor MySQL (opcional)
+            port: Puerto MySQL (opcional)
+            user: Usuario MySQL (opcional)
+            password: Contraseña MySQL (opcional)
+            database: Base de datos (opcional)
+
+        Returns:
+            Dict[str, Dict[str, int]]: Por tabla, cantidad de filas 'nuevas',
+                'actualizadas' y 'eliminadas' entregadas
+
+        Ejemplo:
+            >>> feed = FeedCambios()
+            >>> feed.registrar('transaccion', lambda t, n, a, e: print(len(n)))
+            >>> feed.sincronizar()
+            {'transaccion': {'nuevas': 8000, 'actualizadas': 0, 'eliminadas': 0}}
+        """
+        resumen: Dict[str, Dict[str, int]] = {}
+        conn = get_connection(host, port, user, password, database)
+        cursor = conn.cursor()
+        try:
+            for tabla, consumidores in self.consumidores.items():
+                columna_id, _, mutables = TABLAS_SEGUIDAS[tabla]
+                marca = self.marca_agua(tabla)
+                conteo = {'nuevas': 0, 'actualizadas': 0, 'eliminadas': 0}
+
+                tope = tope_seguro(conn, tabla, columna_id)
+                if tope is None:
+                    print(f"⚠️  {tabla}: hay transacciones abiertas; "
+                          f"las filas nuevas se entregan en la próxima sincronización")
+                    tope = marca
+
+                # Cambios en filas ya entregadas. Las marcas de filas que
+                # todavía no se entregaron se limpian sin más: esas filas
+                # llegan como nuevas con su contenido actual.
+                if mutables:
+                    for lote in self._lotes_cambios(cursor, tabla):
+                        entregados = [c for c in lote if c[0] <= marca]
+                        actualizadas = [fila for _, _, fila in entregados if fila is not None]
+                        eliminadas = [i for i, _, fila in entregados if fila is None]
+                        if entregados:
+                            for consumidor in consumidores:
+                                consumidor(tabla, [], actualizadas, eliminadas)
+                        self._limpiar(cursor, tabla, [c for c in lote if c[0] <= tope])
+                        conn.commit()
+                        conteo['actualizadas'] += len(actualizadas)
+                        conteo['eliminadas'] += len(eliminadas)
+
+                for nuevas in self._lotes_nuevas(cursor, tabla, marca, tope):
+                    for consumidor in consumidores:
+                        consumidor(tabla, nuevas, [], [])
+                    conteo['nuevas'] += len(nuevas)
+
+                self.estado[tabla] = {'marca': tope}
+                self._guardar_estado()
+                resumen[tabla] = conteo
+        finally:
+            cursor.close()
+            conn.close()
+        return resumen
+
+
+def main():
+    """Sincroniza todas las tablas seguidas y muestra el volumen de cambios."""
+    print("="*70)
+    print("  FEED DE CAMBIOS POR MARCAS DE AGUA")
+    print("="*70)
+
+    feed = FeedCambios()
+    for tabla in TABLAS_SEGUIDAS:
+        feed.registrar(tabla, lambda t, nuevas, actualizadas, eliminadas: None)
+
+    try:
+        feed.preparar()
+        resumen = feed.sincronizar()
+    except Exception as e:
+        print(f"❌ Error en sincronizar: {e}")
+        return
+
+    print(f"\n{'Tabla':<15} {'Marca':>12} {'Nuevas':>10} {'Actualizadas':>14} {'Eliminadas':>12}")
+    print("-"*70)
+    for tabla, conteo in resumen.items():
+        print(f"{tabla:<15} {feed.marca_agua(tabla):>12} "
+              f"{conteo['nuevas']:>10} {conteo['actualizadas']:>14} {conteo['eliminadas']:>12}")
+
+
+if __name__ == '__main__':
+    main()
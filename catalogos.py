@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+catalogos.py
+
+Caché en memoria de las tablas de catálogo cargadas por 01_catalogos.sql:
+Pais, Ciudad, Sede, Tipo_Moneda y Producto.
+
+Los catálogos se leen una sola vez por proceso. Pasado el TTL se consulta su
+versión (CHECKSUM TABLE de las cinco tablas, que son pequeñas) y solo se
+recargan si cambió. Así los reportes pueden pedir a MySQL únicamente los ids
+de las tablas grandes y resolver nombres, códigos y símbolos con búsquedas
+O(1) en diccionarios.
+
+obtener_catalogos() retorna una foto inmutable (FotoCatalogos): una recarga
+arma una foto nueva y la publica con una sola asignación, así que quien
+tiene una foto nunca mezcla tablas de dos cargas. Un id que no está en la
+foto (una fila agregada dentro del TTL) fuerza una verificación de versión y
+una recarga antes de fallar con KeyError.
+"""
+from typing import Dict, NamedTuple, Optional, Tuple
+import threading
+import time
+from database import destino_conexion, get_connection
+
+
+TABLAS_CATALOGO = ('pais', 'ciudad', 'sede', 'tipo_moneda', 'producto')
+
+
+class Pais(NamedTuple):
+    nombre: str
+    codigo_iso: str
+
+
+class Ciudad(NamedTuple):
+    nombre: str
+    id_pais: int
+
+
+class Sede(NamedTuple):
+    nombre: str
+    id_ciudad: int
+
+
+class Moneda(NamedTuple):
+    nombre: str
+    codigo: str
+    simbolo: str
+
+
+class Producto(NamedTuple):
+    nombre: str
+    tipo: str
+    id_moneda: int
+
+
+class _Tabla(dict):
+    """Tabla de una foto: ante un id ausente recarga la caché una vez y reintenta."""
+
+    def __init__(self, filas: Dict, cache: 'CacheCatalogos', nombre: str):
+        super().__init__(filas)
+        self._cache = cache
+        self._nombre = nombre
+
+    def __missing__(self, clave):
+        tabla = getattr(self._cache.recargar(), self._nombre)
+        if tabla is self or not dict.__contains__(tabla, clave):
+            raise KeyError(clave)
+        return dict.__getitem__(tabla, clave)
+
+
+class FotoCatalogos(NamedTuple):
+    """Catálogos de una misma carga.
+
+    Attributes:
+        pais: id_pais → Pais
+        ciudad: id_ciudad → Ciudad
+        sede: id_sede → Sede
+        moneda: id_moneda → Moneda
+        producto: id_producto → Producto
+        version: Checksums de las tablas al momento de la carga
+    """
+    pais: Dict[int, Pais]
+    ciudad: Dict[int, Ciudad]
+    sede: Dict[int, Sede]
+    moneda: Dict[int, Moneda]
+    producto: Dict[int, Producto]
+    version: Optional[Tuple]
+
+    def pais_de_ciudad(self, id_ciudad: int) -> Pais:
+        """Retorna el país al que pertenece una ciudad."""
+        return self.pais[self.ciudad[id_ciudad].id_pais]
+
+    def moneda_de_producto(self, id_producto: int) -> Moneda:
+        """Retorna la moneda de un producto."""
+        return self.moneda[self.producto[id_producto].id_moneda]
+
+
+class CacheCatalogos:
+    """Catálogos en memoria con verificación de versión.
+
+    Attributes:
+        foto: Última FotoCatalogos cargada (None antes de la primera carga)
+    """
+
+    def __init__(self, ttl: float = 300.0):
+        self.ttl = ttl
+        self.foto: Optional[FotoCatalogos] = None
+        self._conexion: Dict = {}
+        self._verificado = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _leer_version(cursor) -> Tuple:
+        """Obtiene los checksums de las tablas de catálogo."""
+        cursor.execute(f"CHECKSUM TABLE {', '.join(TABLAS_CATALOGO)}")
+        return tuple(suma for _, suma in cursor.fetchall())
+
+    def _cargar(self, cursor, version: Tuple) -> FotoCatalogos:
+        """Lee las cinco tablas y arma una foto nueva."""
+        cursor.execute("SELECT id_pais, nombre, codigo_iso FROM pais")
+        pais = {r[0]: Pais(r[1], r[2]) for r in cursor.fetchall()}
+        cursor.execute("SELECT id_ciudad, nombre, id_pais FROM ciudad")
+        ciudad = {r[0]: Ciudad(r[1], r[2]) for r in cursor.fetchall()}
+        cursor.execute("SELECT id_sede, nombre, id_ciudad FROM sede")
+        sede = {r[0]: Sede(r[1], r[2]) for r in cursor.fetchall()}
+        cursor.execute("SELECT id_moneda, nombre, codigo, simbolo FROM tipo_moneda")
+        moneda = {r[0]: Moneda(r[1], r[2], r[3]) for r in cursor.fetchall()}
+        cursor.execute("SELECT id_producto, nombre, tipo, id_moneda FROM producto")
+        producto = {r[0]: Producto(r[1], r[2], r[3]) for r in cursor.fetchall()}
+
+        return FotoCatalogos(_Tabla(pais, self, 'pais'), _Tabla(ciudad, self, 'ciudad'),
+                             _Tabla(sede, self, 'sede'), _Tabla(moneda, self, 'moneda'),
+                             _Tabla(producto, self, 'producto'), version)
+
+    def asegurar(self, host: str = None, port: int = None,
+                 user: str = None, password: str = None,
+                 database: str = None) -> FotoCatalogos:
+        """Carga los catálogos si hace falta y los retorna.
+
+        La primera llamada carga todo. Las siguientes no consultan la base de
+        datos hasta que vence el TTL; entonces se compara la versión y solo se
+        recarga si alguna tabla cambió.
+
+        Args:
+            host: Servidor MySQL (opcional)
+            port: Puerto MySQL (opcional)
+            user: Usuario MySQL (opcional)
+            password: Contraseña MySQL (opcional)
+            database: Base de datos (opcional)
+
+        Returns:
+            FotoCatalogos: Foto vigente, lista para consultar
+        """
+        foto = self.foto
+        if foto is not None and time.monotonic() - self._verificado < self.ttl:
+            return foto
+        with self._lock:
+            foto = self.foto
+            if foto is not None and time.monotonic() - self._verificado < self.ttl:
+                return foto
+            self._conexion = {'host': host, 'port': port, 'user': user,
+                              'password': password, 'database': database}
+            conn = get_connection(host, port, user, password, database)
+            cursor = conn.cursor()
+            try:
+                version = self._leer_version(cursor)
+                if foto is None or version != foto.version:
+                    # Una sola asignación: los lectores ven la foto vieja o la nueva
+                    foto = self.foto = self._cargar(cursor, version)
+                self._verificado = time.monotonic()
+            finally:
+                cursor.close()
+                conn.close()
+        return foto
+
+    def invalidar(self) -> None:
+        """Fuerza la verificación de versión en el próximo acceso."""
+        self._verificado = 0.0
+
+    def recargar(self) -> FotoCatalogos:
+        """Verifica la versión ya (recargando si cambió) con la última conexión usada."""
+        self.invalidar()
+        return self.asegurar(**self._conexion)
+
+
+_caches: Dict[Tuple[str, int, str], CacheCatalogos] = {}
+_caches_lock = threading.Lock()
+
+
+def obtener_catalogos(host: str = None, port: int = None,
+                      user: str = None, password: str = None,
+                      database: str = None) -> FotoCatalogos:
+    """Retorna la foto vigente de los catálogos de una base de datos.
+
+    El proceso mantiene una caché por destino (host, port, database), de modo
+    que pedir catálogos de otra base nunca devuelve los de la primera.
+
+    Ejemplo:
+        >>> cat = obtener_catalogos()
+        >>> cat.moneda_de_producto(1).codigo
+        'ARS'
+    """
+    clave = destino_conexion(host, port, database)
+    cache = _caches.get(clave)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.setdefault(clave, CacheCatalogos())
+    return cache.asegurar(host, port, user, password, database)
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+cli.py
+
+Ejecución no interactiva de muchos reportes en un solo proceso.
+
+Cada comando es el nombre de un reporte de demonio.REPORTES seguido de sus
+argumentos posicionales, por ejemplo `prestamos_activos 20000029`. Los
+comandos se toman de la línea de comandos o, si no hay ninguno (o se pasa
+`-`), de la entrada estándar, uno por línea; las líneas vacías y las que
+empiezan con # se ignoran.
+
+Todos los comandos comparten el mismo pool de conexiones y la misma caché de
+resultados (demonio.CacheResultados, acotada a `--cache` resultados; 0 la
+desactiva), y corren en `--hilos` hilos. Si el demonio de reportes está
+corriendo, los comandos se le envían a él; si deja de responder a mitad del
+lote, ese comando y los siguientes se ejecutan en este proceso, como en
+demonio.ejecutar().
+
+Cada resultado se escribe en la salida estándar como una línea JSON (JSON
+Lines), en orden de finalización, con 'n' (número de comando), 'comando',
+'ok', 'filas', 'segundos' y 'resultado' (o 'error'). Los reportes informan
+sus errores retornando None, False o un ResultadoError (salida.py) en lugar
+de lanzar una excepción, así que esos resultados también cuentan como
+fallidos (ok=False) y hacen que el código de salida sea 1. Una lista vacía
+común es un reporte sin filas (ok=True, filas=0). Las líneas pasan por
+una cola acotada hacia un único hilo escritor: si quien lee la salida es más
+lento, los hilos se frenan en lugar de acumular resultados en memoria, y
+tampoco se leen más comandos de los que pueden estar en curso. Los mensajes
+de los reportes van a la salida de errores, igual que el resumen final de
+rendimiento.
+
+Ejemplo:
+    python cli.py saldo_por_moneda top_clientes_transacciones
+    cut -d, -f1 dnis.csv | sed 's/^/prestamos_activos /' | python cli.py --hilos 8
+"""
+from typing import Dict, Iterable, Iterator, Optional, TextIO, Tuple
+import argparse
+import contextlib
+import json
+import queue
+import shlex
+import sys
+import threading
+import time
+import demonio
+from salida import ResultadoError
+
+
+def leer_comandos(lineas: Iterable[str]) -> Iterator[Tuple[int, str]]:
+    """Numera los comandos, salteando líneas vacías y comentarios."""
+    n = 0
+    for linea in lineas:
+        linea = linea.strip()
+        if not linea or linea.startswith('#'):
+            continue
+        n += 1
+        yield n, linea
+
+
+def _error(resultado) -> Optional[str]:
+    """Mensaje de error si el resultado es el de un reporte que falló, o None.
+
+    Fallan None, False, un ResultadoError (también como valor de un
+    diccionario) y un resultado obsoleto sin respaldo. Una lista vacía común
+    no es un fallo: el reporte corrió y no tuvo filas.
+    """
+    if resultado is None or resultado is False:
+        return "el reporte falló o no encontró lo pedido (ver la salida de errores)"
+    valores = resultado.values() if isinstance(resultado, dict) else (resultado,)
+    for valor in valores:
+        if isinstance(valor, ResultadoError):
+            return valor.error
+    if getattr(resultado, 'origen', None) == 'ninguno':
+        return "se excedió el presupuesto y no hay un resultado anterior"
+    return None
+
+
+def _filas(resultado) -> Optional[int]:
+    """Cantidad de filas de un resultado (None si no es una lista)."""
+    if isinstance(resultado, list):
+        return len(resultado)
+    if isinstance(resultado, dict):
+        return sum(len(v) for v in resultado.values() if isinstance(v, list))
+    return None
+
+
+class Lote:
+    """Ejecuta comandos en paralelo y escribe sus resultados como JSON Lines.
+
+    Args:
+        salida: Flujo donde se escriben las líneas JSON
+        hilos: Comandos simultáneos
+        tam_cola: Líneas de salida pendientes antes de frenar a los hilos
+        usar_demonio: Enviar los comandos al demonio si está corriendo
+        max_cache: Resultados guardados en la caché local (0: sin caché; la
+            entrada puede ser arbitrariamente larga)
+    """
+
+    def __init__(self, salida: TextIO, hilos: int = 4, tam_cola: int = 1_000,
+                 usar_demonio: bool = True, max_cache: int = demonio.MAX_RESULTADOS):
+        self.salida = salida
+        self.hilos = max(hilos, 1)
+        self.remoto = usar_demonio and demonio.disponible()
+        self.modo = 'demonio' if self.remoto else 'local'
+        self.cache = demonio.CacheResultados(max(max_cache, 0))
+        self.resumen = {'Comandos': 0, 'OK': 0, 'Errores': 0, 'Filas': 0}
+        self._cola: 'queue.Queue[Optional[str]]' = queue.Queue(maxsize=max(tam_cola, 1))
+        self._en_curso = threading.BoundedSemaphore(self.hilos * 2)
+        self._lock = threading.Lock()
+
+    def _escribir(self) -> None:
+        """Hilo escritor: vacía la cola en la salida."""
+        while True:
+            linea = self._cola.get()
+            if linea is None:
+                break
+            self.salida.write(linea + '\n')
+            if self._cola.empty():
+                self.salida.flush()
+        self.salida.flush()
+
+    def _preparar_local(self) -> None:
+        """Crea el pool de conexiones para ejecutar los comandos en este proceso."""
+        try:
+            from database import habilitar_pool
+            habilitar_pool(self.hilos)
+        except Exception as e:
+            print(f"⚠️  No se pudo crear el pool de conexiones: {e}", file=sys.stderr)
+
+    def _pasar_a_local(self, error: Exception) -> None:
+        """Deja de usar el demonio para el resto del lote."""
+        with self._lock:
+            if not self.remoto:
+                return
+            self.remoto = False
+            self.modo = 'demonio+local'
+        print(f"⚠️  El demonio de reportes no respondió ({error}); el resto del lote "
+              f"se ejecuta localmente", file=sys.stderr)
+        self._preparar_local()
+
+    def _obtener(self, nombre: str, args: tuple):
+        """Resultado de un comando: del demonio o, si no responde, de este proceso."""
+        if self.remoto:
+            try:
+                return demonio.pedir({'accion': 'reporte', 'reporte': nombre,
+                                      'args': args, 'kwargs': {}})
+            except ConnectionError as e:
+                self._pasar_a_local(e)
+        resultado, _ = self.cache.obtener(nombre, args, {})
+        return resultado
+
+    def _resolver(self, n: int, comando: str) -> None:
+        inicio = time.perf_counter()
+        registro: Dict = {'n': n, 'comando': comando}
+        try:
+            nombre, *args = shlex.split(comando)
+            resultado = self._obtener(nombre, tuple(args))
+            error = _error(resultado)
+            registro['ok'] = error is None
+            registro['obsoleto'] = getattr(resultado, 'obsoleto', False)
+            registro['filas'] = _filas(resultado)
+            registro['resultado'] = resultado
+            if error is not None:
+                registro['error'] = error
+        except Exception as e:
+            registro['ok'] = False
+            registro['error'] = f"{type(e).__name__}: {e}"
+        registro['segundos'] = round(time.perf_counter() - inicio, 4)
+
+        try:
+            with self._lock:
+                self.resumen['Comandos'] += 1
+                self.resumen['OK' if registro['ok'] else 'Errores'] += 1
+                self.resumen['Filas'] += registro.get('filas') or 0
+            # Bloquea si el escritor va atrasado (contrapresión)
+            self._cola.put(json.dumps(registro, ensure_ascii=False, default=str))
+        finally:
+            self._en_curso.release()
+
+    def ejecutar(self, comandos: Iterable[Tuple[int, str]]) -> Dict:
+        """Ejecuta todos los comandos y retorna el resumen.
+
+        Returns:
+            Dict: 'Comandos', 'OK', 'Errores', 'Filas', 'Segundos',
+                'Comandos/s', 'Aciertos de Caché' y 'Modo' ('demonio', 'local'
+                o 'demonio+local' si el demonio dejó de responder)
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        if not self.remoto:
+            self._preparar_local()
+
+        inicio = time.perf_counter()
+        escritor = threading.Thread(target=self._escribir, name='cli-escritor')
+        escritor.start()
+        try:
+            with ThreadPoolExecutor(max_workers=self.hilos,
+                                    thread_name_prefix='cli') as pool:
+                for n, comando in comandos:
+                    # No leer más comandos de los que pueden estar en curso
+                    self._en_curso.acquire()
+                    pool.submit(self._resolver, n, comando)
+        finally:
+            self._cola.put(None)
+            escritor.join()
+
+        segundos = time.perf_counter() - inicio
+        return {**self.resumen,
+                'Segundos': round(segundos, 3),
+                'Comandos/s': round(self.resumen['Comandos'] / segundos, 1) if segundos else 0.0,
+                'Aciertos de Caché': None if self.modo == 'demonio' else self.cache.aciertos,
+                'Modo': self.modo}
+
+
+def main():
+    """Lee los comandos, los ejecuta y muestra el resumen en la salida de errores."""
+    parser = argparse.ArgumentParser(
+        description='Ejecuta reportes en lote y escribe los resultados como JSON Lines')
+    parser.add_argument('comandos', nargs='*',
+                        help="Comandos como 'prestamos_activos 20000029' (default: stdin)")
+    parser.add_argument('--hilos', type=int, default=4, help='Comandos simultáneos')
+    parser.add_argument('--cola', type=int, default=1_000,
+                        help='Líneas de salida pendientes antes de frenar')
+    parser.add_argument('--sin-demonio', action='store_true',
+                        help='Ejecutar en este proceso aunque el demonio esté corriendo')
+    parser.add_argument('--cache', type=int, default=demonio.MAX_RESULTADOS,
+                        help='Resultados guardados en la caché local (0: sin caché)')
+    args = parser.parse_args()
+
+    fuente = sys.stdin if not args.comandos or args.comandos == ['-'] else args.comandos
+    salida = sys.stdout
+    lote = Lote(salida, hilos=args.hilos, tam_cola=args.cola,
+                usar_demonio=not args.sin_demonio, max_cache=args.cache)
+
+    # Los prints de los reportes no deben mezclarse con el JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        resumen = lote.ejecutar(leer_comandos(fuente))
+
+    print(f"✅ {resumen['Comandos']} comandos ({resumen['OK']} ok, {resumen['Errores']} con error) "
+          f"en {resumen['Segundos']} s: {resumen['Comandos/s']} comandos/s "
+          f"[{resumen['Modo']}]", file=sys.stderr)
+    if resumen['Aciertos de Caché']:
+        print(f"♻️  {resumen['Aciertos de Caché']} resultados servidos desde la caché",
+              file=sys.stderr)
+    sys.exit(1 if resumen['Errores'] else 0)
+
+
+if __name__ == '__main__':
+    main()
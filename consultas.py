@@ -7,14 +7,30 @@ Contiene las seis funciones principales del taller que generan reportes
 en formato CSV desde la base de datos bancaria.
 
 Cada función es independiente, reutilizable y guarda sus resultados en
-un archivo CSV específico.
+un archivo CSV específico. Las filas se leen del cursor por lotes y se pasan
+al CSV a medida que llegan (ver _filas_cursor); la lista retornada es un
+ResultadoCSV cuyo atributo `archivo` es la ruta realmente escrita (cambia con
+REPORTES_COMPRESION). Si la consulta falla se retorna un ResultadoError: una
+lista vacía que se distingue de un reporte sin filas.
 """
-from typing import List, Dict, Optional
-import csv
+from typing import Iterable, Iterator, List, Dict, Optional
+from decimal import Decimal
+import datetime as dt
+import calendar
 import os
 from database import get_connection
+from catalogos import obtener_catalogos
+from indice_dni import obtener_indice_dni
+from archivo_frio import ventana_con_archivo, top_clientes_federado
+from salida import escribir_csv, ResultadoCSV, ResultadoError
+from presupuestos import con_presupuesto, cancelado, abandonado
 
 
+TAM_LOTE_FETCH = 5_000  # filas por fetchmany al generar los CSV
+MESES_VENTANA = 48  # ventana del Punto 4 (y del ranking); la purga la respeta
+
+
+@con_presupuesto('clientes_por_ubicacion', 'clientes_ubicacion.csv')
 def clientes_por_ubicacion(host: str = None, port: int = None,
                            user: str = None, password: str = None,
                            database: str = None) -> List[Dict[str, str]]:
@@ -46,7 +62,8 @@ def clientes_por_ubicacion(host: str = None, port: int = None,
         ]
     """
     try:
-        conn = get_connection(host, port, user, password, database)
+        conn = get_connection(host, port, user, password, database,
+                              lectura=True)
         cursor = conn.cursor()
         
         query = """
@@ -61,46 +78,55 @@ def clientes_por_ubicacion(host: str = None, port: int = None,
         """
         
         cursor.execute(query)
-        rows = cursor.fetchall()
         
-        result: List[Dict[str, str]] = []
-        for row in rows:
-            cliente, ciudad, pais = row
-            result.append({
-                'Cliente': cliente,
-                'Ciudad': ciudad,
-                'País': pais
-            })
+        result = ResultadoCSV()
+        
+        def filas() -> Iterator[Dict[str, str]]:
+            for cliente, ciudad, pais in _filas_cursor(cursor):
+                fila = {
+                    'Cliente': cliente,
+                    'Ciudad': ciudad,
+                    'País': pais
+                }
+                result.append(fila)
+                yield fila
+        
+        # Guardar en CSV a medida que se leen las filas
+        result.archivo = _write_csv(filas(), 'clientes_ubicacion.csv',
+                                    ['Cliente', 'Ciudad', 'País'])
         
         cursor.close()
         conn.close()
         
-        # Guardar en CSV
-        _write_csv(result, 'clientes_ubicacion.csv', 
-                  ['Cliente', 'Ciudad', 'País'])
-        
         return result
         
     except Exception as e:
-        print(f"❌ Error en clientes_por_ubicacion: {e}")
-        return []
+        if not abandonado():
+            print(f"❌ Error en clientes_por_ubicacion: {e}")
+        return ResultadoError(str(e))
 
 
+@con_presupuesto('saldo_por_moneda', 'saldo_por_moneda.csv')
 def saldo_por_moneda(host: str = None, port: int = None,
                     user: str = None, password: str = None,
-                    database: str = None) -> List[Dict[str, str]]:
+                    database: str = None, escribir: bool = True) -> List[Dict[str, str]]:
     """Punto 2 - Calcula el saldo total agrupado por país y tipo de moneda.
     
     Suma los saldos de todas las cuentas, agrupándolos por país y moneda.
     La moneda se determina a través del producto asociado a cada cuenta.
     Los montos se formatean con separadores de miles y 2 decimales.
     
+    La base de datos solo agrega cuenta y usuario por (ciudad, producto);
+    país y moneda se resuelven con la caché de catálogos.
+    
     Args:
         host: Servidor MySQL (opcional)
         port: Puerto MySQL (opcional)
         user: Usuario MySQL (opcional)
         password: Contraseña MySQL (opcional)
         database: Base de datos (opcional)
+        escribir: Si False, no escribe el CSV y lo deja pendiente para
+            result.guardar() (lo usa la precarga de main.py)
     
     Returns:
         List[Dict[str, str]]: Lista de diccionarios con las claves:
@@ -117,39 +143,47 @@ def saldo_por_moneda(host: str = None, port: int = None,
         ]
     """
     try:
-        conn = get_connection(host, port, user, password, database)
+        catalogos = obtener_catalogos(host, port, user, password, database)
+        
+        conn = get_connection(host, port, user, password, database,
+                              lectura=True)
         cursor = conn.cursor()
         
+        # Solo se agregan las tablas grandes; ciudad, país, producto y moneda
+        # se resuelven con la caché de catálogos.
         query = """
             SELECT 
-                p.nombre AS pais,
-                tm.nombre AS moneda_nombre,
-                tm.codigo AS moneda_codigo,
-                tm.simbolo AS moneda_simbolo,
-                ROUND(SUM(c.saldo), 2) AS saldo_total
+                u.id_ciudad,
+                c.id_producto,
+                SUM(c.saldo) AS saldo_total
             FROM cuenta c
             JOIN usuario u ON c.id_usuario = u.id_usuario
-            JOIN ciudad ci ON u.id_ciudad = ci.id_ciudad
-            JOIN pais p ON ci.id_pais = p.id_pais
-            JOIN producto pr ON c.id_producto = pr.id_producto
-            JOIN tipo_moneda tm ON pr.id_moneda = tm.id_moneda
-            GROUP BY p.id_pais, tm.id_moneda
-            ORDER BY p.nombre
+            GROUP BY u.id_ciudad, c.id_producto
         """
         
         cursor.execute(query)
-        rows = cursor.fetchall()
         
-        result: List[Dict[str, str]] = []
-        for row in rows:
-            pais, moneda_nombre, moneda_codigo, simbolo, saldo_total = row
+        # Reagrupar por (país, moneda)
+        totales: Dict[tuple, Decimal] = {}
+        for id_ciudad, id_producto, saldo in _filas_cursor(cursor):
+            clave = (catalogos.ciudad[id_ciudad].id_pais,
+                     catalogos.producto[id_producto].id_moneda)
+            totales[clave] = totales.get(clave, Decimal('0')) + saldo
+        
+        orden = sorted(totales, key=lambda k: (catalogos.pais[k[0]].nombre,
+                                               catalogos.moneda[k[1]].nombre))
+        
+        result = ResultadoCSV()
+        for id_pais, id_moneda in orden:
+            moneda = catalogos.moneda[id_moneda]
+            saldo_total = round(totales[(id_pais, id_moneda)], 2)
             
             # Formatear moneda y saldo
-            moneda_completa = f"{moneda_nombre} ({moneda_codigo})"
-            saldo_formateado = f"{simbolo} {saldo_total:,.2f}"
+            moneda_completa = f"{moneda.nombre} ({moneda.codigo})"
+            saldo_formateado = f"{moneda.simbolo} {saldo_total:,.2f}"
             
             result.append({
-                'País': pais,
+                'País': catalogos.pais[id_pais].nombre,
                 'Moneda': moneda_completa,
                 'Saldo Total': saldo_formateado
             })
@@ -158,23 +192,27 @@ def saldo_por_moneda(host: str = None, port: int = None,
         conn.close()
         
         # Guardar en CSV
-        _write_csv(result, 'saldo_por_moneda.csv',
-                  ['País', 'Moneda', 'Saldo Total'])
+        _guardar(result, result, 'saldo_por_moneda.csv',
+                 ['País', 'Moneda', 'Saldo Total'], escribir)
         
         return result
         
     except Exception as e:
-        print(f"❌ Error en saldo_por_moneda: {e}")
-        return []
+        if not abandonado():
+            print(f"❌ Error en saldo_por_moneda: {e}")
+        return ResultadoError(str(e))
 
 
+@con_presupuesto('prestamos_activos',
+                 lambda dni, *args, **kwargs: f'prestamos_activos_{dni}.csv')
 def prestamos_activos(dni: str, host: str = None, port: int = None,
                      user: str = None, password: str = None,
                      database: str = None) -> Optional[List[Dict[str, str]]]:
     """Punto 3 - Consulta los préstamos activos de un cliente específico por DNI.
     
     Busca todos los préstamos en estado 'activo' para el DNI proporcionado.
-    Valida la existencia del DNI antes de realizar la consulta.
+    Valida la existencia del DNI con el índice en memoria de indice_dni.py,
+    que además lo traduce a id_usuario para consultar prestamo directamente.
     Formatea los montos con símbolo de moneda y la tasa con porcentaje.
     
     Args:
@@ -212,22 +250,18 @@ def prestamos_activos(dni: str, host: str = None, port: int = None,
         ]
     """
     try:
-        conn = get_connection(host, port, user, password, database)
-        cursor = conn.cursor()
-        
-        # Validar existencia del DNI
-        cursor.execute(
-            "SELECT id_usuario, nombre, apellido FROM usuario WHERE dni = %s",
-            (dni,)
-        )
-        usuario = cursor.fetchone()
-        
-        if not usuario:
-            cursor.close()
-            conn.close()
+        # Validar existencia del DNI en memoria: un DNI desconocido no
+        # genera ninguna consulta a la base de datos.
+        indice = obtener_indice_dni(host, port, database)
+        id_usuario = indice.buscar(dni, host, port, user, password, database)
+        if id_usuario is None:
             return None
         
-        # Consultar préstamos activos
+        conn = get_connection(host, port, user, password, database,
+                              lectura=True)
+        cursor = conn.cursor()
+        
+        # Consultar préstamos activos (la moneda se resuelve con la caché)
         query = """
             SELECT 
                 p.id_prestamo,
@@ -235,54 +269,61 @@ def prestamos_activos(dni: str, host: str = None, port: int = None,
                 p.tasa_interes,
                 p.fecha_inicio,
                 p.fecha_fin,
-                tm.codigo AS moneda_codigo,
-                tm.simbolo AS moneda_simbolo
+                p.id_moneda
             FROM prestamo p
-            JOIN usuario u ON p.id_usuario = u.id_usuario
-            JOIN tipo_moneda tm ON p.id_moneda = tm.id_moneda
-            WHERE u.dni = %s AND p.estado = 'activo'
+            WHERE p.id_usuario = %s AND p.estado = 'activo'
             ORDER BY p.fecha_inicio DESC
         """
         
-        cursor.execute(query, (dni,))
-        rows = cursor.fetchall()
+        catalogos = obtener_catalogos(host, port, user, password, database)
         
-        result: List[Dict[str, str]] = []
-        for row in rows:
-            id_prestamo, monto, tasa, fecha_inicio, fecha_fin, moneda_codigo, simbolo = row
-            
-            result.append({
-                'ID Préstamo': str(id_prestamo),
-                'Monto Total': f"{simbolo} {monto:,.2f}",
-                'Tasa Interés': f"{tasa:.2f}%",
-                'Fecha Inicio': str(fecha_inicio),
-                'Fecha Fin': str(fecha_fin),
-                'Moneda': moneda_codigo
-            })
+        cursor.execute(query, (id_usuario,))
         
-        cursor.close()
-        conn.close()
+        result = ResultadoCSV()
+        
+        def filas() -> Iterator[Dict[str, str]]:
+            for row in _filas_cursor(cursor):
+                id_prestamo, monto, tasa, fecha_inicio, fecha_fin, id_moneda = row
+                moneda = catalogos.moneda[id_moneda]
+                fila = {
+                    'ID Préstamo': str(id_prestamo),
+                    'Monto Total': f"{moneda.simbolo} {monto:,.2f}",
+                    'Tasa Interés': f"{tasa:.2f}%",
+                    'Fecha Inicio': str(fecha_inicio),
+                    'Fecha Fin': str(fecha_fin),
+                    'Moneda': moneda.codigo
+                }
+                result.append(fila)
+                yield fila
         
         # Guardar en CSV con DNI en el nombre
-        _write_csv(result, f'prestamos_activos_{dni}.csv',
-                  ['ID Préstamo', 'Monto Total', 'Tasa Interés', 
-                   'Fecha Inicio', 'Fecha Fin', 'Moneda'])
+        result.archivo = _write_csv(filas(), f'prestamos_activos_{dni}.csv',
+                                    ['ID Préstamo', 'Monto Total', 'Tasa Interés',
+                                     'Fecha Inicio', 'Fecha Fin', 'Moneda'])
+        
+        cursor.close()
+        conn.close()
         
         return result
         
     except Exception as e:
-        print(f"❌ Error en prestamos_activos: {e}")
-        return []
+        if not abandonado():
+            print(f"❌ Error en prestamos_activos: {e}")
+        return ResultadoError(str(e))
 
 
+@con_presupuesto('top_clientes_transacciones', 'top_clientes.csv')
 def top_clientes_transacciones(host: str = None, port: int = None,
                                user: str = None, password: str = None,
-                               database: str = None) -> List[Dict[str, str]]:
+                               database: str = None,
+                               escribir: bool = True) -> List[Dict[str, str]]:
     """Punto 4 - Obtiene el top 5 de clientes más activos en transacciones.
     
     Calcula el volumen total movido por cada cliente en los últimos 48 meses,
     considerando únicamente transacciones de tipo 'transferencia' y 'retiro'.
-    Los resultados se ordenan de mayor a menor por monto total.
+    Los resultados se ordenan de mayor a menor por monto total. Si parte de
+    la ventana fue movida al archivo en frío (archivo_frio.py), se combina
+    el archivo con la tabla viva.
     
     Args:
         host: Servidor MySQL (opcional)
@@ -290,6 +331,8 @@ def top_clientes_transacciones(host: str = None, port: int = None,
         user: Usuario MySQL (opcional)
         password: Contraseña MySQL (opcional)
         database: Base de datos (opcional)
+        escribir: Si False, no escribe el CSV y lo deja pendiente para
+            result.guardar() (lo usa la precarga de main.py)
     
     Returns:
         List[Dict[str, str]]: Lista de diccionarios con las claves:
@@ -306,28 +349,41 @@ def top_clientes_transacciones(host: str = None, port: int = None,
         ]
     """
     try:
-        conn = get_connection(host, port, user, password, database)
-        cursor = conn.cursor()
-        
-        query = """
-            SELECT 
-                u.nombre,
-                u.apellido,
-                ROUND(SUM(t.monto), 2) AS total_movido
-            FROM transaccion t
-            JOIN cuenta c ON t.id_cuenta_origen = c.id_cuenta
-            JOIN usuario u ON c.id_usuario = u.id_usuario
-            WHERE t.tipo IN ('transferencia', 'retiro')
-              AND t.fecha >= DATE_SUB(NOW(), INTERVAL 48 MONTH)
-            GROUP BY u.id_usuario
-            ORDER BY total_movido DESC
-            LIMIT 5
-        """
-        
-        cursor.execute(query)
-        rows = cursor.fetchall()
+        # Si parte de la ventana ya fue movida al archivo en frío, se combina
+        # el archivo Parquet con la tabla viva.
+        desde = _restar_meses(dt.datetime.now(), MESES_VENTANA)
+        ultimo_id = ventana_con_archivo(desde, host, port, user, password, database)
+        if ultimo_id is not None:
+            rows = top_clientes_federado(desde, ('transferencia', 'retiro'),
+                                         ultimo_id, 5, host, port, user,
+                                         password, database)
+        else:
+            conn = get_connection(host, port, user, password, database,
+                                  lectura=True)
+            cursor = conn.cursor()
+            
+            query = f"""
+                SELECT 
+                    u.nombre,
+                    u.apellido,
+                    ROUND(SUM(t.monto), 2) AS total_movido
+                FROM transaccion t
+                JOIN cuenta c ON t.id_cuenta_origen = c.id_cuenta
+                JOIN usuario u ON c.id_usuario = u.id_usuario
+                WHERE t.tipo IN ('transferencia', 'retiro')
+                  AND t.fecha >= DATE_SUB(NOW(), INTERVAL {MESES_VENTANA} MONTH)
+                GROUP BY u.id_usuario
+                ORDER BY total_movido DESC
+                LIMIT 5
+            """
+            
+            cursor.execute(query)
+            rows = list(_filas_cursor(cursor))
+            
+            cursor.close()
+            conn.close()
         
-        result: List[Dict[str, str]] = []
+        result = ResultadoCSV()
         for idx, row in enumerate(rows, 1):
             nombre, apellido, total_movido = row
             
@@ -337,23 +393,22 @@ def top_clientes_transacciones(host: str = None, port: int = None,
                 'Total Movido': f"$ {total_movido:,.2f}"
             })
         
-        cursor.close()
-        conn.close()
-        
         # Guardar en CSV
-        _write_csv(result, 'top_clientes.csv',
-                  ['Puesto', 'Cliente', 'Total Movido'])
+        _guardar(result, result, 'top_clientes.csv',
+                 ['Puesto', 'Cliente', 'Total Movido'], escribir)
         
         return result
         
     except Exception as e:
-        print(f"❌ Error en top_clientes_transacciones: {e}")
-        return []
+        if not abandonado():
+            print(f"❌ Error en top_clientes_transacciones: {e}")
+        return ResultadoError(str(e))
 
 
+@con_presupuesto('cuotas_pendientes', 'cuotas_pendientes.csv')
 def cuotas_pendientes(host: str = None, port: int = None,
                      user: str = None, password: str = None,
-                     database: str = None) -> List[Dict[str, str]]:
+                     database: str = None, escribir: bool = True) -> List[Dict[str, str]]:
     """Punto 5 - Genera reporte de préstamos con cuotas pendientes.
     
     Obtiene todos los préstamos que tienen al menos una cuota en estado 'pendiente'.
@@ -366,6 +421,8 @@ def cuotas_pendientes(host: str = None, port: int = None,
         user: Usuario MySQL (opcional)
         password: Contraseña MySQL (opcional)
         database: Base de datos (opcional)
+        escribir: Si False, no escribe el CSV y lo deja pendiente para
+            result.guardar() (lo usa la precarga de main.py)
     
     Returns:
         List[Dict[str, str]]: Lista de diccionarios con las claves:
@@ -385,7 +442,8 @@ def cuotas_pendientes(host: str = None, port: int = None,
         ]
     """
     try:
-        conn = get_connection(host, port, user, password, database)
+        conn = get_connection(host, port, user, password, database,
+                              lectura=True)
         cursor = conn.cursor()
         
         query = """
@@ -403,31 +461,34 @@ def cuotas_pendientes(host: str = None, port: int = None,
         """
         
         cursor.execute(query)
-        rows = cursor.fetchall()
         
-        result: List[Dict[str, str]] = []
-        for row in rows:
-            id_prestamo, dni, cuotas_pendientes, monto_total = row
-            
-            result.append({
-                'Préstamo': str(id_prestamo),
-                'DNI Cliente': dni,
-                'Cuotas Pendientes': str(cuotas_pendientes),
-                'Monto Total a Pagar': f"$ {monto_total:,.2f}"
-            })
+        result = ResultadoCSV()
+        
+        def filas() -> Iterator[Dict[str, str]]:
+            for id_prestamo, dni, cuotas_pendientes, monto_total in _filas_cursor(cursor):
+                fila = {
+                    'Préstamo': str(id_prestamo),
+                    'DNI Cliente': dni,
+                    'Cuotas Pendientes': str(cuotas_pendientes),
+                    'Monto Total a Pagar': f"$ {monto_total:,.2f}"
+                }
+                result.append(fila)
+                yield fila
+        
+        # Guardar en CSV a medida que se leen las filas
+        _guardar(result, filas(), 'cuotas_pendientes.csv',
+                 ['Préstamo', 'DNI Cliente', 'Cuotas Pendientes',
+                  'Monto Total a Pagar'], escribir)
         
         cursor.close()
         conn.close()
         
-        # Guardar en CSV
-        _write_csv(result, 'cuotas_pendientes.csv',
-                  ['Préstamo', 'DNI Cliente', 'Cuotas Pendientes', 'Monto Total a Pagar'])
-        
         return result
         
     except Exception as e:
-        print(f"❌ Error en cuotas_pendientes: {e}")
-        return []
+        if not abandonado():
+            print(f"❌ Error en cuotas_pendientes: {e}")
+        return ResultadoError(str(e))
 
 
 def crear_vista(host: str = None, port: int = None,
@@ -487,6 +548,7 @@ def crear_vista(host: str = None, port: int = None,
         return False
 
 
+@con_presupuesto('ver_resumen', 'resumen_cliente.csv')
 def ver_resumen(host: str = None, port: int = None,
                user: str = None, password: str = None,
                database: str = None) -> List[Dict[str, str]]:
@@ -534,48 +596,98 @@ def ver_resumen(host: str = None, port: int = None,
         """
         
         cursor.execute(query)
-        rows = cursor.fetchall()
         
-        result: List[Dict[str, str]] = []
-        for row in rows:
-            nombre_completo, cantidad_cuentas, cantidad_prestamos, saldo_total = row
-            
-            result.append({
-                'Nombre Completo': nombre_completo,
-                'Cantidad Cuentas': str(cantidad_cuentas),
-                'Cantidad Préstamos': str(cantidad_prestamos),
-                'Saldo Total': f"$ {saldo_total:,.2f}"
-            })
+        result = ResultadoCSV()
+        
+        def filas() -> Iterator[Dict[str, str]]:
+            for row in _filas_cursor(cursor):
+                nombre_completo, cantidad_cuentas, cantidad_prestamos, saldo_total = row
+                fila = {
+                    'Nombre Completo': nombre_completo,
+                    'Cantidad Cuentas': str(cantidad_cuentas),
+                    'Cantidad Préstamos': str(cantidad_prestamos),
+                    'Saldo Total': f"$ {saldo_total:,.2f}"
+                }
+                result.append(fila)
+                yield fila
+        
+        # Guardar en CSV a medida que se leen las filas
+        result.archivo = _write_csv(filas(), 'resumen_cliente.csv',
+                                    ['Nombre Completo', 'Cantidad Cuentas',
+                                     'Cantidad Préstamos', 'Saldo Total'])
         
         cursor.close()
         conn.close()
         
-        # Guardar en CSV
-        _write_csv(result, 'resumen_cliente.csv',
-                  ['Nombre Completo', 'Cantidad Cuentas', 'Cantidad Préstamos', 'Saldo Total'])
-        
         return result
         
     except Exception as e:
-        print(f"❌ Error en ver_resumen: {e}")
-        return []
+        if not abandonado():
+            print(f"❌ Error en ver_resumen: {e}")
+        return ResultadoError(str(e))
+
+
+def _restar_meses(fecha: dt.datetime, meses: int) -> dt.datetime:
+    """Resta meses como DATE_SUB de MySQL (el día se ajusta al fin de mes).
+    
+    Args:
+        fecha: Fecha base
+        meses: Meses a restar
+    """
+    total = fecha.year * 12 + (fecha.month - 1) - meses
+    anio, mes = total // 12, total % 12 + 1
+    dia = min(fecha.day, calendar.monthrange(anio, mes)[1])
+    return fecha.replace(year=anio, month=mes, day=dia)
+
+
+def _filas_cursor(cursor, tam_lote: int = TAM_LOTE_FETCH) -> Iterator[tuple]:
+    """Recorre las filas de un cursor con fetchmany, sin cargarlas todas.
+
+    Raises:
+        TimeoutError: Si vence el presupuesto del reporte en curso
+    """
+    while True:
+        if cancelado():
+            raise TimeoutError("presupuesto de latencia agotado")
+        lote = cursor.fetchmany(tam_lote)
+        if not lote:
+            break
+        yield from lote
 
 
-def _write_csv(data: List[Dict[str, str]], filename: str, fieldnames: List[str]) -> None:
+def _write_csv(data: Iterable[Dict[str, str]], filename: str, fieldnames: List[str],
+               compresion: Optional[str] = None) -> str:
     """Función auxiliar para escribir datos en formato CSV.
     
+    La escritura es atómica y, según la extensión del nombre, el parámetro
+    `compresion` o REPORTES_COMPRESION, comprimida en streaming (ver salida.py).
+    
     Args:
-        data: Lista de diccionarios con los datos
+        data: Diccionarios con los datos (lista o generador)
         filename: Nombre del archivo CSV
         fieldnames: Lista de nombres de columnas
+        compresion: 'gzip', 'zstd', 'xz' o 'ninguna' (opcional)
+    
+    Returns:
+        str: Ruta del archivo generado
     """
     here = os.path.dirname(os.path.abspath(__file__))
     output_path = os.path.join(here, filename)
-    
-    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
-    
-    with open(output_path, 'w', encoding='utf-8-sig', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        for row in data:
-            writer.writerow(row)
+    return escribir_csv(data, output_path, fieldnames, compresion)
+
+
+def _guardar(result: ResultadoCSV, filas: Iterable[Dict[str, str]], filename: str,
+             fieldnames: List[str], escribir: bool = True) -> None:
+    """Escribe el CSV del reporte o, con escribir=False, lo deja pendiente.
+
+    Sin escribir, las filas igual se recorren (así completan `result`) y
+    result.guardar() escribe el CSV cuando alguien lo pide.
+    """
+    if escribir:
+        result.archivo = _write_csv(filas, filename, fieldnames)
+        return
+    if filas is not result:
+        for _ in filas:
+            pass
+    here = os.path.dirname(os.path.abspath(__file__))
+    result.pendiente = (os.path.join(here, filename), fieldnames)
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+cubo_olap.py
+
+Cubo OLAP precalculado sobre Transaccion.
+
+La tabla cubo_transaccion guarda, por (mes, tipo, producto, sede), la
+cantidad, suma, mínimo y máximo de los montos. Moneda (del producto) y país
+(de la ciudad de la sede) se guardan junto a cada celda para poder filtrar y
+agrupar por ellos sin joins. Producto y sede son los de la cuenta origen.
+
+La actualización es incremental: una marca de agua en cubo_estado indica el
+último id_transaccion agregado y cada corrida suma solo las transacciones
+nuevas con INSERT ... ON DUPLICATE KEY UPDATE. La marca avanza hasta
+cambios.tope_seguro() y no hasta MAX(id): un id menor todavía sin confirmar
+no queda salteado.
+
+Transaccion no recibe UPDATE, pero sí bajas: la purga de particiones
+(particiones.py), el archivo en frío (archivo_frio.py) y cualquier borrado
+manual. El cubo es acumulativo y no las descuenta: una transacción agregada
+sigue contando aunque se borre o se archive. Para que el cubo refleje solo
+las filas vivas hay que usar reconstruir_cubo().
+
+CuboOLAP carga el cubo (unas pocas miles de celdas) en un DataFrame y
+responde cortes con roll-up y drill-down en memoria, en milisegundos. Los
+montos de monedas distintas no se suman entre sí: todo corte se agrupa
+también por moneda.
+"""
+from typing import Dict, Iterable, List, Optional, Union
+import time
+import pandas as pd
+from database import get_connection
+from catalogos import obtener_catalogos
+from cambios import tope_seguro
+
+
+# Marcas de agua de los agregados incrementales (cubo, gasto de tarjetas)
+CREAR_TABLA_ESTADO = """
+    CREATE TABLE IF NOT EXISTS cubo_estado (
+        cubo VARCHAR(50) NOT NULL PRIMARY KEY,
+        ultimo_id BIGINT NOT NULL,
+        actualizado DATETIME NULL
+    )
+"""
+
+CREAR_TABLAS_CUBO = [
+    """
+    CREATE TABLE IF NOT EXISTS cubo_transaccion (
+        mes DATE NOT NULL,
+        tipo VARCHAR(20) NOT NULL,
+        id_producto INT NOT NULL,
+        id_sede INT NOT NULL,
+        id_moneda INT NOT NULL,
+        id_pais INT NOT NULL,
+        cantidad BIGINT NOT NULL,
+        suma DECIMAL(20, 2) NOT NULL,
+        minimo DECIMAL(15, 2) NOT NULL,
+        maximo DECIMAL(15, 2) NOT NULL,
+        PRIMARY KEY (mes, tipo, id_producto, id_sede)
+    )
+    """,
+    CREAR_TABLA_ESTADO,
+]
+
+AGREGAR_RANGO = """
+    INSERT INTO cubo_transaccion
+        (mes, tipo, id_producto, id_sede, id_moneda, id_pais,
+         cantidad, suma, minimo, maximo)
+    SELECT
+        DATE_FORMAT(t.fecha, '%%Y-%%m-01') AS mes,
+        t.tipo,
+        c.id_producto,
+        c.id_sede,
+        pr.id_moneda,
+        ci.id_pais,
+        COUNT(*),
+        SUM(t.monto),
+        MIN(t.monto),
+        MAX(t.monto)
+    FROM transaccion t
+    JOIN cuenta c ON t.id_cuenta_origen = c.id_cuenta
+    JOIN producto pr ON c.id_producto = pr.id_producto
+    JOIN sede s ON c.id_sede = s.id_sede
+    JOIN ciudad ci ON s.id_ciudad = ci.id_ciudad
+    WHERE t.id_transaccion > %s AND t.id_transaccion <= %s
+    GROUP BY mes, t.tipo, c.id_producto, c.id_sede, pr.id_moneda, ci.id_pais
+    ON DUPLICATE KEY UPDATE
+        cantidad = cantidad + VALUES(cantidad),
+        suma = suma + VALUES(suma),
+        minimo = LEAST(minimo, VALUES(minimo)),
+        maximo = GREATEST(maximo, VALUES(maximo))
+"""
+
+# Dimensión de consulta → columna del DataFrame del cubo
+DIMENSIONES = {
+    'anio': 'anio',
+    'trimestre': 'trimestre',
+    'mes': 'mes',
+    'tipo': 'tipo',
+    'producto': 'id_producto',
+    'moneda': 'id_moneda',
+    'sede': 'id_sede',
+    'pais': 'id_pais',
+}
+
+
+def _crear_tablas(cursor) -> None:
+    for ddl in CREAR_TABLAS_CUBO:
+        cursor.execute(ddl)
+    cursor.execute("INSERT IGNORE INTO cubo_estado (cubo, ultimo_id) "
+                   "VALUES ('transaccion', 0)")
+
+
+def actualizar_cubo(tam_lote: int = 200_000, host: str = None, port: int = None,
+                    user: str = None, password: str = None,
+                    database: str = None) -> int:
+    """Agrega al cubo las transacciones nuevas desde la última corrida.
+
+    Cada rango de `tam_lote` ids se agrega y la marca de agua avanza en la
+    misma transacción, así una corrida interrumpida no duplica montos. Solo
+    se agrega hasta el tope seguro (ver cambios.tope_seguro); si hay
+    escrituras abiertas que no terminan a tiempo, la corrida no agrega nada.
+
+    Args:
+        tam_lote: Ids de transacción por lote
+        host: Servidor MySQL (opcional)
+        port: Puerto MySQL (opcional)
+        user: Usuario MySQL (opcional)
+        password: Contraseña MySQL (opcional)
+        database: Base de datos (opcional)
+
+    Returns:
+        int: Transacciones agregadas, o -1 si hubo un error
+
+    Ejemplo:
+        >>> actualizar_cubo()
+        1500
+    """
+    try:
+        conn = get_connection(host, port, user, password, database)
+        cursor = conn.cursor()
+        _crear_tablas(cursor)
+        conn.commit()
+
+        tope = tope_seguro(conn, 'transaccion', 'id_transaccion')
+        if tope is None:
+            print("⚠️  Hay escrituras en curso sobre transaccion; el cubo se "
+                  "actualizará en la próxima corrida")
+            cursor.close()
+            conn.close()
+            return 0
+
+        total = 0
+        while True:
+            cursor.execute("SELECT ultimo_id FROM cubo_estado "
+                           "WHERE cubo = 'transaccion' FOR UPDATE")
+            marca = cursor.fetchone()[0]
+            if marca >= tope:
+                conn.rollback()
+                break
+            hasta = min(marca + tam_lote, tope)
+            cursor.execute("SELECT COUNT(*) FROM transaccion "
+                           "WHERE id_transaccion > %s AND id_transaccion <= %s",
+                           (marca, hasta))
+            total += cursor.fetchone()[0]
+            cursor.execute(AGREGAR_RANGO, (marca, hasta))
+            cursor.execute("UPDATE cubo_estado SET ultimo_id = %s, actualizado = NOW() "
+                           "WHERE cubo = 'transaccion'", (hasta,))
+            conn.commit()
+
+        cursor.close()
+        conn.close()
+        return total
+
+    except Exception as e:
+        print(f"❌ Error en actualizar_cubo: {e}")
+        return -1
+
+
+def reconstruir_cubo(host: str = None, port: int = None,
+                     user: str = None, password: str = None,
+                     database: str = None) -> int:
+    """Vacía el cubo y lo vuelve a calcular desde cero.
+
+    Hace falta si cambió el producto o la sede de cuentas existentes, o para
+    descontar transacciones borradas. Las transacciones ya purgadas o movidas
+    al archivo en frío dejan de contar.
+
+    Returns:
+        int: Transacciones agregadas, o -1 si hubo un error
+    """
+    try:
+        conn = get_connection(host, port, user, password, database)
+        cursor = conn.cursor()
+        _crear_tablas(cursor)
+        cursor.execute("DELETE FROM cubo_transaccion")
+        cursor.execute("UPDATE cubo_estado SET ultimo_id = 0 WHERE cubo = 'transaccion'")
+        conn.commit()
+        cursor.close()
+        conn.close()
+    except Exception as e:
+        print(f"❌ Error en reconstruir_cubo: {e}")
+        return -1
+    return actualizar_cubo(host=host, port=port, user=user,
+                           password=password, database=database)
+
+
+class CuboOLAP:
+    """Cubo en memoria con consultas de roll-up y drill-down.
+
+    Args:
+        ttl: Segundos durante los que no se verifica la marca de agua
+    """
+
+    def __init__(self, ttl: float = 60.0):
+        self.ttl = ttl
+        self.celdas: Optional[pd.DataFrame] = None
+        self.ultimo_id: Optional[int] = None
+        self._verificado = 0.0
+        self._catalogos = None
+
+    def asegurar(self, host: str = None, port: int = None,
+                 user: str = None, password: str = None,
+                 database: str = None) -> 'CuboOLAP':
+        """Carga el cubo si cambió su marca de agua desde la última lectura."""
+        if self.celdas is not None and time.monotonic() - self._verificado < self.ttl:
+            return self
+        self._catalogos = obtener_catalogos(host, port, user, password, database)
+        conn = get_connection(host, port, user, password, database, lectura=True)
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT ultimo_id FROM cubo_estado WHERE cubo = 'transaccion'")
+            fila = cursor.fetchone()
+            ultimo_id = fila[0] if fila else 0
+            if self.celdas is None or ultimo_id != self.ultimo_id:
+                cursor.execute("""
+                    SELECT mes, tipo, id_producto, id_sede, id_moneda, id_pais,
+                           cantidad,
+                           CAST(ROUND(suma * 100) AS SIGNED),
+                           CAST(ROUND(minimo * 100) AS SIGNED),
+                           CAST(ROUND(maximo * 100) AS SIGNED)
+                    FROM cubo_transaccion
+                """)
+                celdas = pd.DataFrame.from_records(
+                    cursor.fetchall(),
+                    columns=['mes', 'tipo', 'id_producto', 'id_sede', 'id_moneda',
+                             'id_pais', 'cantidad', 'suma_c', 'minimo_c', 'maximo_c'])
+                celdas['mes'] = pd.to_datetime(celdas['mes'])
+                celdas['anio'] = celdas['mes'].dt.year
+                celdas['trimestre'] = celdas['mes'].dt.to_period('Q').astype(str)
+                celdas['tipo'] = celdas['tipo'].astype('category')
+                for columna in ('cantidad', 'suma_c', 'minimo_c', 'maximo_c'):
+                    celdas[columna] = celdas[columna].astype('int64')
+                self.celdas = celdas
+                self.ultimo_id = ultimo_id
+            self._verificado = time.monotonic()
+        finally:
+            cursor.close()
+            conn.close()
+        return self
+
+    def consultar(self, dimensiones: Iterable[str] = (),
+                  filtros: Dict[str, Union[object, List]] = None,
+                  desde: str = None, hasta: str = None) -> pd.DataFrame:
+        """Agrega el cubo por las dimensiones pedidas.
+
+        Menos dimensiones es un roll-up; agregar una dimensión y filtrar por
+        un valor de la anterior es un drill-down. Si 'moneda' no está entre
+        las dimensiones se agrega al final: suma, mínimo, máximo y promedio
+        nunca mezclan montos de monedas distintas.
+
+        Args:
+            dimensiones: Subconjunto de 'anio', 'trimestre', 'mes', 'tipo',
+                'producto', 'moneda', 'sede' y 'pais'
+            filtros: Dimensión → valor o lista de valores (ids para producto,
+                moneda, sede y pais; texto para tipo; 'YYYY-MM' para mes)
+            desde: Primer mes incluido ('YYYY-MM')
+            hasta: Último mes incluido ('YYYY-MM')
+
+        Returns:
+            pd.DataFrame: Una fila por combinación con las dimensiones (y sus
+                nombres, siempre con 'id_moneda' y 'moneda_codigo'),
+                'cantidad', 'suma', 'minimo', 'maximo' y 'promedio'
+
+        Ejemplo:
+            >>> cubo = CuboOLAP().asegurar()
+            >>> cubo.consultar(['sede', 'mes'], {'tipo': 'retiro'}, desde='2023-01')
+        """
+        if self.celdas is None:
+            raise RuntimeError("El cubo no está cargado: llamar a asegurar() primero")
+        dimensiones = list(dimensiones)
+        for d in list(dimensiones) + list(filtros or {}):
+            if d not in DIMENSIONES:
+                raise ValueError(f"Dimensión desconocida: {d} "
+                                 f"(opciones: {', '.join(DIMENSIONES)})")
+
+        celdas = self.celdas
+        mascara = pd.Series(True, index=celdas.index)
+        if desde:
+            mascara &= celdas['mes'] >= pd.Timestamp(f"{desde}-01")
+        if hasta:
+            mascara &= celdas['mes'] <= pd.Timestamp(f"{hasta}-01")
+        for dimension, valor in (filtros or {}).items():
+            columna = celdas[DIMENSIONES[dimension]]
+            valores = valor if isinstance(valor, (list, tuple, set)) else [valor]
+            if dimension == 'mes':
+                valores = [pd.Timestamp(f"{v}-01") for v in valores]
+            mascara &= columna.isin(valores)
+        celdas = celdas[mascara]
+
+        if 'moneda' not in dimensiones:
+            dimensiones.append('moneda')
+        columnas = [DIMENSIONES[d] for d in dimensiones]
+        agrupado = celdas.groupby(columnas, observed=True, sort=True).agg(
+            cantidad=('cantidad', 'sum'), suma_c=('suma_c', 'sum'),
+            minimo_c=('minimo_c', 'min'), maximo_c=('maximo_c', 'max')
+        ).reset_index()
+
+        agrupado['suma'] = agrupado['suma_c'] / 100
+        agrupado['minimo'] = agrupado['minimo_c'] / 100
+        agrupado['maximo'] = agrupado['maximo_c'] / 100
+        agrupado['promedio'] = (agrupado['suma_c'] / agrupado['cantidad'] / 100).round(2)
+        agrupado = agrupado.drop(columns=['suma_c', 'minimo_c', 'maximo_c'])
+
+        # Nombres legibles para los ids
+        catalogos = self._catalogos
+        nombres = {
+            'id_sede': ('sede', lambda i: catalogos.sede[i].nombre),
+            'id_pais': ('país', lambda i: catalogos.pais[i].nombre),
+            'id_moneda': ('moneda_codigo', lambda i: catalogos.moneda[i].codigo),
+            'id_producto': ('producto_nombre', lambda i: catalogos.producto[i].nombre),
+        }
+        for columna, (nombre, resolver) in nombres.items():
+            if columna in agrupado:
+                agrupado.insert(agrupado.columns.get_loc(columna) + 1, nombre,
+                                agrupado[columna].map(resolver))
+        if 'mes' in agrupado:
+            agrupado['mes'] = agrupado['mes'].dt.strftime('%Y-%m')
+        return agrupado
+
+
+def main():
+    """Actualiza el cubo y muestra un corte de ejemplo."""
+    print("="*70)
+    print("  CUBO OLAP DE TRANSACCIONES")
+    print("="*70)
+
+    print("\n🔧 Actualizando cubo...")
+    agregadas = actualizar_cubo()
+    if agregadas < 0:
+        return
+    print(f"✅ Transacciones nuevas agregadas: {agregadas}")
+
+    cubo = CuboOLAP().asegurar()
+    print(f"   Celdas del cubo: {len(cubo.celdas)}")
+
+    inicio = time.perf_counter()
+    corte = cubo.consultar(['pais', 'tipo'])
+    duracion = (time.perf_counter() - inicio) * 1000
+    print(f"\n📊 VOLUMEN POR PAÍS Y TIPO ({duracion:.1f} ms):")
+    print("-"*70)
+    for fila in corte.itertuples(index=False):
+        print(f"{fila.país:<20} {fila.tipo:<16} {fila.moneda_codigo:<4} "
+              f"{fila.cantidad:>8} {fila.suma:>20,.2f}")
+
+
+if __name__ == '__main__':
+    main()
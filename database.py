@@ -5,10 +5,34 @@ database.py
 
 Configuración de conexión a la base de datos MySQL.
 Utiliza variables de entorno para las credenciales.
+
+Si MYSQL_REPLICAS está definida ("host:puerto,host:puerto"), las conexiones
+pedidas con `lectura=True` se envían a una réplica sana elegida por
+round robin o por menor latencia (MYSQL_REPLICA_ESTRATEGIA). Un hilo de
+fondo verifica cada réplica periódicamente: se descarta si no responde o si
+su retraso de replicación supera MYSQL_REPLICA_MAX_LAG segundos. La elección
+solo lee ese estado, de modo que ningún pedido espera un chequeo. Si ninguna
+réplica sirve (o todavía no se verificó ninguna), la conexión va al primario.
+DDL y escrituras usan siempre el primario.
+
+Dentro de un presupuesto de latencia (presupuestos.py) cada conexión nueva
+fija MAX_EXECUTION_TIME con el tiempo restante, de modo que el servidor
+aborta las consultas que ya no pueden entregarse a tiempo.
+
+Un proceso de larga duración (el demonio de reportes, demonio.py) puede
+habilitar un pool de conexiones con habilitar_pool() o MYSQL_POOL=<tamaño>:
+get_connection() entrega entonces conexiones ya abiertas del pool y
+close() las devuelve. Si el pool está agotado se abre una conexión directa.
+El pool solo atiende la configuración con la que se creó y no se usa con
+réplicas (el enrutador abre sus propias conexiones).
 """
+import contextvars
 import os
+import threading
+import time
 import mysql.connector
-from typing import Optional
+import mysql.connector.pooling
+from typing import Dict, List, Optional, Tuple
 
 
 def get_db_config() -> dict:
@@ -31,9 +55,358 @@ def get_db_config() -> dict:
     }
 
 
+def destino_conexion(host: str = None, port: int = None,
+                     database: str = None) -> Tuple[str, int, str]:
+    """Identifica la base de datos a la que apunta una conexión.
+
+    Los parámetros omitidos se completan con get_db_config(), de modo que
+    `destino_conexion()` y `destino_conexion('127.0.0.1', 3306, 'bancos')`
+    coinciden. Sirve de clave para los cachés que viven en memoria.
+
+    Returns:
+        Tuple[str, int, str]: (host, port, database)
+    """
+    config = get_db_config()
+    return (config['host'] if host is None else host,
+            config['port'] if port is None else int(port),
+            config['database'] if database is None else database)
+
+
+class Endpoint:
+    """Servidor MySQL con su estado de salud y estadísticas de uso."""
+
+    def __init__(self, host: str, port: int, rol: str):
+        self.host = host
+        self.port = port
+        self.rol = rol
+        self.sano = True
+        self.latencia_ms: Optional[float] = None
+        self.lag: Optional[int] = None
+        self.conexiones = 0
+        self.fallos = 0
+        self.ultimo_error: Optional[str] = None
+        self.verificado = 0.0
+
+    @property
+    def nombre(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    def registrar_latencia(self, ms: float) -> None:
+        """Actualiza la latencia con un promedio móvil exponencial."""
+        if self.latencia_ms is None:
+            self.latencia_ms = ms
+        else:
+            self.latencia_ms = 0.8 * self.latencia_ms + 0.2 * ms
+
+
+class Enrutador:
+    """Reparte las conexiones de lectura entre réplicas sanas.
+
+    Args:
+        replicas: Lista de (host, puerto)
+        estrategia: 'round_robin' o 'latencia'
+        max_lag: Retraso de replicación máximo tolerado (segundos)
+        intervalo_chequeo: Segundos entre verificaciones de cada réplica
+        timeout: Timeout de conexión a réplicas (segundos)
+
+    Los chequeos corren en un hilo de fondo que se inicia con la primera
+    conexión (necesita sus credenciales). Una réplica cuyo último chequeo es
+    más viejo que `vencimiento` (el hilo está trabado) no se usa.
+    """
+
+    def __init__(self, replicas: List[tuple], estrategia: str = 'round_robin',
+                 max_lag: int = 30, intervalo_chequeo: float = 10.0,
+                 timeout: int = 3):
+        if estrategia not in ('round_robin', 'latencia'):
+            raise ValueError(f"Estrategia de réplicas desconocida: {estrategia}")
+        self.replicas = [Endpoint(h, p, 'réplica') for h, p in replicas]
+        self.primario: Optional[Endpoint] = None
+        self.estrategia = estrategia
+        self.max_lag = max_lag
+        self.intervalo_chequeo = intervalo_chequeo
+        self.timeout = timeout
+        self.vencimiento = 3 * intervalo_chequeo + timeout * len(self.replicas)
+        self._turno = 0
+        self._lock = threading.Lock()
+        self._credenciales: Optional[dict] = None
+        self._monitor: Optional[threading.Thread] = None
+        self._detener = threading.Event()
+
+    @staticmethod
+    def _leer_lag(cursor) -> Optional[int]:
+        """Retorna el retraso de la réplica en segundos.
+
+        None indica que la replicación está detenida. Un servidor sin
+        replicación configurada (copia de solo lectura) o sin permiso
+        REPLICATION CLIENT se informa con retraso 0.
+        """
+        for consulta, columna in (("SHOW REPLICA STATUS", 'Seconds_Behind_Source'),
+                                  ("SHOW SLAVE STATUS", 'Seconds_Behind_Master')):
+            try:
+                cursor.execute(consulta)
+            except mysql.connector.Error:
+                continue
+            fila = cursor.fetchone()
+            cursor.fetchall()
+            if fila is None:
+                return 0
+            return fila[[d[0] for d in cursor.description].index(columna)]
+        return 0
+
+    def _verificar(self, endpoint: Endpoint, config: dict) -> None:
+        """Chequeo de salud: conecta, mide latencia y lee el retraso."""
+        latencia = lag = None
+        try:
+            inicio = time.perf_counter()
+            conn = mysql.connector.connect(**config, host=endpoint.host,
+                                           port=endpoint.port,
+                                           connection_timeout=self.timeout)
+            try:
+                cursor = conn.cursor()
+                cursor.execute("SELECT 1")
+                cursor.fetchall()
+                latencia = (time.perf_counter() - inicio) * 1000
+                lag = self._leer_lag(cursor)
+                cursor.close()
+            finally:
+                conn.close()
+            sano = lag is not None and lag <= self.max_lag
+            error = None if sano else f"retraso de replicación: {lag}"
+        except Exception as e:
+            sano, error = False, str(e)
+        with self._lock:
+            if latencia is not None:
+                endpoint.registrar_latencia(latencia)
+                endpoint.lag = lag
+            endpoint.sano = sano
+            endpoint.ultimo_error = error
+            endpoint.verificado = time.monotonic()
+
+    def _chequear(self) -> None:
+        """Hilo de fondo: verifica todas las réplicas cada intervalo_chequeo."""
+        while not self._detener.is_set():
+            for endpoint in self.replicas:
+                if self._detener.is_set():
+                    return
+                self._verificar(endpoint, self._credenciales)
+            self._detener.wait(self.intervalo_chequeo)
+
+    def iniciar_chequeos(self, credenciales: dict) -> None:
+        """Inicia (una vez) el hilo de chequeos con las credenciales dadas."""
+        with self._lock:
+            self._credenciales = credenciales
+            if self._monitor is not None:
+                return
+            self._monitor = threading.Thread(target=self._chequear, daemon=True,
+                                             name='chequeo-replicas')
+        self._monitor.start()
+
+    def detener(self) -> None:
+        """Detiene el hilo de chequeos."""
+        self._detener.set()
+
+    def _candidatas(self) -> List[Endpoint]:
+        """Réplicas sanas en el orden en que deben intentarse.
+
+        Solo lee el estado que dejó el último chequeo: las réplicas nunca
+        verificadas o con un chequeo vencido no se consideran.
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            sanas = [e for e in self.replicas
+                     if e.sano and e.verificado and ahora - e.verificado <= self.vencimiento]
+            if self.estrategia == 'latencia':
+                return sorted(sanas, key=lambda e: e.latencia_ms or 0.0)
+            if not sanas:
+                return []
+            self._turno = (self._turno + 1) % len(sanas)
+            return sanas[self._turno:] + sanas[:self._turno]
+
+    def conectar(self, config: dict, lectura: bool):
+        """Abre una conexión en una réplica (si `lectura`) o en el primario."""
+        with self._lock:
+            if self.primario is None or \
+                    (self.primario.host, self.primario.port) != (config['host'], config['port']):
+                self.primario = Endpoint(config['host'], config['port'], 'primario')
+        if lectura:
+            credenciales = {k: v for k, v in config.items() if k not in ('host', 'port')}
+            self.iniciar_chequeos(credenciales)
+            for endpoint in self._candidatas():
+                try:
+                    inicio = time.perf_counter()
+                    conn = mysql.connector.connect(**credenciales, host=endpoint.host,
+                                                   port=endpoint.port,
+                                                   connection_timeout=self.timeout)
+                    endpoint.registrar_latencia((time.perf_counter() - inicio) * 1000)
+                    endpoint.conexiones += 1
+                    return conn
+                except Exception as e:
+                    # Failover: se marca caída hasta el próximo chequeo y se
+                    # prueba la siguiente
+                    with self._lock:
+                        endpoint.sano = False
+                        endpoint.fallos += 1
+                        endpoint.ultimo_error = str(e)
+        try:
+            inicio = time.perf_counter()
+            conn = mysql.connector.connect(**config)
+            self.primario.registrar_latencia((time.perf_counter() - inicio) * 1000)
+            self.primario.conexiones += 1
+            return conn
+        except Exception as e:
+            self.primario.fallos += 1
+            self.primario.ultimo_error = str(e)
+            raise
+
+    def estadisticas(self) -> List[Dict]:
+        """Estado y contadores de cada servidor."""
+        endpoints = ([self.primario] if self.primario else []) + self.replicas
+        return [{
+            'Servidor': e.nombre,
+            'Rol': e.rol,
+            'Sano': e.sano,
+            'Latencia (ms)': round(e.latencia_ms, 2) if e.latencia_ms is not None else None,
+            'Retraso (s)': e.lag,
+            'Conexiones': e.conexiones,
+            'Fallos': e.fallos,
+            'Último Error': e.ultimo_error
+        } for e in endpoints]
+
+
+# Instante (time.monotonic) en que vence el presupuesto de latencia del
+# reporte en curso; None fuera de un presupuesto.
+limite_consulta: contextvars.ContextVar = contextvars.ContextVar('limite_consulta',
+                                                                default=None)
+MARGEN_LIMITE_MS = 500
+
+
+def _aplicar_limite(conn) -> None:
+    """Fija MAX_EXECUTION_TIME en la sesión según el presupuesto vigente.
+
+    Raises:
+        TimeoutError: Si el presupuesto ya se agotó (no se inician consultas)
+    """
+    limite = limite_consulta.get()
+    if limite is None:
+        return
+    restante_ms = int((limite - time.monotonic()) * 1000)
+    if restante_ms <= 0:
+        conn.close()
+        raise TimeoutError("presupuesto de latencia agotado")
+    cursor = conn.cursor()
+    cursor.execute(f"SET SESSION MAX_EXECUTION_TIME = {restante_ms + MARGEN_LIMITE_MS}")
+    cursor.close()
+
+
+_enrutador: Optional[Enrutador] = None
+_enrutador_lock = threading.Lock()
+
+
+def get_enrutador() -> Optional[Enrutador]:
+    """Retorna el enrutador de réplicas del proceso (None sin MYSQL_REPLICAS).
+    
+    Variables de entorno:
+        MYSQL_REPLICAS: Réplicas como "host:puerto,host:puerto"
+        MYSQL_REPLICA_ESTRATEGIA: 'round_robin' (default) o 'latencia'
+        MYSQL_REPLICA_MAX_LAG: Retraso máximo en segundos (default 30)
+        MYSQL_REPLICA_CHEQUEO: Segundos entre chequeos de salud (default 10)
+    """
+    global _enrutador
+    replicas = os.getenv('MYSQL_REPLICAS', '').strip()
+    if not replicas:
+        return None
+    with _enrutador_lock:
+        if _enrutador is None:
+            lista = []
+            for item in replicas.split(','):
+                host, _, puerto = item.strip().rpartition(':')
+                lista.append((host, int(puerto)) if host else (puerto, 3306))
+            _enrutador = Enrutador(
+                lista,
+                estrategia=os.getenv('MYSQL_REPLICA_ESTRATEGIA', 'round_robin'),
+                max_lag=int(os.getenv('MYSQL_REPLICA_MAX_LAG', '30')),
+                intervalo_chequeo=float(os.getenv('MYSQL_REPLICA_CHEQUEO', '10')))
+        return _enrutador
+
+
+def estadisticas_conexiones() -> List[Dict]:
+    """Estadísticas por servidor del enrutador de réplicas ([] si no hay réplicas)."""
+    enrutador = get_enrutador()
+    return enrutador.estadisticas() if enrutador else []
+
+
+POOL_MAXIMO = mysql.connector.pooling.CNX_POOL_MAXSIZE
+
+_pool = None
+_pool_config: Optional[dict] = None
+_pool_lock = threading.Lock()
+_pool_desbordes = 0
+
+
+def habilitar_pool(tamano: int = 8) -> None:
+    """Crea el pool de conexiones del proceso con la configuración por defecto.
+
+    Las conexiones se abren al crearlo. Llamarlo de nuevo no hace nada si el
+    pool ya existe.
+
+    Args:
+        tamano: Conexiones del pool (máximo POOL_MAXIMO)
+    """
+    global _pool, _pool_config
+    with _pool_lock:
+        if _pool is not None:
+            return
+        config = get_db_config()
+        _pool = mysql.connector.pooling.MySQLConnectionPool(
+            pool_name='reportes', pool_size=max(1, min(tamano, POOL_MAXIMO)),
+            pool_reset_session=True, **config)
+        _pool_config = config
+
+
+def estadisticas_pool() -> Optional[Dict]:
+    """Tamaño del pool y conexiones directas abiertas por agotamiento (None sin pool)."""
+    if _pool is None:
+        return None
+    return {'Tamaño': _pool.pool_size, 'Desbordes': _pool_desbordes}
+
+
+def _conexion_pool(config: dict):
+    """Conexión del pool si corresponde a `config`, o None."""
+    global _pool_desbordes
+    if _pool is None and os.getenv('MYSQL_POOL'):
+        habilitar_pool(int(os.getenv('MYSQL_POOL')))
+    if _pool is None or config != _pool_config:
+        return None
+    try:
+        return _pool.get_connection()
+    except mysql.connector.errors.PoolError:
+        with _pool_lock:
+            _pool_desbordes += 1
+        return None
+
+
+def reiniciar_tras_fork() -> None:
+    """Descarta el pool y el enrutador heredados de un proceso padre.
+
+    Un proceso creado con fork hereda los sockets de las conexiones del pool
+    del padre (usarlos desde dos procesos mezcla los protocolos) y un
+    enrutador cuyo hilo de chequeos no existe en el hijo. Sirve como
+    `initializer` de ProcessPoolExecutor: las conexiones no se cierran (el
+    padre las sigue usando), solo se olvidan, y el hijo arma las suyas.
+    """
+    global _pool, _pool_config, _pool_lock, _pool_desbordes
+    global _enrutador, _enrutador_lock
+    _pool = None
+    _pool_config = None
+    _pool_lock = threading.Lock()
+    _pool_desbordes = 0
+    _enrutador = None
+    _enrutador_lock = threading.Lock()
+
+
 def get_connection(host: str = None, port: int = None,
                   user: str = None, password: str = None,
-                  database: str = None):
+                  database: str = None, lectura: bool = False):
     """Crea y retorna una conexión a la base de datos MySQL.
     
     Args:
@@ -42,12 +415,18 @@ def get_connection(host: str = None, port: int = None,
         user: Usuario MySQL (default: desde get_db_config())
         password: Contraseña MySQL (default: desde get_db_config())
         database: Base de datos (default: desde get_db_config())
+        lectura: Si True y hay réplicas configuradas, la conexión se abre en
+            una réplica sana (solo para consultas de lectura). Un `host`
+            explícito desactiva el ruteo.
+            Sin réplicas, si hay pool (ver habilitar_pool()) la conexión sale
+            del pool y close() la devuelve.
     
     Returns:
         mysql.connector.connection: Objeto de conexión MySQL
     
     Raises:
         mysql.connector.Error: Si hay error en la conexión
+        TimeoutError: Si se pide dentro de un presupuesto de latencia ya vencido
     
     Ejemplo:
         >>> try:
@@ -73,4 +452,10 @@ def get_connection(host: str = None, port: int = None,
     if database is not None:
         config['database'] = database
     
-    return mysql.connector.connect(**config)
+    enrutador = get_enrutador() if host is None else None
+    if enrutador is not None:
+        conn = enrutador.conectar(config, lectura)
+    else:
+        conn = _conexion_pool(config) or mysql.connector.connect(**config)
+    _aplicar_limite(conn)
+    return conn
@@ -0,0 +1,561 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+demonio.py
+
+Demonio local de reportes y cliente liviano para hablar con él.
+
+Cada ejecución de main.py o de un punto*.py paga el arranque de Python, la
+importación de mysql.connector, una conexión nueva y cachés vacías. El
+demonio es un proceso de larga duración que mantiene ese estado caliente:
+- el pool de conexiones (database.habilitar_pool()),
+- la caché de catálogos y el índice de DNIs,
+- una caché de resultados por reporte y argumentos, con TTL por reporte y
+  un máximo de entradas (descarta las menos usadas).
+
+Escucha en un socket Unix (REPORTES_SOCKET, por defecto reportes.sock en
+XDG_RUNTIME_DIR o, si no está definido, en una carpeta 0700 del usuario
+dentro del directorio temporal; el socket tiene permisos 0600). Cada pedido y
+cada respuesta es un mensaje JSON precedido por su largo en 4 bytes; Decimal,
+fechas y las listas con atributos (ResultadoCSV, ResultadoObsoleto) viajan
+con una marca de tipo, así que recibir un mensaje nunca ejecuta código. Cada
+extremo verifica que el otro sea del mismo usuario (dueño del socket y
+SO_PEERCRED donde exista) antes de confiar en él. Los pedidos concurrentes
+se atienden en hilos; dos pedidos iguales en curso calculan el reporte una
+sola vez.
+
+El cliente (ejecutar()) solo importa la biblioteca estándar, así que quien lo
+usa arranca en milisegundos. Si el demonio no está corriendo, ejecutar()
+importa la misma función de REPORTES que usaría el demonio y la corre en el
+mismo proceso. Lo mismo si el demonio deja de responder: una respuesta que no
+avanza en TIMEOUT_RESPUESTA segundos (DEMONIO_TIMEOUT) se abandona y el
+reporte se corre localmente.
+
+Uso:
+    python demonio.py iniciar     # en primer plano (Ctrl+C para detener)
+    python demonio.py estado
+    python demonio.py invalidar   # vacía la caché de resultados
+    python demonio.py detener
+"""
+from typing import Any, Callable, Dict, Optional, Tuple
+from collections import OrderedDict
+from decimal import Decimal
+import datetime as dt
+import importlib
+import json
+import os
+import socket
+import stat
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+
+_UID = os.getuid() if hasattr(os, 'getuid') else None
+
+RUTA_SOCKET = os.getenv('REPORTES_SOCKET') or os.path.join(
+    os.getenv('XDG_RUNTIME_DIR') or os.path.join(tempfile.gettempdir(), f"reportes-{_UID or 0}"),
+    'reportes.sock')
+
+# nombre → (módulo, función, TTL de la caché de resultados en segundos).
+# TTL 0: no se cachea (el reporte escribe en la base o crea objetos).
+REPORTES: Dict[str, Tuple[str, str, float]] = {
+    'clientes_por_ubicacion': ('consultas', 'clientes_por_ubicacion', 300.0),
+    'saldo_por_moneda': ('consultas', 'saldo_por_moneda', 60.0),
+    'prestamos_activos': ('consultas', 'prestamos_activos', 60.0),
+    'top_clientes_transacciones': ('consultas', 'top_clientes_transacciones', 300.0),
+    'cuotas_pendientes': ('consultas', 'cuotas_pendientes', 60.0),
+    'crear_vista': ('consultas', 'crear_vista', 0.0),
+    'ver_resumen': ('consultas', 'ver_resumen', 60.0),
+    'perfil_cliente': ('perfil_cliente', 'perfil_cliente', 30.0),
+    'reporte_tarjetas': ('tarjetas', 'reporte_tarjetas', 0.0),
+    'saldos_jerarquicos': ('jerarquias', 'saldos_jerarquicos', 300.0),
+    'exportar_ranking': ('ranking', 'exportar_ranking', 300.0),
+}
+
+POOL_DEFAULT = 8
+MAX_RESULTADOS = 256
+TIMEOUT_CONEXION = 0.5
+# Holgado: los reportes tienen su propio presupuesto (presupuestos.py) y el
+# demonio responde con el resultado obsoleto al vencer; esto solo corta a un
+# demonio colgado
+TIMEOUT_RESPUESTA = float(os.getenv('DEMONIO_TIMEOUT') or 300)
+_ENCABEZADO = struct.Struct('!I')
+_CREDENCIALES = struct.Struct('3i')  # pid, uid, gid de SO_PEERCRED
+
+# Listas con atributos que viajan por el socket: nombre → (módulo, clase).
+# La clase se importa recién al recibir una.
+_LISTAS = {
+    'ResultadoCSV': ('salida', 'ResultadoCSV'),
+    'ResultadoError': ('salida', 'ResultadoError'),
+    'ResultadoObsoleto': ('presupuestos', 'ResultadoObsoleto'),
+}
+_TIPO = '__tipo__'
+
+
+class DemonioNoDisponible(ConnectionError):
+    """No hay un demonio escuchando en el socket."""
+
+
+class SocketAjeno(DemonioNoDisponible):
+    """El socket (o el proceso que lo atiende) es de otro usuario."""
+
+
+def _a_json(valor: Any) -> Any:
+    """Convierte un valor en tipos de JSON, marcando los que no lo son."""
+    if isinstance(valor, dict):
+        if all(isinstance(k, str) for k in valor):
+            return {k: _a_json(v) for k, v in valor.items()}
+        return {_TIPO: 'dict', 'items': [[_a_json(k), _a_json(v)] for k, v in valor.items()]}
+    if isinstance(valor, (list, tuple)):
+        filas = [_a_json(v) for v in valor]
+        if type(valor).__name__ in _LISTAS:
+            return {_TIPO: type(valor).__name__, 'filas': filas,
+                    'atributos': {k: _a_json(v) for k, v in vars(valor).items()}}
+        return filas
+    if isinstance(valor, Decimal):
+        return {_TIPO: 'decimal', 'valor': str(valor)}
+    if isinstance(valor, dt.datetime):
+        return {_TIPO: 'datetime', 'valor': valor.isoformat()}
+    if isinstance(valor, dt.date):
+        return {_TIPO: 'date', 'valor': valor.isoformat()}
+    return valor
+
+
+def _desde_json(objeto: Dict) -> Any:
+    """object_hook de json.loads: reconstruye los valores marcados por _a_json()."""
+    tipo = objeto.get(_TIPO)
+    if tipo is None:
+        return objeto
+    if tipo == 'decimal':
+        return Decimal(objeto['valor'])
+    if tipo == 'datetime':
+        return dt.datetime.fromisoformat(objeto['valor'])
+    if tipo == 'date':
+        return dt.date.fromisoformat(objeto['valor'])
+    if tipo == 'dict':
+        return {tuple(k) if isinstance(k, list) else k: v for k, v in objeto['items']}
+    if tipo in _LISTAS:
+        modulo, clase = _LISTAS[tipo]
+        cls = getattr(importlib.import_module(modulo), clase)
+        lista = cls.__new__(cls)
+        lista.extend(objeto['filas'])
+        vars(lista).update(objeto['atributos'])
+        return lista
+    raise ValueError(f"Tipo desconocido en el mensaje: {tipo}")
+
+
+def _enviar(sock: socket.socket, mensaje: Any) -> None:
+    datos = json.dumps(_a_json(mensaje), ensure_ascii=False, default=str).encode('utf-8')
+    sock.sendall(_ENCABEZADO.pack(len(datos)) + datos)
+
+
+def _recibir_exacto(sock: socket.socket, n: int) -> bytes:
+    partes = []
+    while n:
+        parte = sock.recv(min(n, 1 << 20))
+        if not parte:
+            raise ConnectionError("conexión cerrada por el otro extremo")
+        partes.append(parte)
+        n -= len(parte)
+    return b''.join(partes)
+
+
+def _recibir(sock: socket.socket) -> Any:
+    largo, = _ENCABEZADO.unpack(_recibir_exacto(sock, _ENCABEZADO.size))
+    return json.loads(_recibir_exacto(sock, largo).decode('utf-8'), object_hook=_desde_json)
+
+
+def _uid_par(sock: socket.socket) -> Optional[int]:
+    """Usuario del proceso del otro extremo (None si el sistema no lo informa)."""
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return None
+    _, uid, _ = _CREDENCIALES.unpack(
+        sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, _CREDENCIALES.size))
+    return uid
+
+
+def _verificar_socket(ruta: str) -> None:
+    """Verifica que `ruta` sea un socket del usuario actual.
+
+    Raises:
+        DemonioNoDisponible: Si no existe
+        SocketAjeno: Si no es un socket o es de otro usuario
+    """
+    try:
+        info = os.lstat(ruta)
+    except FileNotFoundError as e:
+        raise DemonioNoDisponible(str(e)) from None
+    if not stat.S_ISSOCK(info.st_mode):
+        raise SocketAjeno(f"{ruta} no es un socket")
+    if _UID is not None and info.st_uid != _UID:
+        raise SocketAjeno(f"{ruta} es de otro usuario (uid {info.st_uid})")
+
+
+def _preparar_carpeta(carpeta: str) -> None:
+    """Crea la carpeta del socket (0700) y rechaza una que otros puedan alterar.
+
+    Se acepta una carpeta propia sin escritura de grupo ni de otros, o una de
+    root con sticky bit (como /tmp) si REPORTES_SOCKET apunta ahí.
+
+    Raises:
+        RuntimeError: Si la carpeta no es segura
+    """
+    os.makedirs(carpeta, mode=0o700, exist_ok=True)
+    if _UID is None:
+        return
+    info = os.stat(carpeta)
+    escribible = info.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+    if info.st_uid == _UID and not escribible:
+        return
+    if info.st_uid == 0 and info.st_mode & stat.S_ISVTX:
+        return
+    raise RuntimeError(f"La carpeta del socket {carpeta} es de otro usuario "
+                       f"o la pueden modificar otros usuarios")
+
+
+def _funcion(nombre: str) -> Callable:
+    """Importa (de forma diferida) la función de un reporte."""
+    if nombre not in REPORTES:
+        raise KeyError(f"Reporte desconocido: {nombre}")
+    modulo, funcion, _ = REPORTES[nombre]
+    return getattr(importlib.import_module(modulo), funcion)
+
+
+# ---------------------------------------------------------------------------
+# Cliente
+# ---------------------------------------------------------------------------
+
+def pedir(pedido: Dict, ruta: str = None) -> Any:
+    """Envía un pedido al demonio y retorna su respuesta.
+
+    Raises:
+        DemonioNoDisponible: Si no hay demonio escuchando
+        SocketAjeno: Si el socket o el proceso que lo atiende son de otro usuario
+        ConnectionError: Si la conexión se cortó o el demonio no respondió en
+            TIMEOUT_RESPUESTA segundos
+        RuntimeError: Si el demonio respondió con un error
+    """
+    ruta = ruta or RUTA_SOCKET
+    _verificar_socket(ruta)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(TIMEOUT_CONEXION)
+        try:
+            sock.connect(ruta)
+        except (FileNotFoundError, ConnectionRefusedError, socket.timeout) as e:
+            raise DemonioNoDisponible(str(e)) from None
+        uid = _uid_par(sock)
+        if _UID is not None and uid is not None and uid != _UID:
+            raise SocketAjeno(f"el proceso en {ruta} es de otro usuario (uid {uid})")
+        sock.settimeout(TIMEOUT_RESPUESTA)
+        try:
+            _enviar(sock, pedido)
+            respuesta = _recibir(sock)
+        except socket.timeout:
+            raise ConnectionError(f"sin respuesta en {TIMEOUT_RESPUESTA:g}s") from None
+    finally:
+        sock.close()
+    if not respuesta['ok']:
+        raise RuntimeError(respuesta['error'])
+    return respuesta['resultado']
+
+
+def disponible(ruta: str = None) -> bool:
+    """Indica si hay un demonio atendiendo en el socket."""
+    try:
+        pedir({'accion': 'ping'}, ruta)
+        return True
+    except (DemonioNoDisponible, ConnectionError, RuntimeError):
+        return False
+
+
+def ejecutar(nombre: str, *args, **kwargs) -> Any:
+    """Ejecuta un reporte en el demonio o, si no está corriendo, en este proceso.
+
+    Sin demonio se corre la misma función de REPORTES que correría él
+    (importada recién en ese momento), así el resultado no depende de si el
+    demonio está levantado.
+
+    Args:
+        nombre: Reporte de REPORTES
+        *args: Argumentos posicionales del reporte (por ejemplo el DNI)
+        **kwargs: Argumentos por nombre del reporte
+
+    Returns:
+        Any: Lo mismo que retorna la función del reporte
+
+    Ejemplo:
+        >>> data = ejecutar('saldo_por_moneda')
+        >>> data = ejecutar('prestamos_activos', '20000029')
+    """
+    try:
+        return pedir({'accion': 'reporte', 'reporte': nombre, 'args': args, 'kwargs': kwargs})
+    except SocketAjeno as e:
+        print(f"⚠️  Se ignora el socket del demonio: {e}; se ejecuta localmente")
+    except (DemonioNoDisponible, ConnectionError) as e:
+        if not isinstance(e, DemonioNoDisponible):
+            print(f"⚠️  El demonio de reportes no respondió ({e}); se ejecuta localmente")
+    return _funcion(nombre)(*args, **kwargs)
+
+
+# ---------------------------------------------------------------------------
+# Servidor
+# ---------------------------------------------------------------------------
+
+class CacheResultados:
+    """Resultados por (reporte, argumentos) con TTL y cálculo único en curso.
+
+    Guarda a lo sumo `maximo` resultados: al superarlo descarta los usados
+    hace más tiempo, y los vencidos se descartan al encontrarlos.
+
+    Args:
+        maximo: Resultados guardados (0: no guarda, solo evita cálculos
+            duplicados en curso)
+
+    Attributes:
+        aciertos: Pedidos servidos desde la caché
+        fallos: Pedidos que calcularon el reporte
+    """
+
+    def __init__(self, maximo: int = MAX_RESULTADOS):
+        self.maximo = maximo
+        self.aciertos = 0
+        self.fallos = 0
+        self._datos: 'OrderedDict[tuple, Tuple[float, Any]]' = OrderedDict()
+        self._en_curso: Dict[tuple, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._datos)
+
+    def _vigente(self, clave: tuple, ttl: float) -> Tuple[bool, Any]:
+        guardado = self._datos.get(clave)
+        if guardado is None:
+            return False, None
+        if time.monotonic() - guardado[0] >= ttl:
+            del self._datos[clave]
+            return False, None
+        self._datos.move_to_end(clave)
+        return True, guardado[1]
+
+    def obtener(self, nombre: str, args: tuple, kwargs: Dict) -> Tuple[Any, bool]:
+        """Retorna (resultado, desde_cache), calculando el reporte si hace falta."""
+        if nombre not in REPORTES:
+            raise KeyError(f"Reporte desconocido: {nombre}")
+        ttl = REPORTES[nombre][2]
+        if ttl <= 0:
+            with self._lock:
+                self.fallos += 1
+            return _funcion(nombre)(*args, **kwargs), False
+
+        clave = (nombre, args, tuple(sorted(kwargs.items())))
+        with self._lock:
+            hay, resultado = self._vigente(clave, ttl)
+            if hay:
+                self.aciertos += 1
+                return resultado, True
+            lock_clave = self._en_curso.setdefault(clave, threading.Lock())
+
+        try:
+            with lock_clave:
+                with self._lock:
+                    hay, resultado = self._vigente(clave, ttl)
+                    if hay:
+                        self.aciertos += 1
+                        return resultado, True
+                    self.fallos += 1
+                resultado = _funcion(nombre)(*args, **kwargs)
+                # Los vacíos, los errores (None/False) y los obsoletos no se guardan
+                if resultado and not getattr(resultado, 'obsoleto', False) and self.maximo > 0:
+                    with self._lock:
+                        self._datos[clave] = (time.monotonic(), resultado)
+                        self._datos.move_to_end(clave)
+                        while len(self._datos) > self.maximo:
+                            self._datos.popitem(last=False)
+                return resultado, False
+        finally:
+            with self._lock:
+                self._en_curso.pop(clave, None)
+
+    def invalidar(self, nombre: str = None) -> int:
+        """Descarta los resultados de un reporte (o todos); retorna cuántos."""
+        with self._lock:
+            claves = [c for c in self._datos if nombre is None or c[0] == nombre]
+            for clave in claves:
+                del self._datos[clave]
+        return len(claves)
+
+
+class DemonioReportes:
+    """Servidor de reportes sobre un socket Unix.
+
+    Args:
+        ruta: Ruta del socket
+        tamano_pool: Conexiones del pool MySQL
+        max_resultados: Resultados en la caché (ver CacheResultados)
+    """
+
+    def __init__(self, ruta: str = None, tamano_pool: int = POOL_DEFAULT,
+                 max_resultados: int = MAX_RESULTADOS):
+        self.ruta = ruta or RUTA_SOCKET
+        self.tamano_pool = tamano_pool
+        self.cache = CacheResultados(max_resultados)
+        self.iniciado: Optional[float] = None
+        self.pedidos = 0
+        self._servidor = None
+
+    def calentar(self) -> None:
+        """Abre el pool y carga catálogos e índice de DNIs."""
+        from database import habilitar_pool
+        from catalogos import obtener_catalogos
+        from indice_dni import obtener_indice_dni
+
+        habilitar_pool(self.tamano_pool)
+        obtener_catalogos()
+        obtener_indice_dni().actualizar()
+        for modulo in {m for m, _, _ in REPORTES.values()}:
+            importlib.import_module(modulo)
+
+    def estado(self) -> Dict:
+        """Estadísticas del demonio."""
+        from database import estadisticas_pool
+        return {
+            'PID': os.getpid(),
+            'Socket': self.ruta,
+            'Activo (s)': round(time.monotonic() - self.iniciado, 1) if self.iniciado else 0,
+            'Pedidos': self.pedidos,
+            'Aciertos de Caché': self.cache.aciertos,
+            'Reportes Calculados': self.cache.fallos,
+            'Resultados en Caché': len(self.cache),
+            'Pool': estadisticas_pool(),
+        }
+
+    def atender(self, pedido: Dict) -> Any:
+        """Resuelve un pedido y retorna el resultado."""
+        accion = pedido.get('accion')
+        if accion == 'reporte':
+            resultado, _ = self.cache.obtener(pedido['reporte'], tuple(pedido.get('args', ())),
+                                              pedido.get('kwargs', {}))
+            return resultado
+        if accion == 'ping':
+            return True
+        if accion == 'estado':
+            return self.estado()
+        if accion == 'invalidar':
+            return self.cache.invalidar(pedido.get('reporte'))
+        if accion == 'detener':
+            threading.Thread(target=self._servidor.shutdown, daemon=True).start()
+            return True
+        raise ValueError(f"Acción desconocida: {accion}")
+
+    def _liberar_socket(self) -> None:
+        """Borra un socket abandonado; falla si otro demonio lo está usando."""
+        _preparar_carpeta(os.path.dirname(os.path.abspath(self.ruta)))
+        if not os.path.lexists(self.ruta):
+            return
+        try:
+            _verificar_socket(self.ruta)
+        except SocketAjeno as e:
+            raise RuntimeError(f"No se puede usar {self.ruta}: {e}") from None
+        if disponible(self.ruta):
+            raise RuntimeError(f"Ya hay un demonio escuchando en {self.ruta}")
+        os.unlink(self.ruta)
+
+    def servir(self) -> None:
+        """Atiende pedidos hasta recibir 'detener' o Ctrl+C."""
+        import socketserver
+
+        demonio = self
+
+        class Manejador(socketserver.BaseRequestHandler):
+            def handle(self):
+                uid = _uid_par(self.request)
+                if _UID is not None and uid is not None and uid != _UID:
+                    return
+                try:
+                    pedido = _recibir(self.request)
+                except (ConnectionError, ValueError):
+                    return
+                demonio.pedidos += 1
+                try:
+                    respuesta = {'ok': True, 'resultado': demonio.atender(pedido)}
+                except Exception as e:
+                    respuesta = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+                try:
+                    _enviar(self.request, respuesta)
+                except (BrokenPipeError, ConnectionError):
+                    pass
+
+        self._liberar_socket()
+        mascara = os.umask(0o177)
+        try:
+            self._servidor = socketserver.ThreadingUnixStreamServer(self.ruta, Manejador)
+        finally:
+            os.umask(mascara)
+        self._servidor.daemon_threads = True
+        self.iniciado = time.monotonic()
+        try:
+            self._servidor.serve_forever()
+        finally:
+            self._servidor.server_close()
+            if os.path.exists(self.ruta):
+                os.unlink(self.ruta)
+
+
+def main():
+    """Inicia, consulta o detiene el demonio de reportes."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Demonio local de reportes')
+    parser.add_argument('accion', choices=['iniciar', 'estado', 'invalidar', 'detener'])
+    parser.add_argument('--reporte', help='Reporte a invalidar (default: todos)')
+    parser.add_argument('--pool', type=int, default=int(os.getenv('MYSQL_POOL') or POOL_DEFAULT),
+                        help='Conexiones del pool MySQL')
+    parser.add_argument('--cache', type=int, default=MAX_RESULTADOS,
+                        help='Resultados guardados en la caché')
+    args = parser.parse_args()
+
+    if args.accion == 'iniciar':
+        print("="*70)
+        print("  DEMONIO DE REPORTES")
+        print("="*70)
+        demonio = DemonioReportes(tamano_pool=args.pool, max_resultados=args.cache)
+        inicio = time.perf_counter()
+        try:
+            demonio.calentar()
+        except Exception as e:
+            print(f"❌ Error al calentar el demonio: {e}")
+            sys.exit(1)
+        print(f"\n🔥 Pool de {args.pool} conexiones y cachés listos en "
+              f"{time.perf_counter() - inicio:.2f}s")
+        print(f"🔌 Escuchando en {demonio.ruta} (Ctrl+C para detener)")
+        try:
+            demonio.servir()
+        except KeyboardInterrupt:
+            pass
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        print("\n👋 Demonio detenido")
+        return
+
+    try:
+        if args.accion == 'estado':
+            for clave, valor in pedir({'accion': 'estado'}).items():
+                print(f"  {clave:<22} {valor}")
+        elif args.accion == 'invalidar':
+            n = pedir({'accion': 'invalidar', 'reporte': args.reporte})
+            print(f"🧹 {n} resultados descartados")
+        else:
+            pedir({'accion': 'detener'})
+            print("👋 Demonio detenido")
+    except DemonioNoDisponible:
+        print(f"⚠️  No hay un demonio escuchando en {RUTA_SOCKET}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
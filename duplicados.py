@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+duplicados.py
+
+Detección de transacciones casi duplicadas.
+
+Dos transacciones se consideran posibles duplicados si tienen la misma huella
+(cuenta origen, cuenta destino, tipo y monto) y sus fechas difieren en menos
+de una ventana de tiempo. Es el patrón que dejan los reintentos de los
+canales: la misma operación subida dos veces con segundos de diferencia.
+
+DetectorDuplicados guarda en un OrderedDict la última aparición de cada
+huella, ordenado por fecha de aparición. Las entradas que salen de la ventana
+se descartan por el frente y, si se alcanza la capacidad, se descarta la más
+vieja, así que la memoria está acotada y el costo por evento es O(1)
+amortizado. Se asume que los eventos llegan aproximadamente en orden de
+fecha (como en la ingesta en línea y en el backfill, que recorre el
+historial ordenado por fecha). El detector de la ingesta además no deja que
+su reloj pase la hora actual (`reloj_actual=True`): un evento con fecha
+futura no puede expirar de golpe todas las entradas.
+
+La ingesta (ingesta.py) usa un detector por proceso (obtener_detector()) para
+rechazar los eventos sin clave de idempotencia que repiten una operación
+reciente. detectar_duplicados_historicos() recorre el historial existente en
+streaming con el mismo detector y reporta los sospechosos.
+"""
+from typing import Dict, Hashable, List, Optional, Tuple
+from collections import OrderedDict
+from decimal import Decimal
+import datetime as dt
+import threading
+from database import get_connection
+from consultas import _write_csv
+
+
+VENTANA_DEFAULT = dt.timedelta(seconds=120)
+CAPACIDAD_DEFAULT = 1_000_000
+
+
+def huella(id_cuenta_origen: int, id_cuenta_destino: Optional[int],
+           tipo: str, monto: Decimal) -> Tuple:
+    """Clave que identifica una operación repetida."""
+    return (id_cuenta_origen, id_cuenta_destino, tipo, Decimal(monto).quantize(Decimal('0.01')))
+
+
+class DetectorDuplicados:
+    """Detector de casi duplicados con ventana de tiempo y memoria acotada.
+
+    Attributes:
+        ventana: Diferencia máxima de fechas entre dos apariciones
+        capacidad: Máximo de huellas recordadas
+        descartadas: Huellas descartadas por capacidad (no por ventana); si
+            crece, la capacidad es chica para el volumen de la ventana
+        reloj_actual: Si True, el reloj interno no avanza más allá de la
+            hora actual (para eventos en línea; el backfill recorre fechas
+            pasadas y no lo usa)
+    """
+
+    def __init__(self, ventana: dt.timedelta = VENTANA_DEFAULT,
+                 capacidad: int = CAPACIDAD_DEFAULT,
+                 reloj_actual: bool = False):
+        self.ventana = ventana
+        self.capacidad = capacidad
+        self.reloj_actual = reloj_actual
+        self.descartadas = 0
+        self._vistas: 'OrderedDict[Hashable, Tuple[dt.datetime, object]]' = OrderedDict()
+        self._reloj: Optional[dt.datetime] = None
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._vistas)
+
+    def _expirar(self, fecha: dt.datetime) -> None:
+        if self.reloj_actual:
+            fecha = min(fecha, dt.datetime.now())
+        if self._reloj is None or fecha > self._reloj:
+            self._reloj = fecha
+        limite = self._reloj - self.ventana
+        while self._vistas:
+            vista, _ = next(iter(self._vistas.values()))
+            if vista >= limite:
+                break
+            self._vistas.popitem(last=False)
+
+    def buscar(self, clave: Hashable, fecha: dt.datetime) -> Optional[object]:
+        """Retorna la referencia de la aparición previa dentro de la ventana.
+
+        No registra la aparición (ver registrar()).
+        """
+        with self._lock:
+            self._expirar(fecha)
+            previa = self._vistas.get(clave)
+        if previa is not None and abs(fecha - previa[0]) <= self.ventana:
+            return previa[1]
+        return None
+
+    def registrar(self, clave: Hashable, fecha: dt.datetime, referencia: object = True) -> None:
+        """Registra una aparición de `clave` en `fecha`."""
+        with self._lock:
+            self._expirar(fecha)
+            self._vistas[clave] = (fecha, referencia)
+            self._vistas.move_to_end(clave)
+            if len(self._vistas) > self.capacidad:
+                self._vistas.popitem(last=False)
+                self.descartadas += 1
+
+    def observar(self, clave: Hashable, fecha: dt.datetime,
+                 referencia: object = True) -> Optional[object]:
+        """Busca y registra en un solo paso; retorna la referencia previa o None."""
+        with self._lock:
+            previa = self.buscar(clave, fecha)
+            self.registrar(clave, fecha, referencia)
+        return previa
+
+
+_detector: Optional[DetectorDuplicados] = None
+_detector_lock = threading.Lock()
+
+
+def obtener_detector() -> DetectorDuplicados:
+    """Retorna el detector compartido por la ingesta del proceso."""
+    global _detector
+    with _detector_lock:
+        if _detector is None:
+            _detector = DetectorDuplicados(reloj_actual=True)
+        return _detector
+
+
+def detectar_duplicados_historicos(ventana: dt.timedelta = VENTANA_DEFAULT,
+                                   tam_lote: int = 10_000,
+                                   capacidad: int = CAPACIDAD_DEFAULT,
+                                   host: str = None, port: int = None,
+                                   user: str = None, password: str = None,
+                                   database: str = None) -> List[Dict[str, str]]:
+    """Busca posibles duplicados en el historial de transacciones (backfill).
+
+    Recorre Transaccion ordenada por fecha con fetchmany, sin cargarla en
+    memoria, pasando cada fila por un DetectorDuplicados propio.
+
+    Args:
+        ventana: Diferencia máxima de fechas entre duplicados
+        tam_lote: Filas por fetchmany
+        capacidad: Máximo de huellas en memoria
+        host: Servidor MySQL (opcional)
+        port: Puerto MySQL (opcional)
+        user: Usuario MySQL (opcional)
+        password: Contraseña MySQL (opcional)
+        database: Base de datos (opcional)
+
+    Returns:
+        List[Dict[str, str]]: Lista de diccionarios con las claves:
+            - 'ID Transacción': Posible duplicado
+            - 'ID Original': Transacción previa con la misma huella
+            - 'Cuenta Origen', 'Cuenta Destino', 'Tipo', 'Monto', 'Fecha'
+            - 'Segundos': Diferencia con la original
+
+        Retorna lista vacía si hubo un error.
+
+    CSV generado: duplicados_transacciones.csv
+    """
+    try:
+        detector = DetectorDuplicados(ventana, capacidad)
+        conn = get_connection(host, port, user, password, database, lectura=True)
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT id_transaccion, id_cuenta_origen, id_cuenta_destino, tipo, monto, fecha
+            FROM transaccion
+            ORDER BY fecha, id_transaccion
+        """)
+
+        data = []
+        while True:
+            lote = cursor.fetchmany(tam_lote)
+            if not lote:
+                break
+            for id_t, origen, destino, tipo, monto, fecha in lote:
+                previa = detector.observar(huella(origen, destino, tipo, monto),
+                                           fecha, (id_t, fecha))
+                if previa is None:
+                    continue
+                id_original, fecha_original = previa
+                data.append({
+                    'ID Transacción': str(id_t),
+                    'ID Original': str(id_original),
+                    'Cuenta Origen': str(origen),
+                    'Cuenta Destino': '' if destino is None else str(destino),
+                    'Tipo': tipo,
+                    'Monto': f"$ {monto:,.2f}",
+                    'Fecha': str(fecha),
+                    'Segundos': str(int((fecha - fecha_original).total_seconds()))
+                })
+
+        cursor.close()
+        conn.close()
+
+        if detector.descartadas:
+            print(f"⚠️  Se descartaron {detector.descartadas} huellas por capacidad; "
+                  f"pueden faltar duplicados")
+
+        # Guardar en CSV
+        _write_csv(data, 'duplicados_transacciones.csv',
+                   ['ID Transacción', 'ID Original', 'Cuenta Origen', 'Cuenta Destino',
+                    'Tipo', 'Monto', 'Fecha', 'Segundos'])
+
+        return data
+
+    except Exception as e:
+        print(f"❌ Error en detectar_duplicados_historicos: {e}")
+        return []
+
+
+def main():
+    """Busca posibles duplicados en el historial de transacciones."""
+    print("="*70)
+    print("  POSIBLES TRANSACCIONES DUPLICADAS")
+    print("="*70)
+
+    data = detectar_duplicados_historicos()
+
+    print(f"\n🔁 {len(data)} posibles duplicados (ventana {VENTANA_DEFAULT.total_seconds():g}s)")
+    for item in data[:20]:
+        print(f"  #{item['ID Transacción']:<8} ≈ #{item['ID Original']:<8} "
+              f"{item['Tipo']:<15} {item['Monto']:>15} {item['Fecha']}")
+
+    print("\n✅ Archivo generado: duplicados_transacciones.csv")
+
+
+if __name__ == '__main__':
+    main()
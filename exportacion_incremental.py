@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+exportacion_incremental.py
+
+Exportación incremental (por diferencias) de los reportes de clientes por
+ubicación, resumen de cliente y cuotas pendientes.
+
+Cada reporte se lee con su clave (id_usuario o id_prestamo) ordenado por esa
+clave. El digest de la corrida anterior se guarda como dos arreglos NumPy
+ordenados (clave, hash de 64 bits de la fila), de modo que altas,
+modificaciones y bajas se obtienen en una sola pasada tipo merge, sin cargar
+el reporte en memoria.
+
+El delta se escribe en exportaciones/<reporte>.delta.<marca>.csv con una
+columna `_op`:
+    I  fila nueva          (aplicar como upsert)
+    U  fila modificada     (aplicar como upsert)
+    D  fila eliminada      (solo trae la clave)
+
+Las filas del delta se escriben a medida que se detectan. Opcionalmente se
+escribe también la foto completa en exportaciones/<reporte>.snapshot.csv, en
+paralelo desde un hilo con una cola acotada. El digest se guarda después del delta;
+si el proceso se interrumpe entre ambos, la próxima corrida vuelve a emitir
+esos cambios, lo que es inocuo porque I/U son upserts.
+"""
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+import datetime as dt
+import hashlib
+import os
+import queue
+import threading
+import numpy as np
+from database import get_connection
+from salida import escribir_csv
+
+
+EXPORTACIONES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 'exportaciones')
+
+
+class Exportacion(NamedTuple):
+    """Definición de un reporte exportable en forma incremental."""
+    consulta: str
+    clave: str
+    columnas: List[str]
+    formatear: Callable[[tuple], List[str]]
+
+
+EXPORTACIONES: Dict[str, Exportacion] = {
+    'clientes_ubicacion': Exportacion(
+        """
+        SELECT u.id_usuario, CONCAT(u.nombre, ' ', u.apellido), c.nombre, p.nombre
+        FROM usuario u
+        JOIN ciudad c ON u.id_ciudad = c.id_ciudad
+        JOIN pais p ON c.id_pais = p.id_pais
+        ORDER BY u.id_usuario
+        """,
+        'ID Usuario',
+        ['Cliente', 'Ciudad', 'País'],
+        lambda fila: [fila[0], fila[1], fila[2]]),
+    'resumen_cliente': Exportacion(
+        """
+        SELECT id_usuario, nombre_completo, cantidad_cuentas,
+               cantidad_prestamos, saldo_total
+        FROM v_resumen_cliente
+        ORDER BY id_usuario
+        """,
+        'ID Usuario',
+        ['Nombre Completo', 'Cantidad Cuentas', 'Cantidad Préstamos', 'Saldo Total'],
+        lambda fila: [fila[0], str(fila[1]), str(fila[2]), f"$ {fila[3]:,.2f}"]),
+    'cuotas_pendientes': Exportacion(
+        """
+        SELECT p.id_prestamo, u.dni, COUNT(c.id_cuota), ROUND(SUM(c.monto), 2)
+        FROM cuota c
+        JOIN prestamo p ON c.id_prestamo = p.id_prestamo
+        JOIN usuario u ON p.id_usuario = u.id_usuario
+        WHERE c.estado = 'pendiente'
+        GROUP BY p.id_prestamo, u.dni
+        ORDER BY p.id_prestamo
+        """,
+        'Préstamo',
+        ['DNI Cliente', 'Cuotas Pendientes', 'Monto Total a Pagar'],
+        lambda fila: [fila[0], str(fila[1]), f"$ {fila[2]:,.2f}"]),
+}
+
+
+def _hash_fila(valores: List[str]) -> int:
+    """Hash de 64 bits (con signo, para int64) de los valores de una fila."""
+    digest = hashlib.blake2b('\x1f'.join(valores).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little', signed=True)
+
+
+def _ruta_digest(nombre: str, carpeta: str) -> str:
+    return os.path.join(carpeta, f'{nombre}.digest.npz')
+
+
+def _cargar_digest(nombre: str, carpeta: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Lee el digest previo (claves y hashes ordenados por clave)."""
+    ruta = _ruta_digest(nombre, carpeta)
+    if not os.path.exists(ruta):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    with np.load(ruta) as datos:
+        return datos['claves'], datos['hashes']
+
+
+def _guardar_digest(nombre: str, carpeta: str, claves: np.ndarray,
+                    hashes: np.ndarray) -> None:
+    """Guarda el digest de forma atómica."""
+    ruta = _ruta_digest(nombre, carpeta)
+    temporal = os.path.join(carpeta, f'.{nombre}.digest.tmp.npz')
+    np.savez(temporal, claves=claves, hashes=hashes)
+    os.replace(temporal, ruta)
+
+
+class _SalidaEnHilo:
+    """Escribe con escribir_csv, desde un hilo, las filas que se le van pasando.
+
+    Permite generar un segundo CSV en la misma pasada sobre el cursor. La cola
+    es acotada: si el escritor se atrasa, agregar() espera.
+    """
+    _FIN = object()
+    _ABORTAR = object()
+
+    def __init__(self, ruta: str, columnas: List[str], tam_cola: int = 10_000):
+        self._cola: 'queue.Queue' = queue.Queue(maxsize=tam_cola)
+        self._error: Optional[BaseException] = None
+        self._recibido_fin = False
+        self.ruta: Optional[str] = None
+        self._hilo = threading.Thread(target=self._trabajar, args=(ruta, columnas),
+                                      name='exportacion-snapshot', daemon=True)
+        self._hilo.start()
+
+    def _filas(self) -> Iterator[Dict[str, str]]:
+        while True:
+            fila = self._cola.get()
+            if fila is self._FIN or fila is self._ABORTAR:
+                self._recibido_fin = True
+                if fila is self._ABORTAR:
+                    raise RuntimeError("exportación interrumpida")
+                return
+            yield fila
+
+    def _trabajar(self, ruta: str, columnas: List[str]) -> None:
+        try:
+            self.ruta = escribir_csv(self._filas(), ruta, columnas)
+        except BaseException as e:
+            self._error = e
+            # Vaciar la cola para que quien agrega no quede bloqueado
+            while not self._recibido_fin:
+                fila = self._cola.get()
+                self._recibido_fin = fila is self._FIN or fila is self._ABORTAR
+
+    def agregar(self, fila: Dict[str, str]) -> None:
+        if self._error is not None:
+            raise self._error
+        self._cola.put(fila)
+
+    def cerrar(self, abortar: bool = False) -> Optional[str]:
+        """Termina el archivo (o lo descarta) y retorna su ruta."""
+        self._cola.put(self._ABORTAR if abortar else self._FIN)
+        self._hilo.join()
+        if self._error is not None and not abortar:
+            raise self._error
+        return self.ruta
+
+
+def _filas(cursor, tam_lote: int) -> Iterator[tuple]:
+    while True:
+        lote = cursor.fetchmany(tam_lote)
+        if not lote:
+            return
+        yield from lote
+
+
+def exportar_incremental(nombre: str, snapshot: bool = False,
+                         carpeta: str = None, tam_lote: int = 10_000,
+                         host: str = None, port: int = None,
+                         user: str = None, password: str = None,
+                         database: str = None) -> Optional[Dict]:
+    """Exporta las diferencias de un reporte respecto de la corrida anterior.
+
+    La primera corrida (sin digest previo) emite todas las filas como altas.
+
+    Args:
+        nombre: 'clientes_ubicacion', 'resumen_cliente' o 'cuotas_pendientes'
+        snapshot: Si True, escribe también la foto completa del reporte
+        carpeta: Carpeta de salida y de digests (default: exportaciones/)
+        tam_lote: Filas por fetchmany
+        host: Servidor MySQL (opcional)
+        port: Puerto MySQL (opcional)
+        user: Usuario MySQL (opcional)
+        password: Contraseña MySQL (opcional)
+        database: Base de datos (opcional)
+
+    Returns:
+        Optional[Dict]: Diccionario con las claves 'Altas', 'Modificaciones',
+            'Bajas', 'Filas', 'Delta' (ruta o None si no hubo cambios) y
+            'Snapshot' (ruta o None), o None si hubo un error.
+
+    Ejemplo:
+        >>> r = exportar_incremental('cuotas_pendientes')
+        >>> r['Altas'], r['Modificaciones'], r['Bajas']
+        (0, 3, 1)
+    """
+    if nombre not in EXPORTACIONES:
+        print(f"❌ Error en exportar_incremental: reporte desconocido '{nombre}'")
+        return None
+    exportacion = EXPORTACIONES[nombre]
+    carpeta = carpeta or EXPORTACIONES_DIR
+    columnas_delta = ['_op', exportacion.clave] + exportacion.columnas
+    columnas_snapshot = [exportacion.clave] + exportacion.columnas
+
+    try:
+        os.makedirs(carpeta, exist_ok=True)
+        claves_previas, hashes_previos = _cargar_digest(nombre, carpeta)
+        nuevas_claves = np.empty(max(len(claves_previas), 1024), dtype=np.int64)
+        nuevos_hashes = np.empty_like(nuevas_claves)
+        conteo = {'I': 0, 'U': 0, 'D': 0, 'filas': 0}
+
+        def emitir_bajas(desde: int, fin: int) -> Iterator[Dict[str, str]]:
+            """Emite como bajas las claves previas en las posiciones [desde, fin)."""
+            for clave in claves_previas[desde:fin]:
+                conteo['D'] += 1
+                yield {'_op': 'D', exportacion.clave: str(clave)}
+
+        def recorrer(cursor, foto: Optional[_SalidaEnHilo]) -> Iterator[Dict[str, str]]:
+            """Recorre el reporte y produce las filas del delta."""
+            nonlocal nuevas_claves, nuevos_hashes
+            pos = 0
+            anterior = None
+            for fila in _filas(cursor, tam_lote):
+                clave = int(fila[0])
+                if anterior is not None and clave <= anterior:
+                    raise ValueError(f"claves fuera de orden en {nombre}: {clave}")
+                anterior = clave
+                valores = exportacion.formatear(fila[1:])
+                h = _hash_fila(valores)
+
+                n = conteo['filas']
+                if n == len(nuevas_claves):
+                    nuevas_claves = np.resize(nuevas_claves, 2 * n)
+                    nuevos_hashes = np.resize(nuevos_hashes, 2 * n)
+                nuevas_claves[n], nuevos_hashes[n] = clave, h
+                conteo['filas'] = n + 1
+
+                fin = int(np.searchsorted(claves_previas, clave, side='left'))
+                yield from emitir_bajas(pos, fin)
+                pos = max(fin, pos)
+                registro = dict(zip(columnas_snapshot, [str(clave)] + valores))
+                if foto is not None:
+                    foto.agregar(registro)
+                if pos < len(claves_previas) and claves_previas[pos] == clave:
+                    if hashes_previos[pos] != h:
+                        conteo['U'] += 1
+                        yield {'_op': 'U', **registro}
+                    pos += 1
+                else:
+                    conteo['I'] += 1
+                    yield {'_op': 'I', **registro}
+            yield from emitir_bajas(pos, len(claves_previas))
+
+        marca = dt.datetime.now().strftime('%Y%m%dT%H%M%S%f')
+        conn = get_connection(host, port, user, password, database,
+                              lectura=True)
+        cursor = conn.cursor()
+        foto = None
+        try:
+            cursor.execute(exportacion.consulta)
+            if snapshot:
+                foto = _SalidaEnHilo(os.path.join(carpeta, f'{nombre}.snapshot.csv'),
+                                     columnas_snapshot)
+            ruta_delta = escribir_csv(
+                recorrer(cursor, foto),
+                os.path.join(carpeta, f'{nombre}.delta.{marca}.csv'), columnas_delta)
+            ruta_snapshot = foto.cerrar() if foto is not None else None
+            foto = None
+        finally:
+            if foto is not None:
+                foto.cerrar(abortar=True)
+            cursor.close()
+            conn.close()
+
+        # Sin cambios no se publica un delta vacío
+        if not (conteo['I'] or conteo['U'] or conteo['D']):
+            os.remove(ruta_delta)
+            ruta_delta = None
+
+        n = conteo['filas']
+        _guardar_digest(nombre, carpeta, nuevas_claves[:n].copy(), nuevos_hashes[:n].copy())
+
+        return {
+            'Altas': conteo['I'],
+            'Modificaciones': conteo['U'],
+            'Bajas': conteo['D'],
+            'Filas': n,
+            'Delta': ruta_delta,
+            'Snapshot': ruta_snapshot
+        }
+
+    except Exception as e:
+        print(f"❌ Error en exportar_incremental: {e}")
+        return None
+
+
+def main():
+    """Exporta las diferencias de los tres reportes."""
+    print("="*70)
+    print("  EXPORTACIÓN INCREMENTAL DE REPORTES")
+    print("="*70)
+
+    for nombre in EXPORTACIONES:
+        print(f"\n🔎 {nombre}...")
+        r = exportar_incremental(nombre)
+        if r is None:
+            continue
+        print(f"   Filas: {r['Filas']} | Altas: {r['Altas']} | "
+              f"Modificaciones: {r['Modificaciones']} | Bajas: {r['Bajas']}")
+        if r['Delta']:
+            print(f"   ✅ Delta: {r['Delta']}")
+        else:
+            print("   ✅ Sin cambios desde la última exportación")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+extractos.py
+
+Generación masiva de extractos mensuales de cuenta.
+
+Cada extracto tiene el saldo inicial del mes, cada movimiento (incluidas las
+transferencias recibidas como id_cuenta_destino) con el saldo corrido y el
+saldo final.
+
+Las cuentas se reparten en rangos de id_cuenta entre un pool de procesos.
+Cada proceso obtiene los saldos iniciales del rango con
+libro_mayor.saldos_a_fecha() y hace una sola pasada por las transacciones
+del mes del rango, ordenadas por cuenta y fecha, leyendo con fetchmany. Cada
+extracto se escribe en cuanto termina su cuenta, así que la memoria de un
+proceso depende del tamaño del rango y no del volumen del mes.
+
+Formatos de salida:
+- 'archivos': extractos/<YYYY-MM>/<numero_cuenta>.csv, un archivo por cuenta
+  (respeta REPORTES_COMPRESION, ver salida.py).
+- 'archivo': extractos/extractos_<YYYY-MM>.csv, un único CSV con todas las
+  cuentas en orden de id_cuenta, más extractos_<YYYY-MM>.idx.csv con el byte
+  de inicio y el largo del extracto de cada cuenta. Con leer_extracto() se
+  lee una cuenta sin recorrer el archivo.
+"""
+from typing import Dict, Iterator, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+import csv
+import datetime as dt
+import io
+import itertools
+import os
+import shutil
+import time
+from database import get_connection, reiniciar_tras_fork
+from catalogos import obtener_catalogos
+from libro_mayor import saldos_a_fecha
+from salida import escribir_csv
+
+
+EXTRACTOS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'extractos')
+
+COLUMNAS = ['Fecha', 'Tipo', 'Detalle', 'Débito', 'Crédito', 'Saldo']
+
+# Movimientos del mes de un rango de cuentas, en el orden del extracto
+MOVIMIENTOS_RANGO = """
+    SELECT m.id_cuenta, m.fecha, m.id_transaccion, m.tipo, m.importe, cp.numero_cuenta
+    FROM (
+        SELECT t.id_cuenta_origen AS id_cuenta, t.fecha, t.id_transaccion, t.tipo,
+               CASE WHEN t.tipo = 'depósito' THEN t.monto ELSE -t.monto END AS importe,
+               t.id_cuenta_destino AS contraparte
+        FROM transaccion t
+        WHERE t.fecha >= %s AND t.fecha < %s
+          AND t.id_cuenta_origen BETWEEN %s AND %s
+        UNION ALL
+        SELECT t.id_cuenta_destino, t.fecha, t.id_transaccion, t.tipo,
+               t.monto, t.id_cuenta_origen
+        FROM transaccion t
+        WHERE t.fecha >= %s AND t.fecha < %s
+          AND t.tipo = 'transferencia'
+          AND t.id_cuenta_destino BETWEEN %s AND %s
+    ) m
+    LEFT JOIN cuenta cp ON cp.id_cuenta = m.contraparte
+    ORDER BY m.id_cuenta, m.fecha, m.id_transaccion
+"""
+
+
+def _limites_mes(mes: str) -> Tuple[dt.datetime, dt.datetime]:
+    """Retorna [inicio, fin) del mes 'YYYY-MM'."""
+    inicio = dt.datetime.strptime(mes, '%Y-%m')
+    total = inicio.year * 12 + inicio.month
+    return inicio, dt.datetime(total // 12, total % 12 + 1, 1)
+
+
+def _filas_extracto(movimientos: List[tuple], inicial: Decimal, simbolo: str,
+                    inicio: dt.datetime, fin: dt.datetime) -> Iterator[Dict[str, str]]:
+    """Arma las filas del extracto de una cuenta."""
+    saldo = inicial
+    yield {'Fecha': inicio.strftime('%Y-%m-%d'), 'Tipo': 'Saldo Inicial', 'Detalle': '',
+           'Débito': '', 'Crédito': '', 'Saldo': f"{simbolo} {saldo:,.2f}"}
+    for _, fecha, id_t, tipo, importe, contraparte in movimientos:
+        saldo += importe
+        if tipo == 'transferencia':
+            detalle = f"{'a' if importe < 0 else 'de'} {contraparte or 's/d'}"
+        else:
+            detalle = f"#{id_t}"
+        yield {
+            'Fecha': str(fecha),
+            'Tipo': tipo,
+            'Detalle': detalle,
+            'Débito': f"{simbolo} {-importe:,.2f}" if importe < 0 else '',
+            'Crédito': f"{simbolo} {importe:,.2f}" if importe >= 0 else '',
+            'Saldo': f"{simbolo} {saldo:,.2f}"
+        }
+    yield {'Fecha': (fin - dt.timedelta(days=1)).strftime('%Y-%m-%d'), 'Tipo': 'Saldo Final',
+           'Detalle': '', 'Débito': '', 'Crédito': '', 'Saldo': f"{simbolo} {saldo:,.2f}"}
+
+
+def _extractos_rango(tarea: Tuple) -> Dict:
+    """Genera los extractos de un rango de cuentas (corre en un proceso del pool).
+
+    Returns:
+        Dict: 'Cuentas', 'Movimientos', 'Parte' (ruta de la parte, formato
+            'archivo') e 'Indice' (lista de (numero_cuenta, inicio, largo)
+            relativa a la parte)
+    """
+    mes, id_desde, id_hasta, formato, carpeta, parte, tam_lote, conexion = tarea
+    inicio, fin = _limites_mes(mes)
+    catalogos = obtener_catalogos(**conexion)
+    iniciales = saldos_a_fecha(inicio, id_desde, id_hasta, **conexion)
+
+    conn = get_connection(lectura=True, **conexion)
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id_cuenta, numero_cuenta, id_producto
+        FROM cuenta
+        WHERE id_cuenta BETWEEN %s AND %s
+        ORDER BY id_cuenta
+    """, (id_desde, id_hasta))
+    cuentas = cursor.fetchall()
+
+    cursor.execute(MOVIMIENTOS_RANGO, (inicio, fin, id_desde, id_hasta,
+                                       inicio, fin, id_desde, id_hasta))
+
+    def filas() -> Iterator[tuple]:
+        while True:
+            lote = cursor.fetchmany(tam_lote)
+            if not lote:
+                return
+            yield from lote
+
+    por_cuenta = itertools.groupby(filas(), key=lambda fila: fila[0])
+    pendiente = next(por_cuenta, None)
+
+    resultado = {'Cuentas': 0, 'Movimientos': 0, 'Parte': None, 'Indice': []}
+    salida_parte = open(parte, 'wb') if formato == 'archivo' else None
+    try:
+        for id_cuenta, numero, id_producto in cuentas:
+            # Avanzar el stream hasta esta cuenta (descarta cuentas inexistentes)
+            while pendiente is not None and pendiente[0] < id_cuenta:
+                pendiente = next(por_cuenta, None)
+            movimientos: List[tuple] = []
+            if pendiente is not None and pendiente[0] == id_cuenta:
+                movimientos = list(pendiente[1])
+                pendiente = next(por_cuenta, None)
+
+            simbolo = catalogos.moneda_de_producto(id_producto).simbolo
+            extracto = _filas_extracto(movimientos, iniciales.get(id_cuenta, Decimal('0')),
+                                       simbolo, inicio, fin)
+            if salida_parte is None:
+                escribir_csv(extracto, os.path.join(carpeta, f'{numero}.csv'), COLUMNAS)
+            else:
+                buffer = io.StringIO()
+                escritor = csv.writer(buffer)
+                for fila in extracto:
+                    escritor.writerow([numero] + [fila[c] for c in COLUMNAS])
+                datos = buffer.getvalue().encode('utf-8')
+                resultado['Indice'].append((numero, salida_parte.tell(), len(datos)))
+                salida_parte.write(datos)
+            resultado['Cuentas'] += 1
+            resultado['Movimientos'] += len(movimientos)
+    finally:
+        if salida_parte is not None:
+            salida_parte.close()
+            resultado['Parte'] = parte
+        cursor.close()
+        conn.close()
+    return resultado
+
+
+def generar_extractos(mes: str, formato: str = 'archivos', procesos: Optional[int] = None,
+                      cuentas_por_tarea: int = 5_000, tam_lote: int = 10_000,
+                      carpeta: str = None, host: str = None, port: int = None,
+                      user: str = None, password: str = None,
+                      database: str = None) -> Optional[Dict]:
+    """Genera los extractos de todas las cuentas para un mes.
+
+    Args:
+        mes: Mes 'YYYY-MM'
+        formato: 'archivos' (uno por cuenta) o 'archivo' (único, con índice)
+        procesos: Procesos del pool (default: cantidad de CPUs)
+        cuentas_por_tarea: Tamaño de cada rango de id_cuenta
+        tam_lote: Filas por fetchmany
+        carpeta: Carpeta de salida (default: extractos/)
+        host: Servidor MySQL (opcional)
+        port: Puerto MySQL (opcional)
+        user: Usuario MySQL (opcional)
+        password: Contraseña MySQL (opcional)
+        database: Base de datos (opcional)
+
+    Returns:
+        Optional[Dict]: Diccionario con 'Cuentas', 'Movimientos', 'Salida'
+            (carpeta o archivo), 'Indice' (solo formato 'archivo'),
+            'Segundos' y 'Cuentas/s', o None si hubo un error.
+
+    Ejemplo:
+        >>> r = generar_extractos('2023-05', formato='archivo', procesos=4)
+        >>> leer_extracto('2023-05', 'CBU0000000042')[0]['Tipo']
+        'Saldo Inicial'
+    """
+    if formato not in ('archivos', 'archivo'):
+        print(f"❌ Error en generar_extractos: formato desconocido '{formato}'")
+        return None
+    conexion = dict(host=host, port=port, user=user, password=password, database=database)
+    carpeta = carpeta or EXTRACTOS_DIR
+    destino = os.path.join(carpeta, mes) if formato == 'archivos' else carpeta
+    inicio_reloj = time.perf_counter()
+    partes: List[str] = []
+    temporal = None
+
+    try:
+        _limites_mes(mes)
+        os.makedirs(destino, exist_ok=True)
+        conn = get_connection(**conexion)
+        cursor = conn.cursor()
+        cursor.execute("SELECT MIN(id_cuenta), MAX(id_cuenta) FROM cuenta")
+        minimo, maximo = cursor.fetchone()
+        cursor.close()
+        conn.close()
+
+        tareas = []
+        if minimo is not None:
+            for n, desde in enumerate(range(minimo, maximo + 1, cuentas_por_tarea)):
+                parte = os.path.join(carpeta, f'.extractos_{mes}.part{n:05d}')
+                partes.append(parte)
+                tareas.append((mes, desde, min(desde + cuentas_por_tarea - 1, maximo),
+                               formato, destino, parte, tam_lote, conexion))
+
+        resumen = {'Cuentas': 0, 'Movimientos': 0, 'Salida': destino, 'Indice': None}
+        archivo = indice = None
+        if formato == 'archivo':
+            archivo = os.path.join(carpeta, f'extractos_{mes}.csv')
+            indice = os.path.join(carpeta, f'extractos_{mes}.idx.csv')
+            resumen['Salida'], resumen['Indice'] = archivo, indice
+
+        # Los procesos no deben usar el pool ni el enrutador heredados (MYSQL_POOL)
+        with ProcessPoolExecutor(max_workers=procesos,
+                                 initializer=reiniciar_tras_fork) as pool:
+            temporal = os.path.join(carpeta, f'.extractos_{mes}.csv.tmp') if archivo else None
+            combinado = open(temporal, 'wb') if temporal else None
+            entradas_indice: List[Dict[str, str]] = []
+            try:
+                if combinado is not None:
+                    encabezado = io.StringIO()
+                    csv.writer(encabezado).writerow(['Cuenta'] + COLUMNAS)
+                    combinado.write(('\ufeff' + encabezado.getvalue()).encode('utf-8'))
+                # map entrega en orden de rango: el archivo queda ordenado por cuenta
+                for r in pool.map(_extractos_rango, tareas):
+                    resumen['Cuentas'] += r['Cuentas']
+                    resumen['Movimientos'] += r['Movimientos']
+                    if combinado is not None:
+                        base = combinado.tell()
+                        with open(r['Parte'], 'rb') as f:
+                            shutil.copyfileobj(f, combinado)
+                        os.remove(r['Parte'])
+                        entradas_indice.extend(
+                            {'Cuenta': numero, 'Inicio': str(base + desde), 'Largo': str(largo)}
+                            for numero, desde, largo in r['Indice'])
+            finally:
+                if combinado is not None:
+                    combinado.close()
+
+        if archivo:
+            os.replace(temporal, archivo)
+            escribir_csv(entradas_indice, indice, ['Cuenta', 'Inicio', 'Largo'], compresion='ninguna')
+
+    except Exception as e:
+        print(f"❌ Error en generar_extractos: {e}")
+        return None
+    finally:
+        for parte in partes + [temporal]:
+            if parte and os.path.exists(parte):
+                os.remove(parte)
+
+    segundos = time.perf_counter() - inicio_reloj
+    resumen['Segundos'] = round(segundos, 3)
+    resumen['Cuentas/s'] = round(resumen['Cuentas'] / segundos, 1)
+    return resumen
+
+
+def leer_extracto(mes: str, numero_cuenta: str, carpeta: str = None) -> List[Dict[str, str]]:
+    """Lee el extracto de una cuenta del archivo único usando su índice.
+
+    Returns:
+        List[Dict[str, str]]: Filas del extracto (columnas de COLUMNAS), o
+            lista vacía si la cuenta no está en el índice
+    """
+    carpeta = carpeta or EXTRACTOS_DIR
+    with open(os.path.join(carpeta, f'extractos_{mes}.idx.csv'), encoding='utf-8-sig') as f:
+        for entrada in csv.DictReader(f):
+            if entrada['Cuenta'] == numero_cuenta:
+                break
+        else:
+            return []
+    with open(os.path.join(carpeta, f'extractos_{mes}.csv'), 'rb') as f:
+        f.seek(int(entrada['Inicio']))
+        datos = f.read(int(entrada['Largo'])).decode('utf-8')
+    return [dict(zip(COLUMNAS, fila[1:])) for fila in csv.reader(io.StringIO(datos))]
+
+
+def main():
+    """Genera los extractos del mes anterior en un archivo único."""
+    print("="*70)
+    print("  EXTRACTOS MENSUALES DE CUENTA")
+    print("="*70)
+
+    hoy = dt.date.today().replace(day=1)
+    mes = (hoy - dt.timedelta(days=1)).strftime('%Y-%m')
+    print(f"\n⏳ Generando extractos de {mes}...")
+    r = generar_extractos(mes, formato='archivo')
+    if r is None:
+        return
+
+    print(f"\n✅ {r['Cuentas']} extractos, {r['Movimientos']} movimientos "
+          f"en {r['Segundos']} s ({r['Cuentas/s']} cuentas/s)")
+    print(f"   Archivo: {r['Salida']}")
+    print(f"   Índice:  {r['Indice']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+indice_dni.py
+
+Índice en memoria DNI → id_usuario construido desde usuario.dni.
+
+Los DNIs numéricos se guardan en dos arreglos NumPy paralelos ordenados por
+DNI (int64 + int32, 12 bytes por cliente) y se buscan con búsqueda binaria.
+Los DNIs que no son puramente numéricos, o que empiezan con 0 y perderían
+ese cero al convertirse a entero, van a un diccionario auxiliar.
+
+Un DNI desconocido se rechaza sin consultar la base de datos. Para no
+rechazar clientes recién dados de alta, ante un fallo se hace como máximo
+una actualización incremental (id_usuario > último id cargado) cada
+`intervalo_refresco` segundos. Cada actualización cuenta además los usuarios
+con id_usuario <= último id cargado: si son menos que los cargados hubo
+bajas y los arreglos se reconstruyen desde cero. Un DNI encontrado también
+dispara una actualización si la última tiene más de `ttl` segundos, así un
+usuario borrado deja de resolverse aunque no haya fallos. Se asume que el
+DNI de un usuario existente no cambia.
+"""
+from typing import Dict, Optional, Tuple
+import threading
+import time
+import numpy as np
+from database import destino_conexion, get_connection
+from presupuestos import cancelado
+
+
+class IndiceDNI:
+    """Conjunto ordenado de DNIs con su id_usuario."""
+
+    def __init__(self, intervalo_refresco: float = 5.0, tam_lote: int = 50_000,
+                 ttl: float = 300.0):
+        self.intervalo_refresco = intervalo_refresco
+        self.ttl = ttl
+        self.tam_lote = tam_lote
+        # (claves, ids) se reemplazan juntos para que las búsquedas
+        # concurrentes nunca vean arreglos de versiones distintas.
+        self.arreglos = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32))
+        self.extra: Dict[str, int] = {}
+        self.max_id = 0
+        self.filas = 0
+        self.cargado = False
+        self._ultimo_refresco = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.arreglos[0]) + len(self.extra)
+
+    @staticmethod
+    def _es_numerico(dni: str) -> bool:
+        """Indica si el DNI puede guardarse como entero sin perder información."""
+        return dni.isdigit() and not dni.startswith('0') and len(dni) <= 18
+
+    def actualizar(self, host: str = None, port: int = None,
+                   user: str = None, password: str = None,
+                   database: str = None) -> int:
+        """Incorpora los usuarios con id_usuario mayor al último cargado.
+
+        La primera llamada carga la tabla completa. Si desde la carga anterior
+        se borraron usuarios, se vuelve a cargar la tabla completa.
+
+        Args:
+            host: Servidor MySQL (opcional)
+            port: Puerto MySQL (opcional)
+            user: Usuario MySQL (opcional)
+            password: Contraseña MySQL (opcional)
+            database: Base de datos (opcional)
+
+        Returns:
+            int: Cantidad de usuarios leídos (todos si hubo reconstrucción)
+        """
+        with self._lock:
+            conn = get_connection(host, port, user, password, database)
+            cursor = conn.cursor()
+            try:
+                # Menos usuarios que los cargados hasta max_id: hubo bajas
+                cursor.execute("SELECT COUNT(*) FROM usuario WHERE id_usuario <= %s",
+                               (self.max_id,))
+                reconstruir = cursor.fetchone()[0] != self.filas
+                desde = 0 if reconstruir else self.max_id
+                cursor.execute("""
+                    SELECT id_usuario, dni
+                    FROM usuario
+                    WHERE id_usuario > %s
+                    ORDER BY id_usuario
+                """, (desde,))
+                nuevas_claves, nuevos_ids = [], []
+                nuevos_extra: Dict[str, int] = {}
+                max_id = desde
+                incorporados = 0
+                while True:
+                    # Dentro de un presupuesto vencido se abandona la carga;
+                    # el índice queda como estaba
+                    if cancelado():
+                        raise TimeoutError("presupuesto de latencia agotado")
+                    lote = cursor.fetchmany(self.tam_lote)
+                    if not lote:
+                        break
+                    incorporados += len(lote)
+                    for id_usuario, dni in lote:
+                        dni = str(dni).strip()
+                        if self._es_numerico(dni):
+                            nuevas_claves.append(int(dni))
+                            nuevos_ids.append(id_usuario)
+                        else:
+                            nuevos_extra[dni] = id_usuario
+                        max_id = max(max_id, id_usuario)
+            finally:
+                cursor.close()
+                conn.close()
+
+            # El estado se actualiza recién con la lectura completa: si falla
+            # a mitad, el próximo refresco vuelve a leer desde el max_id previo
+
+            # En una reconstrucción se parte de arreglos vacíos; los lectores
+            # siguen viendo los anteriores hasta el reemplazo
+            if reconstruir:
+                claves_previas = np.empty(0, dtype=np.int64)
+                ids_previos = np.empty(0, dtype=np.int32)
+                self.filas = 0
+            else:
+                claves_previas, ids_previos = self.arreglos
+            if nuevas_claves or reconstruir:
+                claves = np.concatenate([claves_previas,
+                                         np.asarray(nuevas_claves, dtype=np.int64)])
+                ids = np.concatenate([ids_previos,
+                                      np.asarray(nuevos_ids, dtype=np.int32)])
+                orden = np.argsort(claves, kind='stable')
+                self.arreglos = (claves[orden], ids[orden])
+            if reconstruir:
+                self.extra = nuevos_extra
+            else:
+                self.extra.update(nuevos_extra)
+            self.max_id = max_id
+            self.filas += incorporados
+
+            self.cargado = True
+            self._ultimo_refresco = time.monotonic()
+            return incorporados
+
+    def _buscar_local(self, dni: str) -> Optional[int]:
+        """Busca el DNI solo en memoria."""
+        if not self._es_numerico(dni):
+            return self.extra.get(dni)
+        clave = int(dni)
+        claves, ids = self.arreglos
+        pos = int(np.searchsorted(claves, clave))
+        if pos < len(claves) and claves[pos] == clave:
+            return int(ids[pos])
+        return None
+
+    def buscar(self, dni: str, host: str = None, port: int = None,
+               user: str = None, password: str = None,
+               database: str = None) -> Optional[int]:
+        """Retorna el id_usuario del DNI o None si no existe.
+
+        Args:
+            dni: DNI a buscar
+            host: Servidor MySQL para cargas y refrescos (opcional)
+            port: Puerto MySQL (opcional)
+            user: Usuario MySQL (opcional)
+            password: Contraseña MySQL (opcional)
+            database: Base de datos (opcional)
+
+        Returns:
+            Optional[int]: id_usuario, o None si el DNI no existe
+
+        Ejemplo:
+            >>> indice = obtener_indice_dni()
+            >>> indice.buscar('20000001')
+            1
+            >>> indice.buscar('99999999') is None
+            True
+        """
+        dni = dni.strip()
+        if not self.cargado:
+            self.actualizar(host, port, user, password, database)
+        id_usuario = self._buscar_local(dni)
+        if id_usuario is not None:
+            # Un acierto viejo puede ser un usuario ya borrado
+            if time.monotonic() - self._ultimo_refresco < self.ttl:
+                return id_usuario
+            self.actualizar(host, port, user, password, database)
+            return self._buscar_local(dni)
+        if time.monotonic() - self._ultimo_refresco >= self.intervalo_refresco:
+            if self.actualizar(host, port, user, password, database):
+                return self._buscar_local(dni)
+        return None
+
+
+_indices: Dict[Tuple[str, int, str], IndiceDNI] = {}
+_indices_lock = threading.Lock()
+
+
+def obtener_indice_dni(host: str = None, port: int = None,
+                       database: str = None) -> IndiceDNI:
+    """Retorna el índice de DNIs de una base de datos.
+
+    El proceso mantiene un índice por destino (host, port, database); los
+    parámetros omitidos se completan con get_db_config().
+    """
+    clave = destino_conexion(host, port, database)
+    indice = _indices.get(clave)
+    if indice is None:
+        with _indices_lock:
+            indice = _indices.setdefault(clave, IndiceDNI())
+    return indice
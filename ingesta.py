@@ -0,0 +1,563 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ingesta.py
+
+Ingesta de transacciones en línea por lotes.
+
+Recibe eventos 'depósito', 'retiro', 'transferencia', 'pago cuota' y
+'compra tarjeta', los valida contra los saldos, inserta las filas en
+Transaccion y actualiza Cuenta.saldo en la misma transacción. Los movimientos
+siguen las reglas de libro_mayor.py:
+- 'depósito' suma el monto a la cuenta origen.
+- 'retiro', 'pago cuota' y 'compra tarjeta' lo restan de la cuenta origen.
+- 'transferencia' lo resta de la cuenta origen y lo suma a la destino.
+
+Group commit: los eventos se procesan en grupos de `tam_grupo`. Cada grupo
+bloquea sus cuentas con un único SELECT ... FOR UPDATE ordenado por
+id_cuenta (todos los procesos de ingesta toman los bloqueos en el mismo
+orden, por lo que dos transferencias cruzadas no pueden interbloquearse),
+aplica los eventos en memoria, inserta las transacciones con executemany,
+actualiza los saldos netos y hace un solo COMMIT. Un evento que dejaría una
+cuenta en negativo se rechaza sin afectar al resto del grupo. Si MySQL igual
+aborta el grupo por deadlock o timeout de bloqueo, el grupo se reintenta
+completo.
+
+Fechas: un evento no puede estar más de ADELANTO_MAXIMO en el futuro ni ser
+anterior al último corte de saldo_checkpoint (libro_mayor.py). Los
+checkpoints no se recalculan al ingerir, así que un evento con fecha en un
+mes ya cerrado dejaría mal saldo_a_fecha(), la conciliación y los saldos
+iniciales de los extractos, por eso se rechaza.
+
+Deduplicación: un evento puede traer 'clave_idempotencia' (la genera el
+canal y la repite en cada reintento). Las claves se guardan en
+clave_idempotencia en la misma transacción que el movimiento, así que una
+clave ya confirmada se rechaza como repetida sin volver a aplicarse. Los
+eventos sin clave pasan por el detector de casi duplicados (duplicados.py):
+si repiten cuenta, destino, tipo y monto dentro de la ventana se rechazan
+como posibles duplicados.
+
+benchmark_ingesta() no escribe en las tablas reales: copia la estructura de
+Cuenta y Transaccion (y las filas de Cuenta) a un esquema de prueba
+<base>_benchmark, mide ahí y lo elimina al terminar.
+"""
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from decimal import Decimal, InvalidOperation
+import datetime as dt
+import itertools
+import random
+import threading
+import time
+from database import get_connection, get_db_config
+from duplicados import DetectorDuplicados, huella, obtener_detector
+
+
+TIPOS_CREDITO = {'depósito'}
+TIPOS_DEBITO = {'retiro', 'pago cuota', 'compra tarjeta', 'transferencia'}
+TIPOS = TIPOS_CREDITO | TIPOS_DEBITO
+
+# Errores de MySQL que abortan la transacción y justifican reintentar
+ERRORES_REINTENTABLES = {1205, 1213}  # lock wait timeout, deadlock
+
+MONTO_MAXIMO = Decimal('9999999999999.99')  # DECIMAL(15, 2)
+
+ER_NO_SUCH_TABLE = 1146
+
+# Adelanto máximo aceptado para la fecha de un evento respecto del reloj del
+# servidor (desfase entre relojes de los canales)
+ADELANTO_MAXIMO = dt.timedelta(minutes=5)
+
+# Esquema de prueba del benchmark: <base><SUFIJO_BENCHMARK>
+SUFIJO_BENCHMARK = '_benchmark'
+TABLAS_BENCHMARK = ('cuenta', 'transaccion')
+
+# Sin FK a transaccion: la tabla puede estar particionada (ver particiones.py)
+CREAR_TABLA_IDEMPOTENCIA = """
+    CREATE TABLE IF NOT EXISTS clave_idempotencia (
+        clave VARCHAR(100) NOT NULL PRIMARY KEY,
+        id_cuenta_origen INT NOT NULL,
+        creada DATETIME NOT NULL,
+        KEY idx_clave_idempotencia_creada (creada)
+    )
+"""
+
+INSERTAR_TRANSACCION = """
+    INSERT INTO transaccion
+        (id_cuenta_origen, id_cuenta_destino, monto, fecha, tipo, descripcion)
+    VALUES (%s, %s, %s, %s, %s, %s)
+"""
+
+
+class Evento(NamedTuple):
+    """Evento validado, listo para aplicarse."""
+    indice: int
+    tipo: str
+    origen: int
+    destino: Optional[int]
+    monto: Decimal
+    fecha: dt.datetime
+    descripcion: str
+    clave: Optional[str]
+
+
+def validar_evento(indice: int, evento: Dict,
+                   fecha_minima: Optional[dt.datetime] = None
+                   ) -> Tuple[Optional[Evento], Optional[str]]:
+    """Valida la forma de un evento (sin mirar saldos).
+
+    Args:
+        indice: Posición del evento en la entrada
+        evento: Diccionario con 'tipo', 'id_cuenta_origen', 'monto' y,
+            opcionalmente, 'id_cuenta_destino' (obligatorio en
+            transferencias), 'fecha' (a lo sumo ADELANTO_MAXIMO en el
+            futuro), 'descripcion' y 'clave_idempotencia'
+        fecha_minima: Fecha más antigua aceptada (el último corte de
+            saldo_checkpoint, ver _ultimo_corte())
+
+    Returns:
+        Tuple: (Evento, None) si es válido, o (None, motivo del rechazo)
+    """
+    tipo = evento.get('tipo')
+    if tipo not in TIPOS:
+        return None, f"tipo desconocido: {tipo!r}"
+    try:
+        origen = int(evento['id_cuenta_origen'])
+        monto = Decimal(str(evento['monto']))
+    except (KeyError, TypeError, ValueError, InvalidOperation):
+        return None, "id_cuenta_origen o monto inválido"
+    if not monto.is_finite() or monto <= 0 or monto > MONTO_MAXIMO:
+        return None, f"monto fuera de rango: {evento['monto']}"
+    if monto != monto.quantize(Decimal('0.01')):
+        return None, f"monto con más de 2 decimales: {evento['monto']}"
+
+    destino = evento.get('id_cuenta_destino')
+    if tipo == 'transferencia':
+        try:
+            destino = int(destino)
+        except (TypeError, ValueError):
+            return None, "transferencia sin id_cuenta_destino"
+        if destino == origen:
+            return None, "transferencia a la misma cuenta"
+    elif destino is not None:
+        return None, f"'{tipo}' no lleva id_cuenta_destino"
+
+    fecha = evento.get('fecha') or dt.datetime.now().replace(microsecond=0)
+    if isinstance(fecha, str):
+        try:
+            fecha = dt.datetime.fromisoformat(fecha)
+        except ValueError:
+            return None, f"fecha inválida: {fecha}"
+    if fecha.tzinfo is not None:
+        fecha = fecha.astimezone().replace(tzinfo=None)
+    # Una fecha futura adelantaría el reloj del detector de duplicados y
+    # expiraría todas sus entradas
+    if fecha > dt.datetime.now() + ADELANTO_MAXIMO:
+        return None, f"fecha futura: {fecha}"
+    if fecha_minima is not None and fecha < fecha_minima:
+        return None, f"fecha en un mes ya cerrado por los checkpoints: {fecha}"
+    descripcion = evento.get('descripcion') or tipo
+    clave = evento.get('clave_idempotencia')
+    if clave is not None:
+        clave = str(clave)
+        if not 0 < len(clave) <= 100:
+            return None, "clave_idempotencia vacía o de más de 100 caracteres"
+    return Evento(indice, tipo, origen, destino, monto, fecha, descripcion, clave), None
+
+
+def _ultimo_corte(cursor) -> Optional[dt.datetime]:
+    """Último corte de saldo_checkpoint (None si no hay checkpoints)."""
+    try:
+        cursor.execute("SELECT MAX(corte) FROM saldo_checkpoint")
+    except Exception as e:
+        if getattr(e, 'errno', None) == ER_NO_SUCH_TABLE:
+            return None
+        raise
+    corte = cursor.fetchone()[0]
+    return dt.datetime.combine(corte, dt.time()) if corte is not None else None
+
+
+def _grupos(eventos: Iterable[Dict], tam_grupo: int) -> Iterator[List[Tuple[int, Dict]]]:
+    iterador = enumerate(eventos)
+    while True:
+        grupo = list(itertools.islice(iterador, tam_grupo))
+        if not grupo:
+            return
+        yield grupo
+
+
+def _aplicar_grupo(cursor, eventos: List[Evento]) -> Tuple[List[Evento], List[Dict]]:
+    """Bloquea las cuentas del grupo y aplica los eventos sobre sus saldos.
+
+    Returns:
+        Tuple: (eventos aceptados, rechazos)
+    """
+    cuentas = sorted({e.origen for e in eventos} |
+                     {e.destino for e in eventos if e.destino is not None})
+    marcadores = ', '.join(['%s'] * len(cuentas))
+    cursor.execute(f"""
+        SELECT id_cuenta, saldo FROM cuenta
+        WHERE id_cuenta IN ({marcadores})
+        ORDER BY id_cuenta
+        FOR UPDATE
+    """, cuentas)
+    saldos: Dict[int, Decimal] = dict(cursor.fetchall())
+    iniciales = dict(saldos)
+
+    usadas = set()
+    claves = sorted({e.clave for e in eventos if e.clave is not None})
+    if claves:
+        marcadores = ', '.join(['%s'] * len(claves))
+        cursor.execute(f"""
+            SELECT clave FROM clave_idempotencia
+            WHERE clave IN ({marcadores})
+            FOR UPDATE
+        """, claves)
+        usadas = {fila[0] for fila in cursor.fetchall()}
+
+    aceptados: List[Evento] = []
+    rechazos: List[Dict] = []
+    for e in eventos:
+        if e.clave is not None and e.clave in usadas:
+            rechazos.append({'Índice': e.indice, 'Motivo': 'clave de idempotencia repetida'})
+            continue
+        if e.origen not in saldos or (e.destino is not None and e.destino not in saldos):
+            rechazos.append({'Índice': e.indice, 'Motivo': 'cuenta inexistente'})
+            continue
+        if e.tipo in TIPOS_CREDITO:
+            saldos[e.origen] += e.monto
+        else:
+            if saldos[e.origen] < e.monto:
+                rechazos.append({'Índice': e.indice, 'Motivo': 'saldo insuficiente'})
+                continue
+            saldos[e.origen] -= e.monto
+            if e.destino is not None:
+                saldos[e.destino] += e.monto
+        if e.clave is not None:
+            usadas.add(e.clave)
+        aceptados.append(e)
+
+    if aceptados:
+        cursor.executemany(INSERTAR_TRANSACCION, [
+            (e.origen, e.destino, e.monto, e.fecha, e.tipo, e.descripcion)
+            for e in aceptados])
+        deltas = [(saldos[c] - iniciales[c], c) for c in cuentas
+                  if c in saldos and saldos[c] != iniciales[c]]
+        cursor.executemany("UPDATE cuenta SET saldo = saldo + %s WHERE id_cuenta = %s",
+                           deltas)
+        con_clave = [(e.clave, e.origen) for e in aceptados if e.clave is not None]
+        if con_clave:
+            cursor.executemany("INSERT INTO clave_idempotencia (clave, id_cuenta_origen, creada) "
+                               "VALUES (%s, %s, NOW())", con_clave)
+    return aceptados, rechazos
+
+
+def ingerir_eventos(eventos: Iterable[Dict], tam_grupo: int = 500,
+                    reintentos: int = 3,
+                    detector: Optional[DetectorDuplicados] = None,
+                    rechazar_similares: bool = True,
+                    host: str = None, port: int = None,
+                    user: str = None, password: str = None,
+                    database: str = None) -> Optional[Dict]:
+    """Ingiere eventos de transacción con group commit.
+
+    Args:
+        eventos: Eventos (ver validar_evento); puede ser un generador
+        tam_grupo: Eventos por transacción (COMMIT)
+        reintentos: Reintentos de un grupo abortado por deadlock o timeout
+        detector: Detector de casi duplicados (default: el del proceso)
+        rechazar_similares: Si False, no se buscan casi duplicados en los
+            eventos sin clave de idempotencia
+        host: Servidor MySQL (opcional)
+        port: Puerto MySQL (opcional)
+        user: Usuario MySQL (opcional)
+        password: Contraseña MySQL (opcional)
+        database: Base de datos (opcional)
+
+    Returns:
+        Optional[Dict]: Diccionario con 'Aceptados', 'Rechazados' (lista de
+            {'Índice', 'Motivo'}), 'Grupos', 'Reintentos', 'Segundos' y
+            'Eventos/s', o None si hubo un error. Los grupos confirmados antes
+            del error quedan aplicados.
+
+    Ejemplo:
+        >>> ingerir_eventos([
+        ...     {'tipo': 'depósito', 'id_cuenta_origen': 7, 'monto': '1500.00'},
+        ...     {'tipo': 'transferencia', 'id_cuenta_origen': 7,
+        ...      'id_cuenta_destino': 12, 'monto': 800},
+        ... ])['Aceptados']
+        2
+    """
+    resumen = {'Aceptados': 0, 'Rechazados': [], 'Grupos': 0, 'Reintentos': 0}
+    detector = detector or obtener_detector()
+    inicio = time.perf_counter()
+    try:
+        conn = get_connection(host, port, user, password, database)
+        conn.autocommit = False
+        cursor = conn.cursor()
+        try:
+            cursor.execute(CREAR_TABLA_IDEMPOTENCIA)
+            for grupo in _grupos(eventos, tam_grupo):
+                validos: List[Evento] = []
+                en_grupo: Dict[tuple, dt.datetime] = {}
+                # Por grupo: construir_checkpoints puede cerrar un mes entre grupos
+                fecha_minima = _ultimo_corte(cursor)
+                conn.commit()
+                for indice, evento in grupo:
+                    valido, motivo = validar_evento(indice, evento, fecha_minima)
+                    if valido is not None and valido.clave is None and rechazar_similares:
+                        h = huella(valido.origen, valido.destino, valido.tipo, valido.monto)
+                        previa = en_grupo.get(h)
+                        if detector.buscar(h, valido.fecha) is not None or (
+                                previa is not None
+                                and abs(valido.fecha - previa) <= detector.ventana):
+                            valido, motivo = None, 'posible duplicado'
+                        else:
+                            en_grupo[h] = valido.fecha
+                    if valido is None:
+                        resumen['Rechazados'].append({'Índice': indice, 'Motivo': motivo})
+                    else:
+                        validos.append(valido)
+                if not validos:
+                    continue
+
+                for intento in range(reintentos + 1):
+                    try:
+                        aceptados, rechazos = _aplicar_grupo(cursor, validos)
+                        conn.commit()
+                        break
+                    except Exception as e:
+                        conn.rollback()
+                        if getattr(e, 'errno', None) not in ERRORES_REINTENTABLES \
+                                or intento == reintentos:
+                            raise
+                        resumen['Reintentos'] += 1
+                        time.sleep(random.uniform(0, 0.01 * 2 ** intento))
+
+                for e in aceptados:
+                    detector.registrar(huella(e.origen, e.destino, e.tipo, e.monto), e.fecha)
+                resumen['Aceptados'] += len(aceptados)
+                resumen['Rechazados'].extend(rechazos)
+                resumen['Grupos'] += 1
+        finally:
+            cursor.close()
+            conn.close()
+
+    except Exception as e:
+        print(f"❌ Error en ingerir_eventos: {e}")
+        return None
+
+    resumen['Rechazados'].sort(key=lambda r: r['Índice'])
+    segundos = time.perf_counter() - inicio
+    resumen['Segundos'] = round(segundos, 3)
+    resumen['Eventos/s'] = round(resumen['Aceptados'] / segundos, 1)
+    return resumen
+
+
+def purgar_claves(dias: int = 30, tam_lote: int = 10_000, host: str = None,
+                  port: int = None, user: str = None, password: str = None,
+                  database: str = None) -> int:
+    """Borra las claves de idempotencia más viejas que `dias` días.
+
+    Después de la purga, un reintento con una clave borrada vuelve a
+    aplicarse, así que `dias` debe superar el plazo de reintento de los canales.
+
+    Returns:
+        int: Claves borradas, o -1 si hubo un error
+    """
+    try:
+        conn = get_connection(host, port, user, password, database)
+        cursor = conn.cursor()
+        borradas = 0
+        while True:
+            cursor.execute("DELETE FROM clave_idempotencia "
+                           "WHERE creada < NOW() - INTERVAL %s DAY LIMIT %s",
+                           (dias, tam_lote))
+            conn.commit()
+            borradas += cursor.rowcount
+            if cursor.rowcount < tam_lote:
+                break
+        cursor.close()
+        conn.close()
+        return borradas
+
+    except Exception as e:
+        print(f"❌ Error en purgar_claves: {e}")
+        return -1
+
+
+def eventos_sinteticos(cuentas: List[int], n: int, descripcion: str,
+                       semilla: int = 0) -> Iterator[Dict]:
+    """Genera eventos aleatorios con la misma mezcla y montos que crear_db.py."""
+    rnd = random.Random(semilla)
+    rangos = {
+        'depósito': (10, 20000),
+        'retiro': (10, 5000),
+        'transferencia': (100, 50000),
+        'pago cuota': (100, 5000),
+        'compra tarjeta': (10, 3000),
+    }
+    tipos = list(rangos)
+    for _ in range(n):
+        tipo = rnd.choice(tipos)
+        origen = rnd.choice(cuentas)
+        evento = {'tipo': tipo, 'id_cuenta_origen': origen,
+                  'monto': round(rnd.uniform(*rangos[tipo]), 2),
+                  'descripcion': descripcion}
+        if tipo == 'transferencia':
+            destino = rnd.choice(cuentas)
+            while destino == origen and len(cuentas) > 1:
+                destino = rnd.choice(cuentas)
+            evento['id_cuenta_destino'] = destino
+        yield evento
+
+
+def _crear_esquema_benchmark(esquema: str, base: str, host: str = None,
+                             port: int = None, user: str = None,
+                             password: str = None, database: str = None) -> List[int]:
+    """Crea el esquema de prueba con copias de Cuenta (con filas) y Transaccion (vacía).
+
+    CREATE TABLE ... LIKE no copia claves foráneas ni triggers, así que el
+    benchmark no depende de otras tablas ni alimenta el feed de cambios.
+
+    Returns:
+        List[int]: Ids de las cuentas copiadas
+    """
+    conn = get_connection(host, port, user, password, database)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"DROP DATABASE IF EXISTS `{esquema}`")
+        cursor.execute(f"CREATE DATABASE `{esquema}`")
+        for tabla in TABLAS_BENCHMARK:
+            cursor.execute(f"CREATE TABLE `{esquema}`.{tabla} LIKE `{base}`.{tabla}")
+        cursor.execute(f"INSERT INTO `{esquema}`.cuenta SELECT * FROM `{base}`.cuenta")
+        conn.commit()
+        cursor.execute(f"SELECT id_cuenta FROM `{esquema}`.cuenta ORDER BY id_cuenta")
+        return [fila[0] for fila in cursor.fetchall()]
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _eliminar_esquema_benchmark(esquema: str, host: str = None, port: int = None,
+                                user: str = None, password: str = None,
+                                database: str = None) -> None:
+    conn = get_connection(host, port, user, password, database)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"DROP DATABASE IF EXISTS `{esquema}`")
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def benchmark_ingesta(n_eventos: int = 20_000, tamanos: Tuple[int, ...] = (1, 50, 500),
+                      hilos: int = 4, conservar: bool = False, host: str = None,
+                      port: int = None, user: str = None, password: str = None,
+                      database: str = None) -> List[Dict]:
+    """Mide los eventos por segundo sostenidos para distintos tamaños de grupo.
+
+    Cada configuración ingiere `n_eventos` eventos sintéticos sobre una copia
+    de las cuentas existentes en el esquema <base>_benchmark, repartidos entre
+    `hilos` conexiones concurrentes (que compiten por las mismas cuentas). Las
+    tablas reales no se modifican. La Transaccion de prueba empieza vacía, así
+    que sus índices son más chicos que los de producción.
+
+    Args:
+        n_eventos: Eventos por tamaño de grupo
+        tamanos: Tamaños de grupo a medir
+        hilos: Conexiones concurrentes
+        conservar: Si True, no se elimina el esquema de prueba al terminar
+        host: Servidor MySQL (opcional)
+        port: Puerto MySQL (opcional)
+        user: Usuario MySQL (opcional)
+        password: Contraseña MySQL (opcional)
+        database: Base de datos de origen (opcional)
+
+    Returns:
+        List[Dict]: Una fila por tamaño de grupo con 'Tamaño Grupo', 'Hilos',
+            'Eventos', 'Aceptados', 'Rechazados', 'Reintentos', 'Segundos' y
+            'Eventos/s'. Lista vacía si hubo un error.
+    """
+    base = database or get_db_config()['database']
+    esquema = f"{base}{SUFIJO_BENCHMARK}"
+    origen = dict(host=host, port=port, user=user, password=password, database=database)
+    conexion = dict(origen, database=esquema)
+    try:
+        cuentas = _crear_esquema_benchmark(esquema, base, **origen)
+    except Exception as e:
+        print(f"❌ Error en benchmark_ingesta: {e}")
+        try:
+            _eliminar_esquema_benchmark(esquema, **origen)
+        except Exception:
+            pass
+        return []
+    if not cuentas:
+        print("❌ Error en benchmark_ingesta: no hay cuentas")
+        _eliminar_esquema_benchmark(esquema, **origen)
+        return []
+
+    descripcion = f"benchmark ingesta {dt.datetime.now():%Y%m%d%H%M%S}"
+    resultados: List[Dict] = []
+    try:
+        for tam_grupo in tamanos:
+            por_hilo = -(-n_eventos // hilos)
+            parciales: List[Optional[Dict]] = [None] * hilos
+
+            def trabajar(i: int) -> None:
+                cantidad = max(min(por_hilo, n_eventos - i * por_hilo), 0)
+                parciales[i] = ingerir_eventos(
+                    eventos_sinteticos(cuentas, cantidad, descripcion,
+                                       semilla=tam_grupo * 1000 + i),
+                    tam_grupo=tam_grupo, detector=DetectorDuplicados(),
+                    rechazar_similares=False, **conexion)
+
+            inicio = time.perf_counter()
+            trabajadores = [threading.Thread(target=trabajar, args=(i,)) for i in range(hilos)]
+            for t in trabajadores:
+                t.start()
+            for t in trabajadores:
+                t.join()
+            segundos = time.perf_counter() - inicio
+
+            if any(p is None for p in parciales):
+                print(f"❌ Error en benchmark_ingesta: falló un hilo con grupos de {tam_grupo}")
+                break
+            aceptados = sum(p['Aceptados'] for p in parciales)
+            resultados.append({
+                'Tamaño Grupo': tam_grupo,
+                'Hilos': hilos,
+                'Eventos': n_eventos,
+                'Aceptados': aceptados,
+                'Rechazados': sum(len(p['Rechazados']) for p in parciales),
+                'Reintentos': sum(p['Reintentos'] for p in parciales),
+                'Segundos': round(segundos, 3),
+                'Eventos/s': round(aceptados / segundos, 1),
+            })
+    finally:
+        if not conservar:
+            try:
+                _eliminar_esquema_benchmark(esquema, **origen)
+            except Exception as e:
+                print(f"⚠️  No se pudo eliminar el esquema de prueba {esquema}: {e}")
+    return resultados
+
+
+def main():
+    """Corre el benchmark de ingesta y muestra los eventos por segundo."""
+    print("="*70)
+    print("  BENCHMARK DE INGESTA DE TRANSACCIONES")
+    print("="*70)
+
+    resultados = benchmark_ingesta()
+
+    print(f"\n{'Grupo':>6} {'Hilos':>6} {'Aceptados':>10} {'Rechazos':>9} "
+          f"{'Reintentos':>11} {'Segundos':>9} {'Eventos/s':>10}")
+    print("-"*70)
+    for r in resultados:
+        print(f"{r['Tamaño Grupo']:>6} {r['Hilos']:>6} {r['Aceptados']:>10} "
+              f"{r['Rechazados']:>9} {r['Reintentos']:>11} {r['Segundos']:>9} "
+              f"{r['Eventos/s']:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+jerarquias.py
+
+Saldos y cantidad de clientes con subtotales jerárquicos
+moneda → país → ciudad → sede, calculados en una sola consulta.
+
+La ubicación es la de la sede de cada cuenta. La moneda encabeza la
+jerarquía porque los saldos de monedas distintas no se pueden sumar; el total
+general solo informa cuentas y clientes (y el saldo si hay una única moneda).
+
+Un único GROUP BY ... WITH ROLLUP devuelve todos los niveles: las filas de
+detalle por sede y las de subtotal por ciudad, país y moneda, más el total.
+GROUPING() distingue los NULL de subtotal de los valores reales. Los clientes
+se cuentan con COUNT(DISTINCT), así que un cliente con cuentas en dos sedes
+de la misma ciudad cuenta una vez en el subtotal de la ciudad.
+
+El resultado se entrega como árbol (cada nodo con sus hijos) y como lista
+plana para el CSV. MotorAnalitico.saldos_jerarquicos() calcula lo mismo de
+forma vectorizada sobre la foto en memoria y arma el árbol con la misma
+función, por lo que ambos resultados son comparables con ==.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+from decimal import Decimal
+from database import get_connection
+from catalogos import obtener_catalogos
+from consultas import _write_csv
+
+
+NIVELES = ['Total', 'Moneda', 'País', 'Ciudad', 'Sede']
+
+COLUMNAS = ['Nivel', 'Moneda', 'País', 'Ciudad', 'Sede', 'Cuentas', 'Clientes', 'Saldo Total']
+
+CONSULTA_ROLLUP = """
+    SELECT pr.id_moneda, ci.id_pais, s.id_ciudad, c.id_sede,
+           COUNT(*) AS cuentas,
+           COUNT(DISTINCT c.id_usuario) AS clientes,
+           SUM(c.saldo) AS saldo,
+           GROUPING(pr.id_moneda) + GROUPING(ci.id_pais)
+               + GROUPING(s.id_ciudad) + GROUPING(c.id_sede) AS agrupados
+    FROM cuenta c
+    JOIN producto pr ON pr.id_producto = c.id_producto
+    JOIN sede s ON s.id_sede = c.id_sede
+    JOIN ciudad ci ON ci.id_ciudad = s.id_ciudad
+    GROUP BY pr.id_moneda, ci.id_pais, s.id_ciudad, c.id_sede WITH ROLLUP
+"""
+
+
+def armar_arbol(agregados: Iterable[Tuple], catalogos) -> Dict:
+    """Arma el árbol de subtotales a partir de las filas agregadas.
+
+    Args:
+        agregados: Tuplas (id_moneda, id_pais, id_ciudad, id_sede, cuentas,
+            clientes, saldo, nivel), con nivel 0 (total) a 4 (sede) y los ids
+            de los niveles agrupados en None
+        catalogos: Caché de catálogos para los nombres
+
+    Returns:
+        Dict: Nodo raíz con 'Nivel', 'Nombre', 'Cuentas', 'Clientes', 'Saldo'
+            (Decimal, o None en el total si hay varias monedas), 'Simbolo' e
+            'Hijos' (nodos del nivel siguiente, ordenados por nombre)
+    """
+    nombres = [None, catalogos.moneda, catalogos.pais, catalogos.ciudad, catalogos.sede]
+    nodos: Dict[tuple, Dict] = {}
+    for *ids, cuentas, clientes, saldo, nivel in sorted(agregados, key=lambda f: f[-1]):
+        clave = tuple(ids[:nivel])
+        nodo = {
+            'Nivel': NIVELES[nivel],
+            'Nombre': 'Total' if nivel == 0 else nombres[nivel][clave[-1]].nombre,
+            'Cuentas': int(cuentas),
+            'Clientes': int(clientes),
+            'Saldo': Decimal(saldo),
+            'Simbolo': catalogos.moneda[clave[0]].simbolo if nivel > 0 else '',
+            'Hijos': [],
+        }
+        nodos[clave] = nodo
+        if nivel > 0:
+            nodos[clave[:-1]]['Hijos'].append(nodo)
+
+    raiz = nodos.get((), {'Nivel': 'Total', 'Nombre': 'Total', 'Cuentas': 0, 'Clientes': 0,
+                          'Saldo': Decimal('0'), 'Simbolo': '', 'Hijos': []})
+    if len(raiz['Hijos']) == 1:
+        raiz['Simbolo'] = raiz['Hijos'][0]['Simbolo']
+    elif raiz['Hijos']:
+        raiz['Saldo'] = None
+    for nodo in nodos.values():
+        nodo['Hijos'].sort(key=lambda n: n['Nombre'].casefold())
+    return raiz
+
+
+def aplanar(raiz: Dict) -> List[Dict[str, str]]:
+    """Recorre el árbol en preorden y arma las filas del CSV."""
+    filas: List[Dict[str, str]] = []
+
+    def visitar(nodo: Dict, ruta: Dict[str, str]) -> None:
+        if nodo['Nivel'] != 'Total':
+            ruta = {**ruta, nodo['Nivel']: nodo['Nombre']}
+        saldo = '' if nodo['Saldo'] is None else \
+            f"{nodo['Simbolo']} {round(nodo['Saldo'], 2):,.2f}".strip()
+        filas.append({
+            'Nivel': nodo['Nivel'],
+            'Moneda': ruta.get('Moneda', ''),
+            'País': ruta.get('País', ''),
+            'Ciudad': ruta.get('Ciudad', ''),
+            'Sede': ruta.get('Sede', ''),
+            'Cuentas': str(nodo['Cuentas']),
+            'Clientes': str(nodo['Clientes']),
+            'Saldo Total': saldo
+        })
+        for hijo in nodo['Hijos']:
+            visitar(hijo, ruta)
+
+    visitar(raiz, {})
+    return filas
+
+
+def saldos_jerarquicos(host: str = None, port: int = None,
+                       user: str = None, password: str = None,
+                       database: str = None) -> Optional[Dict]:
+    """Saldos y clientes por moneda, país, ciudad y sede, con subtotales.
+
+    Args:
+        host: Servidor MySQL (opcional)
+        port: Puerto MySQL (opcional)
+        user: Usuario MySQL (opcional)
+        password: Contraseña MySQL (opcional)
+        database: Base de datos (opcional)
+
+    Returns:
+        Optional[Dict]: Diccionario con las claves:
+            - 'Árbol': Nodo raíz (ver armar_arbol())
+            - 'Filas': Lista plana en preorden con las columnas de COLUMNAS
+
+        Retorna None si hubo un error.
+
+    CSV generado: saldos_jerarquicos.csv
+
+    Ejemplo:
+        >>> r = saldos_jerarquicos()
+        >>> [(n['Nombre'], n['Clientes']) for n in r['Árbol']['Hijos']]
+        [('Peso Argentino', 180), ('Peso Colombiano', 120)]
+    """
+    try:
+        catalogos = obtener_catalogos(host, port, user, password, database)
+
+        conn = get_connection(host, port, user, password, database, lectura=True)
+        cursor = conn.cursor()
+        cursor.execute(CONSULTA_ROLLUP)
+        agregados = [(*fila[:7], 4 - int(fila[7])) for fila in cursor.fetchall()]
+        cursor.close()
+        conn.close()
+
+        raiz = armar_arbol(agregados, catalogos)
+        filas = aplanar(raiz)
+
+        # Guardar en CSV
+        _write_csv(filas, 'saldos_jerarquicos.csv', COLUMNAS)
+
+        return {'Árbol': raiz, 'Filas': filas}
+
+    except Exception as e:
+        print(f"❌ Error en saldos_jerarquicos: {e}")
+        return None
+
+
+def main():
+    """Muestra el árbol de saldos con sus subtotales."""
+    print("="*70)
+    print("  SALDOS JERÁRQUICOS (MONEDA → PAÍS → CIUDAD → SEDE)")
+    print("="*70)
+
+    r = saldos_jerarquicos()
+    if r is None:
+        return
+
+    print()
+    sangria = {nivel: '  ' * i for i, nivel in enumerate(NIVELES)}
+    for fila in r['Filas']:
+        nombre = fila[fila['Nivel']] if fila['Nivel'] != 'Total' else 'Total'
+        print(f"{sangria[fila['Nivel']]}{nombre:<{40 - len(sangria[fila['Nivel']])}} "
+              f"{fila['Clientes']:>8} clientes {fila['Saldo Total']:>22}")
+
+    print("\n✅ Archivo generado: saldos_jerarquicos.csv")
+
+
+if __name__ == '__main__':
+    main()
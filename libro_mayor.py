@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+libro_mayor.py
+
+Motor de libro mayor que reconstruye el saldo de cada cuenta a partir de la
+tabla Transaccion.
+
+Reglas de reproducción de movimientos:
+- 'depósito' suma el monto a la cuenta origen.
+- 'retiro', 'pago cuota' y 'compra tarjeta' restan el monto a la cuenta origen.
+- 'transferencia' resta el monto a la cuenta origen y lo suma a la cuenta destino.
+
+Los saldos reproducidos se guardan como checkpoints mensuales en la tabla
+saldo_checkpoint. Cada fila (id_cuenta, corte) contiene el saldo acumulado de
+la cuenta considerando todas las transacciones con fecha < corte, donde corte
+es siempre el primer día de un mes. Una consulta "saldo a fecha X" parte del
+checkpoint más cercano y solo recorre las transacciones posteriores al corte.
+
+Se asume que las cuentas abren con saldo 0 y que todo movimiento queda
+registrado en Transaccion; la conciliación marca las cuentas donde
+Cuenta.saldo no coincide con esa reproducción. Las transacciones movidas al
+archivo en frío (archivo_frio.py) ya no están en Transaccion: sus saldos
+quedan en los checkpoints construidos antes de archivarlas, y la
+reconstrucción parte de ellos en lugar de partir de 0.
+"""
+from typing import List, Dict, Optional, Tuple
+from decimal import Decimal
+import datetime as dt
+import numpy as np
+from database import get_connection
+from consultas import _write_csv
+
+
+CREAR_TABLA_CHECKPOINT = """
+    CREATE TABLE IF NOT EXISTS saldo_checkpoint (
+        id_cuenta INT NOT NULL,
+        corte DATE NOT NULL,
+        saldo DECIMAL(15, 2) NOT NULL,
+        movimientos INT NOT NULL,
+        PRIMARY KEY (id_cuenta, corte),
+        KEY idx_saldo_checkpoint_corte (corte)
+    )
+"""
+
+ER_NO_SUCH_TABLE = 1146
+
+
+def _sql_movimientos(filtro_fecha: str) -> str:
+    """Construye la consulta de movimientos firmados por cuenta.
+
+    Cada transacción aporta una fila por cuenta afectada: la cuenta origen con
+    el monto firmado según el tipo y, para las transferencias, la cuenta
+    destino con el monto positivo.
+
+    Args:
+        filtro_fecha: Condición SQL sobre t.fecha aplicada a ambas ramas
+
+    Returns:
+        str: Subconsulta con columnas id_cuenta, fecha, importe
+    """
+    return f"""
+        SELECT t.id_cuenta_origen AS id_cuenta,
+               t.fecha,
+               CASE WHEN t.tipo = 'depósito' THEN t.monto ELSE -t.monto END AS importe
+        FROM transaccion t
+        WHERE {filtro_fecha}
+        UNION ALL
+        SELECT t.id_cuenta_destino AS id_cuenta,
+               t.fecha,
+               t.monto AS importe
+        FROM transaccion t
+        WHERE t.tipo = 'transferencia'
+          AND t.id_cuenta_destino IS NOT NULL
+          AND {filtro_fecha}
+    """
+
+
+def _primer_dia_mes(fecha: dt.date) -> dt.date:
+    """Retorna el primer día del mes de la fecha indicada."""
+    return dt.date(fecha.year, fecha.month, 1)
+
+
+def _como_datetime(fecha) -> dt.datetime:
+    """Normaliza una fecha (date, datetime o 'YYYY-MM-DD') a datetime."""
+    if isinstance(fecha, str):
+        fecha = dt.datetime.fromisoformat(fecha)
+    if isinstance(fecha, dt.datetime):
+        return fecha
+    return dt.datetime.combine(fecha, dt.time.min)
+
+
+def _corte_archivo(cursor) -> Optional[dt.date]:
+    """Primer corte posterior a todo lo archivado en frío (None sin archivo).
+
+    Toda transacción con fecha anterior a este corte que falte en la tabla
+    viva está en el archivo, y su efecto ya está en los checkpoints con
+    corte <= este (archivar_transacciones() exige que existan).
+    """
+    try:
+        cursor.execute("SELECT fecha_max FROM archivo_estado WHERE tabla = 'transaccion'")
+    except Exception as e:
+        if getattr(e, 'errno', None) != ER_NO_SUCH_TABLE:
+            raise
+        return None
+    fila = cursor.fetchone()
+    if not fila or fila[0] is None:
+        return None
+    mes = _primer_dia_mes(fila[0].date() if isinstance(fila[0], dt.datetime) else fila[0])
+    return dt.date(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
+
+
+def construir_checkpoints(hasta: Optional[dt.date] = None,
+                          host: str = None, port: int = None,
+                          user: str = None, password: str = None,
+                          database: str = None) -> int:
+    """Reconstruye los checkpoints mensuales de saldo de todas las cuentas.
+
+    La reproducción es completamente en SQL: se agrupan los movimientos por
+    cuenta y mes, y una suma acumulada (ventana) produce el saldo al inicio de
+    cada mes siguiente. Solo se consideran meses cerrados, de modo que los
+    checkpoints no cambian mientras se siguen registrando transacciones.
+
+    Si hay transacciones en el archivo en frío, se conservan los checkpoints
+    hasta el primer corte posterior a lo archivado y solo se reconstruyen los
+    siguientes, sumando los movimientos vivos al último checkpoint de cada
+    cuenta en ese corte.
+
+    Args:
+        hasta: Primer corte excluido (default: primer día del mes actual)
+        host: Servidor MySQL (opcional)
+        port: Puerto MySQL (opcional)
+        user: Usuario MySQL (opcional)
+        password: Contraseña MySQL (opcional)
+        database: Base de datos (opcional)
+
+    Returns:
+        int: Cantidad de checkpoints generados (-1 si hubo error)
+    """
+    limite = _primer_dia_mes(hasta or dt.date.today())
+    try:
+        conn = get_connection(host, port, user, password, database)
+        cursor = conn.cursor()
+
+        cursor.execute(CREAR_TABLA_CHECKPOINT)
+        base = _corte_archivo(cursor)
+        if base is None:
+            cursor.execute("DELETE FROM saldo_checkpoint")
+            movimientos = _sql_movimientos("t.fecha < %s")
+            params: Tuple = (limite, limite)
+            saldo_base, join_base = "0", ""
+        else:
+            cursor.execute("SELECT COUNT(*) FROM saldo_checkpoint WHERE corte >= %s", (base,))
+            if not cursor.fetchone()[0]:
+                raise RuntimeError(f"no hay checkpoints que cubran lo archivado (corte {base})")
+            cursor.execute("DELETE FROM saldo_checkpoint WHERE corte > %s", (base,))
+            movimientos = _sql_movimientos("t.fecha >= %s AND t.fecha < %s")
+            params = (base, limite, base, limite, base)
+            saldo_base = "COALESCE(b.saldo, 0)"
+            join_base = """
+            LEFT JOIN (
+                SELECT ck.id_cuenta, ck.saldo
+                FROM saldo_checkpoint ck
+                JOIN (SELECT id_cuenta, MAX(corte) AS corte
+                      FROM saldo_checkpoint
+                      WHERE corte <= %s
+                      GROUP BY id_cuenta) ult
+                  ON ult.id_cuenta = ck.id_cuenta AND ult.corte = ck.corte
+            ) b ON b.id_cuenta = mensual.id_cuenta"""
+
+        query = f"""
+            INSERT INTO saldo_checkpoint (id_cuenta, corte, saldo, movimientos)
+            SELECT
+                mensual.id_cuenta,
+                mensual.corte,
+                {saldo_base} + SUM(mensual.neto) OVER (PARTITION BY mensual.id_cuenta
+                                                       ORDER BY mensual.corte),
+                mensual.n
+            FROM (
+                SELECT
+                    m.id_cuenta,
+                    DATE_ADD(DATE_SUB(DATE(m.fecha), INTERVAL DAYOFMONTH(m.fecha) - 1 DAY),
+                             INTERVAL 1 MONTH) AS corte,
+                    SUM(m.importe) AS neto,
+                    COUNT(*) AS n
+                FROM ({movimientos}) m
+                GROUP BY m.id_cuenta, corte
+            ) mensual{join_base}
+        """
+        cursor.execute(query, params)
+        generados = cursor.rowcount
+        conn.commit()
+
+        cursor.close()
+        conn.close()
+        return generados
+
+    except Exception as e:
+        print(f"❌ Error en construir_checkpoints: {e}")
+        return -1
+
+
+def _corte_base(cursor, fecha: dt.datetime) -> Optional[dt.date]:
+    """Determina el corte común desde el cual se recorre el delta.
+
+    Es el menor entre el primer día del mes de la fecha consultada y el último
+    corte construido. Cualquier movimiento anterior a ese corte ya está
+    acumulado en algún checkpoint de su cuenta.
+    """
+    cursor.execute(CREAR_TABLA_CHECKPOINT)
+    cursor.execute("SELECT MAX(corte) FROM saldo_checkpoint")
+    (ultimo,) = cursor.fetchone()
+    if ultimo is None:
+        return None
+    return min(_primer_dia_mes(fecha.date()), ultimo)
+
+
+def saldos_a_fecha(fecha, id_desde: Optional[int] = None,
+                   id_hasta: Optional[int] = None,
+                   host: str = None, port: int = None,
+                   user: str = None, password: str = None,
+                   database: str = None) -> Dict[int, Decimal]:
+    """Calcula el saldo de un rango de cuentas a una fecha dada.
+
+    Toma para cada cuenta el último checkpoint anterior o igual al corte base
+    y le suma los movimientos registrados entre ese corte y la fecha pedida.
+    Si no existen checkpoints se reproduce el historial completo.
+
+    Args:
+        fecha: Instante de consulta (exclusivo), como date, datetime o ISO str
+        id_desde: Primer id_cuenta del rango (opcional, inclusivo)
+        id_hasta: Último id_cuenta del rango (opcional, inclusivo)
+        host: Servidor MySQL (opcional)
+        port: Puerto MySQL (opcional)
+        user: Usuario MySQL (opcional)
+        password: Contraseña MySQL (opcional)
+        database: Base de datos (opcional)
+
+    Returns:
+        Dict[int, Decimal]: Saldo por id_cuenta (solo cuentas con movimientos)
+
+    Ejemplo:
+        >>> saldos = saldos_a_fecha('2022-06-30', id_desde=1, id_hasta=10)
+        >>> saldos.get(1, Decimal('0'))
+    """
+    instante = _como_datetime(fecha)
+    rango_ck, params_ck = _filtro_rango('id_cuenta', id_desde, id_hasta)
+    rango_mov, params_mov = _filtro_rango('m.id_cuenta', id_desde, id_hasta)
+
+    conn = get_connection(host, port, user, password, database)
+    cursor = conn.cursor()
+    try:
+        corte = _corte_base(cursor, instante)
+        saldos: Dict[int, Decimal] = {}
+
+        if corte is not None:
+            cursor.execute(f"""
+                SELECT ck.id_cuenta, ck.saldo
+                FROM saldo_checkpoint ck
+                JOIN (
+                    SELECT id_cuenta, MAX(corte) AS corte
+                    FROM saldo_checkpoint
+                    WHERE corte <= %s {rango_ck}
+                    GROUP BY id_cuenta
+                ) ult ON ult.id_cuenta = ck.id_cuenta AND ult.corte = ck.corte
+            """, (corte, *params_ck))
+            for id_cuenta, saldo in cursor.fetchall():
+                saldos[id_cuenta] = saldo
+            filtro = "t.fecha >= %s AND t.fecha < %s"
+            params: Tuple = (corte, instante, corte, instante)
+        else:
+            filtro = "t.fecha < %s"
+            params = (instante, instante)
+
+        cursor.execute(f"""
+            SELECT m.id_cuenta, SUM(m.importe)
+            FROM ({_sql_movimientos(filtro)}) m
+            WHERE 1 = 1 {rango_mov}
+            GROUP BY m.id_cuenta
+        """, (*params, *params_mov))
+        for id_cuenta, delta in cursor.fetchall():
+            saldos[id_cuenta] = saldos.get(id_cuenta, Decimal('0')) + delta
+
+        return saldos
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _filtro_rango(columna: str, id_desde: Optional[int],
+                  id_hasta: Optional[int]) -> Tuple[str, Tuple]:
+    """Genera la condición SQL sobre `columna` para un rango de cuentas."""
+    condiciones, params = [], []
+    if id_desde is not None:
+        condiciones.append(f"{columna} >= %s")
+        params.append(id_desde)
+    if id_hasta is not None:
+        condiciones.append(f"{columna} <= %s")
+        params.append(id_hasta)
+    sql = "".join(f" AND {c}" for c in condiciones)
+    return sql, tuple(params)
+
+
+def saldo_a_fecha(id_cuenta: int, fecha,
+                  host: str = None, port: int = None,
+                  user: str = None, password: str = None,
+                  database: str = None) -> Decimal:
+    """Retorna el saldo de una cuenta a una fecha dada.
+
+    Args:
+        id_cuenta: Cuenta a consultar
+        fecha: Instante de consulta (exclusivo), como date, datetime o ISO str
+        host: Servidor MySQL (opcional)
+        port: Puerto MySQL (opcional)
+        user: Usuario MySQL (opcional)
+        password: Contraseña MySQL (opcional)
+        database: Base de datos (opcional)
+
+    Returns:
+        Decimal: Saldo reproducido (0 si la cuenta no tiene movimientos)
+
+    Ejemplo:
+        >>> saldo_a_fecha(42, dt.date(2022, 3, 1))
+        Decimal('15230.55')
+    """
+    saldos = saldos_a_fecha(fecha, id_cuenta, id_cuenta,
+                            host, port, user, password, database)
+    return saldos.get(id_cuenta, Decimal('0'))
+
+
+def conciliacion_saldos(tolerancia: float = 0.01,
+                        host: str = None, port: int = None,
+                        user: str = None, password: str = None,
+                        database: str = None) -> List[Dict[str, str]]:
+    """Compara Cuenta.saldo con el saldo reproducido desde el libro mayor.
+
+    La comparación es vectorizada: ambos saldos se convierten a centavos en
+    arreglos enteros alineados por id_cuenta y se filtran las diferencias que
+    superan la tolerancia.
+
+    Args:
+        tolerancia: Diferencia máxima aceptada, en unidades de moneda
+        host: Servidor MySQL (opcional)
+        port: Puerto MySQL (opcional)
+        user: Usuario MySQL (opcional)
+        password: Contraseña MySQL (opcional)
+        database: Base de datos (opcional)
+
+    Returns:
+        List[Dict[str, str]]: Cuentas descuadradas con las claves:
+            - 'Cuenta': Número de cuenta
+            - 'Saldo Registrado': Cuenta.saldo formateado
+            - 'Saldo Libro': Saldo reproducido formateado
+            - 'Diferencia': Registrado menos reproducido
+
+    CSV generado: conciliacion_saldos.csv
+    """
+    try:
+        saldos_libro = saldos_a_fecha(dt.datetime.now(), host=host, port=port,
+                                      user=user, password=password,
+                                      database=database)
+
+        conn = get_connection(host, port, user, password, database)
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT id_cuenta, numero_cuenta, CAST(ROUND(saldo * 100) AS SIGNED)
+            FROM cuenta
+            ORDER BY id_cuenta
+        """)
+        cuentas = cursor.fetchall()
+        cursor.close()
+        conn.close()
+
+        if not cuentas:
+            return []
+
+        ids = np.fromiter((c[0] for c in cuentas), dtype=np.int64, count=len(cuentas))
+        registrado = np.fromiter((c[2] for c in cuentas), dtype=np.int64, count=len(cuentas))
+
+        libro = np.zeros_like(registrado)
+        if saldos_libro:
+            ids_libro = np.fromiter(saldos_libro.keys(), dtype=np.int64)
+            centavos_libro = np.fromiter(
+                (int((v * 100).to_integral_value()) for v in saldos_libro.values()),
+                dtype=np.int64)
+            pos = np.searchsorted(ids, ids_libro)
+            pos = np.clip(pos, 0, len(ids) - 1)
+            validos = ids[pos] == ids_libro
+            libro[pos[validos]] = centavos_libro[validos]
+
+        diferencia = registrado - libro
+        descuadradas = np.nonzero(np.abs(diferencia) > round(tolerancia * 100))[0]
+
+        result: List[Dict[str, str]] = []
+        for i in descuadradas:
+            result.append({
+                'Cuenta': cuentas[i][1],
+                'Saldo Registrado': f"$ {registrado[i] / 100:,.2f}",
+                'Saldo Libro': f"$ {libro[i] / 100:,.2f}",
+                'Diferencia': f"$ {diferencia[i] / 100:,.2f}"
+            })
+
+        _write_csv(result, 'conciliacion_saldos.csv',
+                   ['Cuenta', 'Saldo Registrado', 'Saldo Libro', 'Diferencia'])
+
+        return result
+
+    except Exception as e:
+        print(f"❌ Error en conciliacion_saldos: {e}")
+        return []
+
+
+def main():
+    """Reconstruye los checkpoints y genera el reporte de conciliación."""
+    print("="*70)
+    print("  LIBRO MAYOR - CHECKPOINTS Y CONCILIACIÓN DE SALDOS")
+    print("="*70)
+
+    print("\n🔧 Reconstruyendo checkpoints mensuales...")
+    generados = construir_checkpoints()
+    if generados < 0:
+        return
+    print(f"✅ Checkpoints generados: {generados}")
+
+    print("\n🔎 Conciliando Cuenta.saldo contra el libro mayor...")
+    data = conciliacion_saldos()
+    print(f"\n✅ Archivo generado: conciliacion_saldos.csv")
+    print(f"   Cuentas descuadradas: {len(data)}")
+
+
+if __name__ == '__main__':
+    main()
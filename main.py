@@ -5,18 +5,201 @@ main.py
 
 Script principal con menú textual para ejecutar las consultas del taller.
 Permite al usuario seleccionar qué reporte desea generar.
+
+Los reportes se piden al demonio de reportes (demonio.py) si está corriendo,
+con su pool de conexiones y cachés ya calientes; si no, se ejecutan en este
+mismo proceso. Los módulos de consultas se importan recién al usarlos, así
+que el menú aparece sin esperar a mysql.connector.
+
+Mientras el operador lee un reporte o elige una opción, los reportes baratos
+y cacheables (PRECARGABLES) se calculan en segundo plano; si después se
+eligen, se muestran sin esperar. Las precargas no escriben su CSV (se
+escribe recién cuando se elige el reporte) ni imprimen en la consola.
+PRECARGA_CONCURRENCIA limita las consultas simultáneas contando también el
+reporte que se pide en primer plano; elegir un reporte cancela las precargas
+que no empezaron. PRECARGA=0 las desactiva.
 """
+import contextvars
 import os
 import sys
-from consultas import (
-    clientes_por_ubicacion,
-    saldo_por_moneda,
-    prestamos_activos,
-    top_clientes_transacciones,
-    cuotas_pendientes,
-    crear_vista,
-    ver_resumen
-)
+import threading
+import time
+from typing import Any, Dict, Optional
+from demonio import ejecutar
+
+
+PRECARGABLES = ('saldo_por_moneda', 'top_clientes_transacciones', 'cuotas_pendientes')
+
+
+class _SalidaPorHilo:
+    """sys.stdout que descarta lo que escriben los hilos marcados como silenciosos.
+
+    contextlib.redirect_stdout cambia sys.stdout para todo el proceso, así que
+    no sirve para callar solo a las precargas. La marca es una ContextVar para
+    que la hereden los hilos que corren en una copia del contexto (como el de
+    presupuestos.con_presupuesto).
+    """
+
+    def __init__(self, original):
+        self.original = original
+        self._silencioso = contextvars.ContextVar('silencioso', default=False)
+
+    def silenciar(self) -> None:
+        """Descarta lo que imprima el hilo actual de aquí en adelante."""
+        self._silencioso.set(True)
+
+    def write(self, texto: str) -> int:
+        if self._silencioso.get():
+            return len(texto)
+        return self.original.write(texto)
+
+    def __getattr__(self, nombre: str):
+        return getattr(self.original, nombre)
+
+
+class Precarga:
+    """Cálculo especulativo de reportes en hilos de fondo.
+
+    Los reportes se piden con escribir=False: el CSV de un reporte precargado
+    se escribe recién cuando se lo elige (ver obtener()).
+
+    Args:
+        reportes: Reportes a precargar (nombres de demonio.REPORTES que
+            aceptan escribir=False)
+        concurrencia: Máximo de reportes calculándose a la vez, contando los
+            que se piden en primer plano (ver ejecutar())
+        ttl: Segundos durante los que un resultado precargado se considera vigente
+    """
+
+    def __init__(self, reportes=PRECARGABLES, concurrencia: int = 1, ttl: float = 60.0):
+        self.reportes = tuple(reportes)
+        self.ttl = ttl
+        self.aciertos = 0
+        self._semaforo = threading.BoundedSemaphore(max(concurrencia, 1))
+        self._cancelada = threading.Event()
+        # nombre → {'listo': Event, 'resultado', 'momento' (monotonic),
+        #           'iniciada' (ya consulta), 'descartada' (no debe consultar)}
+        self._entradas: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _vigente(self, entrada: Dict[str, Any]) -> bool:
+        return entrada['listo'].is_set() and entrada['resultado'] and \
+            time.monotonic() - entrada['momento'] < self.ttl
+
+    def ejecutar(self, nombre: str, *args, **kwargs) -> Any:
+        """Ejecuta un reporte en primer plano respetando el límite de concurrencia."""
+        with self._semaforo:
+            return ejecutar(nombre, *args, **kwargs)
+
+    def _trabajar(self, nombre: str, entrada: Dict[str, Any]) -> None:
+        if isinstance(sys.stdout, _SalidaPorHilo):
+            sys.stdout.silenciar()
+        try:
+            with self._semaforo:
+                with self._lock:
+                    if self._cancelada.is_set() or entrada['descartada']:
+                        return
+                    entrada['iniciada'] = True
+                resultado = ejecutar(nombre, escribir=False)
+            if not getattr(resultado, 'obsoleto', False):
+                entrada['resultado'] = resultado
+                entrada['momento'] = time.monotonic()
+        except Exception:
+            pass
+        finally:
+            entrada['listo'].set()
+            if entrada['resultado'] is None:
+                with self._lock:
+                    if self._entradas.get(nombre) is entrada:
+                        del self._entradas[nombre]
+
+    def iniciar(self) -> None:
+        """Lanza la precarga de los reportes que no estén vigentes ni en curso."""
+        if not isinstance(sys.stdout, _SalidaPorHilo):
+            sys.stdout = _SalidaPorHilo(sys.stdout)
+        self._cancelada.clear()
+        with self._lock:
+            for nombre in self.reportes:
+                entrada = self._entradas.get(nombre)
+                if entrada is not None and (not entrada['listo'].is_set() or self._vigente(entrada)):
+                    continue
+                entrada = {'listo': threading.Event(), 'resultado': None, 'momento': 0.0,
+                           'iniciada': False, 'descartada': False}
+                self._entradas[nombre] = entrada
+                threading.Thread(target=self._trabajar, args=(nombre, entrada),
+                                 name=f'precarga-{nombre}', daemon=True).start()
+
+    def cancelar(self) -> None:
+        """Descarta las precargas que todavía no empezaron a consultar."""
+        self._cancelada.set()
+
+    def obtener(self, nombre: str) -> Any:
+        """Resultado del reporte: el precargado si está vigente o en curso, o uno nuevo.
+
+        Una precarga que ya está consultando se espera en lugar de repetir la
+        consulta; una que todavía espera turno se descarta y el reporte se
+        calcula directamente. En ambos casos el CSV del reporte se escribe
+        aquí, porque el reporte fue elegido.
+        """
+        with self._lock:
+            entrada = self._entradas.get(nombre)
+            if entrada is not None and not entrada['iniciada'] and not entrada['listo'].is_set():
+                entrada['descartada'] = True
+                del self._entradas[nombre]
+                entrada = None
+        if entrada is not None:
+            entrada['listo'].wait()
+            if self._vigente(entrada):
+                self.aciertos += 1
+                return self._guardar(entrada['resultado'])
+        resultado = self._guardar(self.ejecutar(nombre, escribir=False))
+        if nombre in self.reportes and resultado and not getattr(resultado, 'obsoleto', False):
+            # Un resultado recién calculado también evita la próxima precarga
+            listo = threading.Event()
+            listo.set()
+            with self._lock:
+                self._entradas[nombre] = {'listo': listo, 'resultado': resultado,
+                                          'momento': time.monotonic(),
+                                          'iniciada': True, 'descartada': False}
+        return resultado
+
+    @staticmethod
+    def _guardar(resultado: Any) -> Any:
+        """Escribe el CSV postergado del resultado, si tiene uno."""
+        guardar = getattr(resultado, 'guardar', None)
+        if guardar is not None:
+            try:
+                guardar()
+            except Exception as e:
+                print(f"⚠️  No se pudo escribir el CSV del reporte: {e}")
+        return resultado
+
+
+_precarga: Optional[Precarga] = None
+if os.getenv('PRECARGA', '1') != '0':
+    _precarga = Precarga(concurrencia=int(os.getenv('PRECARGA_CONCURRENCIA', '1')),
+                         ttl=float(os.getenv('PRECARGA_TTL', '60')))
+
+
+def precargar():
+    """Lanza la precarga en segundo plano (si está habilitada)."""
+    if _precarga is not None:
+        _precarga.iniciar()
+
+
+def obtener_reporte(nombre: str, *args):
+    """Obtiene un reporte, usando la precarga si corresponde.
+
+    Pedir un reporte cancela las precargas que no empezaron, para no competir
+    con él por la base, y el reporte toma el mismo límite de concurrencia que
+    las precargas en curso.
+    """
+    if _precarga is None:
+        return ejecutar(nombre, *args)
+    _precarga.cancelar()
+    if nombre in _precarga.reportes and not args:
+        return _precarga.obtener(nombre)
+    return _precarga.ejecutar(nombre, *args)
 
 
 def limpiar_pantalla():
@@ -26,9 +209,26 @@ def limpiar_pantalla():
 
 def pausar():
     """Pausa la ejecución hasta que el usuario presione Enter."""
+    precargar()
     input("\nPresione Enter para continuar...")
 
 
+def avisar_obsoleto(data):
+    """Avisa si el reporte excedió su presupuesto y se muestran datos previos."""
+    if not getattr(data, 'obsoleto', False):
+        return
+    if data.generado is None:
+        print("\n⏱️  El reporte excedió su tiempo máximo y no hay un resultado previo.")
+    else:
+        print(f"\n⏱️  El reporte excedió su tiempo máximo: se muestran datos del "
+              f"{data.generado:%Y-%m-%d %H:%M:%S} (pueden estar desactualizados).")
+
+
+def archivo_generado(data, nombre: str) -> str:
+    """Nombre del CSV que escribió el reporte (con la extensión de compresión)."""
+    return os.path.basename(getattr(data, 'archivo', None) or nombre)
+
+
 def mostrar_menu():
     """Muestra el menú principal de opciones."""
     print("="*70)
@@ -41,6 +241,8 @@ def mostrar_menu():
     print("  4. Top 5 Clientes Más Activos en Transacciones")
     print("  5. Cuotas Pendientes por Préstamo")
     print("  6. Vista Resumen de Cliente")
+    print("  7. Perfil Completo de un Cliente (por DNI)")
+    print("  8. Uso de Tarjetas de Crédito")
     print("  0. Salir")
     print("\n" + "="*70)
 
@@ -53,10 +255,11 @@ def ejecutar_punto1():
     print("="*70)
     print("\n🔎 Generando reporte de clientes por ubicación...")
     
-    data = clientes_por_ubicacion()
+    data = obtener_reporte('clientes_por_ubicacion')
+    avisar_obsoleto(data)
     
     if data:
-        print(f"\n✅ Archivo generado: clientes_ubicacion.csv")
+        print(f"\n✅ Archivo generado: {archivo_generado(data, 'clientes_ubicacion.csv')}")
         print(f"   Total de clientes: {len(data)}")
         print(f"\n📊 PRIMEROS 10 REGISTROS:")
         print("-"*70)
@@ -81,10 +284,11 @@ def ejecutar_punto2():
     print("="*70)
     print("\n🔎 Calculando saldos agrupados por moneda...")
     
-    data = saldo_por_moneda()
+    data = obtener_reporte('saldo_por_moneda')
+    avisar_obsoleto(data)
     
     if data:
-        print(f"\n✅ Archivo generado: saldo_por_moneda.csv")
+        print(f"\n✅ Archivo generado: {archivo_generado(data, 'saldo_por_moneda.csv')}")
         print(f"   Total de grupos: {len(data)}")
         print(f"\n📊 SALDOS POR PAÍS Y MONEDA:")
         print("-"*70)
@@ -114,14 +318,16 @@ def ejecutar_punto3():
     
     print(f"\n🔎 Buscando préstamos activos para DNI {dni}...")
     
-    data = prestamos_activos(dni)
+    data = obtener_reporte('prestamos_activos', dni)
+    avisar_obsoleto(data)
     
     if data is None:
         print(f"\n❌ Error: No se encontró ningún cliente con DNI {dni}")
     elif len(data) == 0:
-        print(f"\n⚠️  El cliente con DNI {dni} no tiene préstamos activos.")
+        if not getattr(data, 'obsoleto', False):
+            print(f"\n⚠️  El cliente con DNI {dni} no tiene préstamos activos.")
     else:
-        print(f"\n✅ Archivo generado: prestamos_activos_{dni}.csv")
+        print(f"\n✅ Archivo generado: {archivo_generado(data, f'prestamos_activos_{dni}.csv')}")
         print(f"   Total de préstamos activos: {len(data)}")
         print(f"\n📊 PRÉSTAMOS ACTIVOS:")
         print("-"*70)
@@ -142,10 +348,11 @@ def ejecutar_punto4():
     print("="*70)
     print("\n🔎 Calculando top 5 clientes (últimos 48 meses)...")
     
-    data = top_clientes_transacciones()
+    data = obtener_reporte('top_clientes_transacciones')
+    avisar_obsoleto(data)
     
     if data:
-        print(f"\n✅ Archivo generado: top_clientes.csv")
+        print(f"\n✅ Archivo generado: {archivo_generado(data, 'top_clientes.csv')}")
         print(f"\n📊 TOP 5 CLIENTES:")
         print("-"*70)
         print(f"{'Puesto':<10} {'Cliente':<35} {'Total Movido':>20}")
@@ -166,10 +373,11 @@ def ejecutar_punto5():
     print("="*70)
     print("\n🔎 Generando reporte de cuotas pendientes...")
     
-    data = cuotas_pendientes()
+    data = obtener_reporte('cuotas_pendientes')
+    avisar_obsoleto(data)
     
     if data:
-        print(f"\n✅ Archivo generado: cuotas_pendientes.csv")
+        print(f"\n✅ Archivo generado: {archivo_generado(data, 'cuotas_pendientes.csv')}")
         print(f"   Total de préstamos con cuotas pendientes: {len(data)}")
         print(f"\n📊 PRIMEROS 10 PRÉSTAMOS:")
         print("-"*70)
@@ -199,7 +407,7 @@ def ejecutar_punto6():
     print("="*70)
     
     print("\n🔧 Creando vista v_resumen_cliente...")
-    if not crear_vista():
+    if not obtener_reporte('crear_vista'):
         print("\n❌ Error: No se pudo crear la vista.")
         pausar()
         return
@@ -207,10 +415,11 @@ def ejecutar_punto6():
     print("✅ Vista creada exitosamente.")
     
     print("\n🔎 Consultando vista y generando reporte...")
-    data = ver_resumen()
+    data = obtener_reporte('ver_resumen')
+    avisar_obsoleto(data)
     
     if data:
-        print(f"\n✅ Archivo generado: resumen_cliente.csv")
+        print(f"\n✅ Archivo generado: {archivo_generado(data, 'resumen_cliente.csv')}")
         print(f"   Total de clientes: {len(data)}")
         print(f"\n📊 PRIMEROS 10 CLIENTES:")
         print("-"*70)
@@ -238,11 +447,104 @@ def ejecutar_punto6():
     pausar()
 
 
+def ejecutar_punto7():
+    """Ejecuta el Punto 7: Perfil Completo de un Cliente."""
+    limpiar_pantalla()
+    print("="*70)
+    print("  PUNTO 7 - PERFIL COMPLETO DE UN CLIENTE")
+    print("="*70)
+    
+    dni = input("\n📋 Ingrese el DNI del cliente: ").strip()
+    
+    if not dni:
+        print("\n⚠️  DNI no válido.")
+        pausar()
+        return
+    
+    perfil = obtener_reporte('perfil_cliente', dni)
+    
+    if perfil is False:
+        print(f"\n❌ Error: No se pudo obtener el perfil (revise la conexión a la base)")
+        pausar()
+        return
+    
+    if perfil is None:
+        print(f"\n❌ Error: No se encontró ningún cliente con DNI {dni}")
+        pausar()
+        return
+    
+    cliente = perfil['Cliente']
+    print(f"\n👤 {cliente['Nombre Completo']} - DNI {cliente['DNI']}")
+    print(f"   {cliente['Ciudad']}, {cliente['País']} | {cliente['Email']} | {cliente['Teléfono']}")
+    
+    print(f"\n💰 CUENTAS ({len(perfil['Cuentas'])}):")
+    for item in perfil['Cuentas']:
+        print(f"   {item['Número']:<16} {item['Saldo']:>18} {item['Moneda']:<5} {item['Sede']}")
+    
+    print(f"\n💳 TARJETAS ({len(perfil['Tarjetas'])}):")
+    for item in perfil['Tarjetas']:
+        print(f"   {item['Número']:<10} {item['Tipo']:<8} {item['Límite']:>15}  vence {item['Vencimiento']}")
+    
+    print(f"\n🏦 PRÉSTAMOS ACTIVOS ({len(perfil['Préstamos'])}):")
+    for item in perfil['Préstamos']:
+        print(f"   #{item['ID Préstamo']:<6} {item['Monto Total']:>18} {item['Tasa Interés']:>8} "
+              f"{item['Fecha Inicio']} → {item['Fecha Fin']}")
+    
+    print(f"\n📅 CUOTAS PENDIENTES ({len(perfil['Cuotas'])}):")
+    for item in perfil['Cuotas'][:10]:
+        print(f"   Préstamo {item['Préstamo']:<5} cuota {item['Cuota']:<4} {item['Monto']:>15} "
+              f"{item['Vencimiento']} {item['Estado']}")
+    
+    print(f"\n🔁 ÚLTIMAS TRANSACCIONES:")
+    for item in perfil['Transacciones']:
+        print(f"   {item['Fecha']:<20} {item['Tipo']:<15} {item['Monto']:>15}")
+    
+    print(f"\n⏱️  Consulta resuelta en {perfil['Latencia (ms)']} ms")
+    
+    pausar()
+
+
+def ejecutar_punto8():
+    """Ejecuta el Punto 8: Uso de Tarjetas de Crédito."""
+    limpiar_pantalla()
+    print("="*70)
+    print("  PUNTO 8 - USO DE TARJETAS DE CRÉDITO")
+    print("="*70)
+    
+    print("\n⏳ Actualizando el gasto mensual por tarjeta...")
+    reporte = obtener_reporte('reporte_tarjetas')
+    
+    if not any(reporte.values()):
+        print("\n⚠️  No se pudieron obtener los datos.")
+        pausar()
+        return
+    
+    print(f"\n💳 UTILIZACIÓN DEL LÍMITE (Top 10 de {len(reporte['Utilización'])}):")
+    print("-"*70)
+    print(f"{'Tarjeta':<10} {'Cliente':<25} {'Límite':>15} {'Gasto del Mes':>15} {'Uso':>7}")
+    print("-"*70)
+    for item in reporte['Utilización'][:10]:
+        print(f"{item['Tarjeta']:<10} {item['Cliente']:<25} {item['Límite']:>15} "
+              f"{item['Gasto del Mes']:>15} {item['Utilización']:>7}")
+    
+    print(f"\n📅 PRÓXIMAS A VENCER ({len(reporte['Por Vencer'])}):")
+    print("-"*70)
+    for item in reporte['Por Vencer'][:10]:
+        print(f"{item['Tarjeta']:<10} {item['Tipo']:<8} {item['Cliente']:<25} "
+              f"{item['Vencimiento']} ({item['Días Restantes']} días)")
+    
+    print(f"\n✅ Archivos generados: tarjetas_utilizacion.csv, "
+          f"tarjetas_gasto_mensual.csv, tarjetas_por_vencer.csv")
+    
+    pausar()
+
+
 def main():
     """Función principal que ejecuta el menú interactivo."""
     while True:
         limpiar_pantalla()
         mostrar_menu()
+        precargar()
         
         opcion = input("\n➤ Seleccione una opción: ").strip()
         
@@ -258,7 +560,13 @@ def main():
             ejecutar_punto5()
         elif opcion == '6':
             ejecutar_punto6()
+        elif opcion == '7':
+            ejecutar_punto7()
+        elif opcion == '8':
+            ejecutar_punto8()
         elif opcion == '0':
+            if _precarga is not None:
+                _precarga.cancelar()
             limpiar_pantalla()
             print("\n¡Hasta luego! 👋\n")
             sys.exit(0)
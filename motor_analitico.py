@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+motor_analitico.py
+
+Motor analítico en memoria que calcula los reportes del taller a partir de
+una única foto de la base de datos.
+
+Cada tabla se carga una sola vez, con las columnas necesarias y dentro de una
+misma transacción con snapshot consistente, en DataFrames tipados:
+- Montos como enteros en centavos (int64), para que las sumas sean exactas.
+- Nombres, apellidos, tipos y estados como categóricos.
+- Ciudad, país, sede y moneda como códigos (ids) que se resuelven con los
+  catálogos (catalogos.py), también categóricos.
+
+Los reportes se calculan con joins y groupby vectorizados y devuelven
+exactamente las mismas listas de diccionarios que las funciones de
+consultas.py. Los ORDER BY sobre texto de MySQL usan la colación del
+servidor (utf8mb4_0900_ai_ci / utf8mb4_unicode_ci: sin distinguir acentos ni
+mayúsculas); aquí se aproxima con clave_colacion(). Los empates que SQL deja
+sin definir se desempatan por id.
+"""
+from typing import Dict, List, Optional
+from decimal import Decimal
+import datetime as dt
+import time
+import unicodedata
+import numpy as np
+import pandas as pd
+from database import get_connection
+from catalogos import obtener_catalogos
+from archivo_frio import ventana_con_archivo, sumar_por_cuenta_origen
+from consultas import _write_csv, _restar_meses
+
+
+TIPOS_TOP_CLIENTES = ('transferencia', 'retiro')
+
+
+def clave_colacion(texto: str) -> str:
+    """Clave de orden que ignora acentos y mayúsculas, como la colación *_ai_ci."""
+    descompuesto = unicodedata.normalize('NFD', texto)
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).casefold()
+
+
+def _monto(centavos) -> Decimal:
+    """Convierte centavos enteros en Decimal con dos decimales."""
+    return Decimal(int(centavos)).scaleb(-2)
+
+
+def _leer(cursor, consulta: str, columnas: Dict[str, str],
+          tam_lote: int) -> pd.DataFrame:
+    """Lee una consulta en lotes y arma un DataFrame con los tipos indicados.
+
+    Args:
+        cursor: Cursor abierto
+        consulta: SELECT con las columnas en el mismo orden que `columnas`
+        columnas: Nombre → dtype de pandas ('int64', 'category', 'datetime64[ns]'...)
+        tam_lote: Filas por fetchmany
+    """
+    cursor.execute(consulta)
+    nombres = list(columnas)
+    partes = []
+    while True:
+        lote = cursor.fetchmany(tam_lote)
+        if not lote:
+            break
+        parte = pd.DataFrame.from_records(lote, columns=nombres)
+        for nombre, tipo in columnas.items():
+            if tipo not in ('category', 'object'):
+                parte[nombre] = parte[nombre].astype(tipo)
+        partes.append(parte)
+    if partes:
+        df = pd.concat(partes, ignore_index=True)
+    else:
+        df = pd.DataFrame({n: pd.Series(dtype='object' if t == 'category' else t)
+                           for n, t in columnas.items()})
+    for nombre, tipo in columnas.items():
+        if tipo == 'category':
+            df[nombre] = df[nombre].astype('category')
+    return df
+
+
+class MotorAnalitico:
+    """Foto columnar de la base de datos y reportes vectorizados.
+
+    Attributes:
+        usuario, cuenta, prestamo, cuota, transaccion: DataFrames cargados
+        ciudad, pais, sede, moneda, producto: Catálogos como DataFrames
+            indexados por id
+        cargado_en: Momento de la carga
+    """
+
+    def __init__(self):
+        self.usuario: Optional[pd.DataFrame] = None
+        self.cuenta: Optional[pd.DataFrame] = None
+        self.prestamo: Optional[pd.DataFrame] = None
+        self.cuota: Optional[pd.DataFrame] = None
+        self.transaccion: Optional[pd.DataFrame] = None
+        self.ciudad: Optional[pd.DataFrame] = None
+        self.pais: Optional[pd.DataFrame] = None
+        self.sede: Optional[pd.DataFrame] = None
+        self.moneda: Optional[pd.DataFrame] = None
+        self.producto: Optional[pd.DataFrame] = None
+        self.cargado_en: Optional[dt.datetime] = None
+        self._conexion: Dict = {}
+
+    def _catalogos(self, catalogos) -> None:
+        """Convierte la caché de catálogos en DataFrames indexados por id."""
+        def marco(diccionario, columnas: List[str], categoricas: List[str]) -> pd.DataFrame:
+            df = pd.DataFrame.from_records(
+                [(k, *v) for k, v in diccionario.items()], columns=['id'] + columnas
+            ).set_index('id')
+            for c in categoricas:
+                df[c] = df[c].astype('category')
+            return df
+
+        self.pais = marco(catalogos.pais, ['nombre', 'codigo_iso'], ['nombre'])
+        self.ciudad = marco(catalogos.ciudad, ['nombre', 'id_pais'], ['nombre'])
+        self.sede = marco(catalogos.sede, ['nombre', 'id_ciudad'], ['nombre'])
+        self.moneda = marco(catalogos.moneda, ['nombre', 'codigo', 'simbolo'],
+                            ['nombre', 'codigo'])
+        self.producto = marco(catalogos.producto, ['nombre', 'tipo', 'id_moneda'],
+                              ['nombre', 'tipo'])
+
+    def cargar(self, tam_lote: int = 50_000, host: str = None, port: int = None,
+               user: str = None, password: str = None,
+               database: str = None) -> 'MotorAnalitico':
+        """Carga la foto de la base de datos.
+
+        Todas las tablas se leen dentro de una transacción con snapshot
+        consistente, de modo que los reportes ven el mismo estado.
+
+        Args:
+            tam_lote: Filas por fetchmany
+            host: Servidor MySQL (opcional)
+            port: Puerto MySQL (opcional)
+            user: Usuario MySQL (opcional)
+            password: Contraseña MySQL (opcional)
+            database: Base de datos (opcional)
+
+        Returns:
+            MotorAnalitico: El propio motor, cargado
+        """
+        self._conexion = dict(host=host, port=port, user=user,
+                              password=password, database=database)
+        self._catalogos(obtener_catalogos(host, port, user, password, database))
+
+        conn = get_connection(host, port, user, password, database, lectura=True)
+        cursor = conn.cursor()
+        try:
+            cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+            self.usuario = _leer(cursor, """
+                SELECT id_usuario, nombre, apellido, dni, id_ciudad FROM usuario
+            """, {'id_usuario': 'int64', 'nombre': 'category', 'apellido': 'category',
+                  'dni': 'object', 'id_ciudad': 'int32'}, tam_lote)
+            self.cuenta = _leer(cursor, """
+                SELECT id_cuenta, id_usuario, id_producto, id_sede,
+                       CAST(ROUND(saldo * 100) AS SIGNED)
+                FROM cuenta
+            """, {'id_cuenta': 'int64', 'id_usuario': 'int64', 'id_producto': 'int32',
+                  'id_sede': 'int32', 'saldo_c': 'int64'}, tam_lote)
+            self.prestamo = _leer(cursor, """
+                SELECT id_prestamo, id_usuario, CAST(ROUND(monto_total * 100) AS SIGNED),
+                       CAST(ROUND(tasa_interes * 100) AS SIGNED), fecha_inicio,
+                       fecha_fin, estado, id_moneda
+                FROM prestamo
+            """, {'id_prestamo': 'int64', 'id_usuario': 'int64', 'monto_c': 'int64',
+                  'tasa_c': 'int64', 'fecha_inicio': 'datetime64[ns]',
+                  'fecha_fin': 'datetime64[ns]', 'estado': 'category',
+                  'id_moneda': 'int32'}, tam_lote)
+            self.cuota = _leer(cursor, """
+                SELECT id_cuota, id_prestamo, CAST(ROUND(monto * 100) AS SIGNED), estado
+                FROM cuota
+            """, {'id_cuota': 'int64', 'id_prestamo': 'int64', 'monto_c': 'int64',
+                  'estado': 'category'}, tam_lote)
+            self.transaccion = _leer(cursor, """
+                SELECT id_cuenta_origen, CAST(ROUND(monto * 100) AS SIGNED), fecha, tipo
+                FROM transaccion
+            """, {'id_cuenta_origen': 'int64', 'monto_c': 'int64',
+                  'fecha': 'datetime64[ns]', 'tipo': 'category'}, tam_lote)
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+        self.cargado_en = dt.datetime.now()
+        return self
+
+    # ------------------------------------------------------------------
+    # Reportes
+    # ------------------------------------------------------------------
+
+    def _ordenar_texto(self, df: pd.DataFrame, columnas: List[str],
+                       desempate: List[str]) -> pd.DataFrame:
+        """Ordena por columnas de texto con la clave de colación."""
+        claves = []
+        for i, columna in enumerate(columnas):
+            serie = df[columna]
+            # En los categóricos map() calcula la clave una vez por categoría
+            df[f'_k{i}'] = serie.map(clave_colacion).astype(str)
+            claves.append(f'_k{i}')
+        df = df.sort_values(claves + desempate, kind='stable')
+        return df.drop(columns=claves)
+
+    def clientes_por_ubicacion(self) -> List[Dict[str, str]]:
+        """Punto 1 - Clientes con su ciudad y país, sin duplicados.
+
+        Returns:
+            List[Dict[str, str]]: Igual que consultas.clientes_por_ubicacion()
+        """
+        u = self.usuario
+        ciudad = self.ciudad.reindex(u['id_ciudad'])
+        df = pd.DataFrame({
+            'Cliente': u['nombre'].astype(str) + ' ' + u['apellido'].astype(str),
+            'Ciudad': ciudad['nombre'].to_numpy(),
+            'País': self.pais['nombre'].reindex(ciudad['id_pais']).to_numpy(),
+        }).dropna()
+        df['Ciudad'] = df['Ciudad'].astype('category')
+        df['País'] = df['País'].astype('category')
+        df = df.drop_duplicates(['Cliente', 'Ciudad', 'País'])
+        df = self._ordenar_texto(df, ['País', 'Ciudad', 'Cliente'],
+                                 ['País', 'Ciudad', 'Cliente'])
+        return [{'Cliente': c, 'Ciudad': ci, 'País': p}
+                for c, ci, p in zip(df['Cliente'], df['Ciudad'].astype(str),
+                                    df['País'].astype(str))]
+
+    def saldo_por_moneda(self) -> List[Dict[str, str]]:
+        """Punto 2 - Saldo total por país y moneda.
+
+        Returns:
+            List[Dict[str, str]]: Igual que consultas.saldo_por_moneda()
+        """
+        c = self.cuenta
+        id_ciudad = c['id_usuario'].map(self.usuario.set_index('id_usuario')['id_ciudad'])
+        df = pd.DataFrame({
+            'id_pais': id_ciudad.map(self.ciudad['id_pais']),
+            'id_moneda': c['id_producto'].map(self.producto['id_moneda']),
+            'saldo_c': c['saldo_c'],
+        }).dropna()
+        totales = df.groupby(['id_pais', 'id_moneda'], sort=False)['saldo_c'].sum()
+
+        filas = []
+        for (id_pais, id_moneda), centavos in totales.items():
+            moneda = self.moneda.loc[int(id_moneda)]
+            filas.append((str(self.pais.loc[int(id_pais), 'nombre']), str(moneda['nombre']),
+                          {'País': str(self.pais.loc[int(id_pais), 'nombre']),
+                           'Moneda': f"{moneda['nombre']} ({moneda['codigo']})",
+                           'Saldo Total': f"{moneda['simbolo']} {_monto(centavos):,.2f}"}))
+        filas.sort(key=lambda f: (f[0], f[1]))
+        return [f[2] for f in filas]
+
+    def prestamos_activos(self, dni: str) -> Optional[List[Dict[str, str]]]:
+        """Punto 3 - Préstamos activos de un cliente.
+
+        Returns:
+            Optional[List[Dict[str, str]]]: Igual que consultas.prestamos_activos()
+                (None si el DNI no existe)
+        """
+        usuarios = self.usuario.loc[self.usuario['dni'] == dni.strip(), 'id_usuario']
+        if usuarios.empty:
+            return None
+        p = self.prestamo
+        p = p[(p['id_usuario'] == usuarios.iloc[0]) & (p['estado'] == 'activo')]
+        p = p.sort_values(['fecha_inicio', 'id_prestamo'], ascending=[False, True])
+        resultado = []
+        for fila in p.itertuples(index=False):
+            moneda = self.moneda.loc[fila.id_moneda]
+            resultado.append({
+                'ID Préstamo': str(fila.id_prestamo),
+                'Monto Total': f"{moneda['simbolo']} {_monto(fila.monto_c):,.2f}",
+                'Tasa Interés': f"{_monto(fila.tasa_c):.2f}%",
+                'Fecha Inicio': fila.fecha_inicio.strftime('%Y-%m-%d'),
+                'Fecha Fin': fila.fecha_fin.strftime('%Y-%m-%d'),
+                'Moneda': str(moneda['codigo'])
+            })
+        return resultado
+
+    def top_clientes(self, limite: int = 5, meses: int = 48) -> List[Dict[str, str]]:
+        """Punto 4 - Clientes con mayor monto en transferencias y retiros.
+
+        Incluye la parte de la ventana movida al archivo en frío, igual que
+        consultas.top_clientes_transacciones().
+
+        Returns:
+            List[Dict[str, str]]: Igual que consultas.top_clientes_transacciones()
+        """
+        desde = _restar_meses(dt.datetime.now(), meses)
+        t = self.transaccion
+        vivas = t[t['tipo'].isin(TIPOS_TOP_CLIENTES) & (t['fecha'] >= desde)]
+        por_cuenta = vivas.groupby('id_cuenta_origen')['monto_c'].sum()
+
+        ultimo_id = ventana_con_archivo(desde, **self._conexion)
+        if ultimo_id is not None:
+            archivadas = sumar_por_cuenta_origen(desde, TIPOS_TOP_CLIENTES,
+                                                 ultimo_id=ultimo_id, **self._conexion)
+            archivo = pd.Series({k: int(v.scaleb(2)) for k, v in archivadas.items()},
+                                dtype='int64')
+            por_cuenta = por_cuenta.add(archivo, fill_value=0).astype('int64')
+
+        cuenta_usuario = self.cuenta.set_index('id_cuenta')['id_usuario']
+        df = pd.DataFrame({'id_usuario': por_cuenta.index.map(cuenta_usuario),
+                           'monto_c': por_cuenta.to_numpy()}).dropna()
+        totales = df.groupby('id_usuario')['monto_c'].sum().reset_index()
+        totales['id_usuario'] = totales['id_usuario'].astype('int64')
+        totales = totales.sort_values(['monto_c', 'id_usuario'],
+                                      ascending=[False, True]).head(limite)
+        u = self.usuario.set_index('id_usuario').loc[totales['id_usuario']]
+        return [{'Puesto': str(i),
+                 'Cliente': f"{nombre} {apellido}",
+                 'Total Movido': f"$ {_monto(centavos):,.2f}"}
+                for i, (nombre, apellido, centavos) in enumerate(
+                    zip(u['nombre'], u['apellido'], totales['monto_c']), 1)]
+
+    def cuotas_pendientes(self) -> List[Dict[str, str]]:
+        """Punto 5 - Préstamos con cuotas pendientes.
+
+        Returns:
+            List[Dict[str, str]]: Igual que consultas.cuotas_pendientes()
+        """
+        c = self.cuota[self.cuota['estado'] == 'pendiente']
+        agregado = c.groupby('id_prestamo')['monto_c'].agg(['size', 'sum'])
+        prestamo_usuario = self.prestamo.set_index('id_prestamo')['id_usuario']
+        usuario_dni = self.usuario.set_index('id_usuario')['dni']
+        agregado['dni'] = agregado.index.map(prestamo_usuario).map(usuario_dni)
+        agregado = agregado.dropna(subset=['dni']).sort_index()
+        return [{'Préstamo': str(id_prestamo),
+                 'DNI Cliente': dni,
+                 'Cuotas Pendientes': str(cantidad),
+                 'Monto Total a Pagar': f"$ {_monto(centavos):,.2f}"}
+                for id_prestamo, cantidad, centavos, dni in zip(
+                    agregado.index, agregado['size'], agregado['sum'], agregado['dni'])]
+
+    def resumen_cliente(self) -> List[Dict[str, str]]:
+        """Punto 6 - Resumen por cliente, igual a la vista v_resumen_cliente.
+
+        La vista suma c.saldo sobre el LEFT JOIN cuenta × préstamo, por lo
+        que el saldo de cada cuenta se cuenta una vez por préstamo del
+        cliente. Aquí se reproduce ese mismo resultado.
+
+        Returns:
+            List[Dict[str, str]]: Igual que consultas.ver_resumen()
+        """
+        u = self.usuario[['id_usuario', 'nombre', 'apellido']].copy()
+        cuentas = self.cuenta.groupby('id_usuario')['saldo_c'].agg(['size', 'sum'])
+        prestamos = self.prestamo.groupby('id_usuario').size()
+        u['cantidad_cuentas'] = u['id_usuario'].map(cuentas['size']).fillna(0).astype('int64')
+        u['cantidad_prestamos'] = u['id_usuario'].map(prestamos).fillna(0).astype('int64')
+        saldo = u['id_usuario'].map(cuentas['sum']).fillna(0).astype('int64')
+        u['saldo_c'] = saldo * np.maximum(u['cantidad_prestamos'], 1)
+        u['nombre_completo'] = u['nombre'].astype(str) + ' ' + u['apellido'].astype(str)
+        u = self._ordenar_texto(u, ['nombre_completo'], ['nombre_completo', 'id_usuario'])
+        return [{'Nombre Completo': nombre,
+                 'Cantidad Cuentas': str(cuentas_),
+                 'Cantidad Préstamos': str(prestamos_),
+                 'Saldo Total': f"$ {_monto(centavos):,.2f}"}
+                for nombre, cuentas_, prestamos_, centavos in zip(
+                    u['nombre_completo'], u['cantidad_cuentas'],
+                    u['cantidad_prestamos'], u['saldo_c'])]
+
+    def saldos_jerarquicos(self) -> Dict:
+        """Saldos y clientes por moneda → país → ciudad → sede, con subtotales.
+
+        Cada nivel es un groupby sobre el prefijo de la jerarquía (el
+        equivalente vectorizado de GROUP BY ... WITH ROLLUP).
+
+        Returns:
+            Dict: Igual que jerarquias.saldos_jerarquicos()
+        """
+        from jerarquias import armar_arbol, aplanar
+        c = self.cuenta
+        id_ciudad = c['id_sede'].map(self.sede['id_ciudad'])
+        df = pd.DataFrame({
+            'id_moneda': c['id_producto'].map(self.producto['id_moneda']),
+            'id_pais': id_ciudad.map(self.ciudad['id_pais']),
+            'id_ciudad': id_ciudad,
+            'id_sede': c['id_sede'].where(c['id_sede'].isin(self.sede.index)),
+            'id_usuario': c['id_usuario'],
+            'saldo_c': c['saldo_c'],
+        }).dropna().astype('int64')
+
+        claves = ['id_moneda', 'id_pais', 'id_ciudad', 'id_sede']
+        agregados = []
+        if len(df):
+            agregados.append((None, None, None, None, len(df), df['id_usuario'].nunique(),
+                              _monto(df['saldo_c'].sum()), 0))
+        for nivel in range(1, len(claves) + 1):
+            g = df.groupby(claves[:nivel], sort=False).agg(
+                cuentas=('saldo_c', 'size'), clientes=('id_usuario', 'nunique'),
+                saldo_c=('saldo_c', 'sum'))
+            for ids, cuentas, clientes, centavos in zip(
+                    g.index, g['cuentas'], g['clientes'], g['saldo_c']):
+                ids = ids if isinstance(ids, tuple) else (ids,)
+                ids = tuple(int(i) for i in ids) + (None,) * (len(claves) - nivel)
+                agregados.append((*ids, cuentas, clientes, _monto(centavos), nivel))
+
+        raiz = armar_arbol(agregados, obtener_catalogos(**self._conexion))
+        return {'Árbol': raiz, 'Filas': aplanar(raiz)}
+
+
+REPORTES = {
+    'clientes_ubicacion.csv': ('clientes_por_ubicacion', ['Cliente', 'Ciudad', 'País']),
+    'saldo_por_moneda.csv': ('saldo_por_moneda', ['País', 'Moneda', 'Saldo Total']),
+    'top_clientes.csv': ('top_clientes', ['Puesto', 'Cliente', 'Total Movido']),
+    'cuotas_pendientes.csv': ('cuotas_pendientes',
+                              ['Préstamo', 'DNI Cliente', 'Cuotas Pendientes',
+                               'Monto Total a Pagar']),
+    'resumen_cliente.csv': ('resumen_cliente',
+                            ['Nombre Completo', 'Cantidad Cuentas',
+                             'Cantidad Préstamos', 'Saldo Total']),
+}
+
+
+def verificar_contra_sql(motor: MotorAnalitico) -> Dict[str, bool]:
+    """Compara cada reporte del motor con su versión SQL de consultas.py.
+
+    Returns:
+        Dict[str, bool]: Nombre del reporte → True si coinciden fila a fila
+    """
+    import consultas
+    import jerarquias
+    pares = {
+        'clientes_por_ubicacion': consultas.clientes_por_ubicacion,
+        'saldo_por_moneda': consultas.saldo_por_moneda,
+        'top_clientes': consultas.top_clientes_transacciones,
+        'cuotas_pendientes': consultas.cuotas_pendientes,
+        'resumen_cliente': consultas.ver_resumen,
+        'saldos_jerarquicos': jerarquias.saldos_jerarquicos,
+    }
+    return {nombre: getattr(motor, nombre)() == funcion(**motor._conexion)
+            for nombre, funcion in pares.items()}
+
+
+def main():
+    """Carga la foto, genera los cinco CSV y verifica contra SQL."""
+    print("="*70)
+    print("  MOTOR ANALÍTICO EN MEMORIA")
+    print("="*70)
+
+    try:
+        inicio = time.perf_counter()
+        motor = MotorAnalitico().cargar()
+        print(f"\n✅ Foto cargada en {time.perf_counter() - inicio:.2f}s "
+              f"({len(motor.usuario)} usuarios, {len(motor.cuenta)} cuentas, "
+              f"{len(motor.transaccion)} transacciones)")
+    except Exception as e:
+        print(f"❌ Error en cargar: {e}")
+        return
+
+    for archivo, (metodo, columnas) in REPORTES.items():
+        inicio = time.perf_counter()
+        filas = getattr(motor, metodo)()
+        ruta = _write_csv(filas, archivo, columnas)
+        print(f"   {metodo:<25} {len(filas):>8} filas  "
+              f"{(time.perf_counter() - inicio) * 1000:>8.1f} ms  → {ruta}")
+
+    print("\n🔎 Verificando contra las consultas SQL...")
+    for nombre, coincide in verificar_contra_sql(motor).items():
+        print(f"   {'✅' if coincide else '❌'} {nombre}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+particiones.py
+
+Administración de particiones mensuales de la tabla Transaccion por fecha.
+
+- particionar_transaccion(): convierte la tabla a PARTITION BY RANGE COLUMNS
+  (fecha) con una partición por mes (pYYYYMM) y una partición pmax de resguardo.
+- agregar_particiones_futuras(): crea por adelantado las particiones de los
+  próximos meses dividiendo pmax.
+- purgar_particiones(): elimina las particiones anteriores a la retención,
+  archivando antes sus filas en transaccion_historico si se pide. Nunca
+  elimina una partición que se superpone con la ventana de MESES_VENTANA
+  meses que leen los reportes.
+- verificar_poda(): ejecuta EXPLAIN sobre las consultas de reportes y
+  comprueba que solo lean las particiones necesarias.
+
+Restricciones de MySQL para tablas particionadas:
+- Toda clave única debe incluir la columna de particionado, por lo que la
+  clave primaria pasa a ser (id_transaccion, fecha).
+- InnoDB no admite claves foráneas en tablas particionadas: las FKs de
+  transaccion se eliminan durante la conversión.
+"""
+from typing import List, Dict, Optional, Tuple
+import datetime as dt
+from database import get_connection
+from consultas import MESES_VENTANA, _restar_meses
+
+
+# Consultas de reportes cuya poda se verifica (mismo filtro que consultas.py)
+CONSULTAS_VERIFICADAS: Dict[str, str] = {
+    'top_clientes_transacciones': """
+        SELECT u.id_usuario, ROUND(SUM(t.monto), 2)
+        FROM transaccion t
+        JOIN cuenta c ON t.id_cuenta_origen = c.id_cuenta
+        JOIN usuario u ON c.id_usuario = u.id_usuario
+        WHERE t.tipo IN ('transferencia', 'retiro')
+          AND t.fecha >= DATE_SUB(NOW(), INTERVAL {MESES_VENTANA} MONTH)
+        GROUP BY u.id_usuario
+    """.format(MESES_VENTANA=MESES_VENTANA),
+    'transacciones_mes_actual': """
+        SELECT COUNT(*)
+        FROM transaccion t
+        WHERE t.fecha >= DATE_FORMAT(NOW(), '%Y-%m-01')
+    """,
+}
+
+
+def _sumar_meses(fecha: dt.date, meses: int) -> dt.date:
+    """Suma meses a una fecha que es primer día de mes."""
+    total = fecha.year * 12 + (fecha.month - 1) + meses
+    return dt.date(total // 12, total % 12 + 1, 1)
+
+
+def _nombre_particion(limite: dt.date) -> str:
+    """Nombre de la partición cuyo límite superior (exclusivo) es `limite`."""
+    mes = _sumar_meses(limite, -1)
+    return f"p{mes.year:04d}{mes.month:02d}"
+
+
+def _definicion(limite: dt.date) -> str:
+    """Cláusula PARTITION para el mes anterior a `limite`."""
+    return f"PARTITION {_nombre_particion(limite)} VALUES LESS THAN ('{limite.isoformat()}')"
+
+
+def _particiones_actuales(cursor) -> List[Tuple[str, Optional[str]]]:
+    """Lista (nombre, límite) de las particiones existentes de transaccion."""
+    cursor.execute("""
+        SELECT PARTITION_NAME, PARTITION_DESCRIPTION
+        FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE()
+          AND TABLE_NAME = 'transaccion'
+          AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+    """)
+    return [(nombre, descripcion) for nombre, descripcion in cursor.fetchall()]
+
+
+def _limite_particion(descripcion: str) -> Optional[dt.date]:
+    """Convierte PARTITION_DESCRIPTION ("'2024-05-01'" o MAXVALUE) a fecha."""
+    valor = descripcion.strip("'")
+    if valor.upper() == 'MAXVALUE':
+        return None
+    return dt.date.fromisoformat(valor[:10])
+
+
+def particionar_transaccion(meses_futuros: int = 3,
+                            host: str = None, port: int = None,
+                            user: str = None, password: str = None,
+                            database: str = None) -> bool:
+    """Convierte transaccion en una tabla particionada por mes de fecha.
+
+    Se crea una partición por cada mes desde la transacción más antigua hasta
+    `meses_futuros` meses después del actual, más la partición pmax. La
+    operación reconstruye la tabla: conviene ejecutarla en una ventana de
+    mantenimiento.
+
+    Args:
+        meses_futuros: Meses a crear por adelantado
+        host: Servidor MySQL (opcional)
+        port: Puerto MySQL (opcional)
+        user: Usuario MySQL (opcional)
+        password: Contraseña MySQL (opcional)
+        database: Base de datos (opcional)
+
+    Returns:
+        bool: True si la tabla quedó particionada, False en caso de error
+    """
+    try:
+        conn = get_connection(host, port, user, password, database)
+        cursor = conn.cursor()
+
+        if _particiones_actuales(cursor):
+            print("ℹ️  transaccion ya está particionada.")
+            cursor.close()
+            conn.close()
+            return True
+
+        # Eliminar claves foráneas (no soportadas en tablas particionadas)
+        cursor.execute("""
+            SELECT CONSTRAINT_NAME
+            FROM information_schema.REFERENTIAL_CONSTRAINTS
+            WHERE CONSTRAINT_SCHEMA = DATABASE()
+              AND TABLE_NAME = 'transaccion'
+        """)
+        for (fk,) in cursor.fetchall():
+            cursor.execute(f"ALTER TABLE transaccion DROP FOREIGN KEY `{fk}`")
+
+        cursor.execute("SELECT MIN(fecha) FROM transaccion")
+        (minima,) = cursor.fetchone()
+        hoy = dt.date.today()
+        primero = dt.date(minima.year, minima.month, 1) if minima else dt.date(hoy.year, hoy.month, 1)
+        ultimo = _sumar_meses(dt.date(hoy.year, hoy.month, 1), meses_futuros + 1)
+
+        definiciones = []
+        limite = _sumar_meses(primero, 1)
+        while limite <= ultimo:
+            definiciones.append(_definicion(limite))
+            limite = _sumar_meses(limite, 1)
+        definiciones.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+
+        cursor.execute("""
+            ALTER TABLE transaccion
+                DROP PRIMARY KEY,
+                ADD PRIMARY KEY (id_transaccion, fecha)
+        """)
+        cursor.execute(f"""
+            ALTER TABLE transaccion
+            PARTITION BY RANGE COLUMNS (fecha) (
+                {', '.join(definiciones)}
+            )
+        """)
+
+        cursor.close()
+        conn.close()
+        return True
+
+    except Exception as e:
+        print(f"❌ Error en particionar_transaccion: {e}")
+        return False
+
+
+def agregar_particiones_futuras(meses_futuros: int = 3,
+                                host: str = None, port: int = None,
+                                user: str = None, password: str = None,
+                                database: str = None) -> List[str]:
+    """Crea las particiones mensuales faltantes hasta `meses_futuros` meses.
+
+    Las nuevas particiones se obtienen dividiendo pmax (REORGANIZE PARTITION),
+    que es inmediato mientras pmax esté vacía.
+
+    Args:
+        meses_futuros: Meses a cubrir por delante del actual
+        host: Servidor MySQL (opcional)
+        port: Puerto MySQL (opcional)
+        user: Usuario MySQL (opcional)
+        password: Contraseña MySQL (opcional)
+        database: Base de datos (opcional)
+
+    Returns:
+        List[str]: Nombres de las particiones creadas
+    """
+    try:
+        conn = get_connection(host, port, user, password, database)
+        cursor = conn.cursor()
+
+        limites = [_limite_particion(d) for _, d in _particiones_actuales(cursor)]
+        fechas = [l for l in limites if l is not None]
+        if not fechas:
+            cursor.close()
+            conn.close()
+            return []
+
+        hoy = dt.date.today()
+        objetivo = _sumar_meses(dt.date(hoy.year, hoy.month, 1), meses_futuros + 1)
+        limite = _sumar_meses(max(fechas), 1)
+        nuevas = []
+        while limite <= objetivo:
+            nuevas.append(limite)
+            limite = _sumar_meses(limite, 1)
+
+        if nuevas:
+            definiciones = [_definicion(l) for l in nuevas]
+            definiciones.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+            cursor.execute(f"""
+                ALTER TABLE transaccion
+                REORGANIZE PARTITION pmax INTO ({', '.join(definiciones)})
+            """)
+
+        cursor.close()
+        conn.close()
+        return [_nombre_particion(l) for l in nuevas]
+
+    except Exception as e:
+        print(f"❌ Error en agregar_particiones_futuras: {e}")
+        return []
+
+
+def purgar_particiones(retencion_meses: int = MESES_VENTANA + 1, archivar: bool = True,
+                       host: str = None, port: int = None,
+                       user: str = None, password: str = None,
+                       database: str = None) -> List[str]:
+    """Elimina las particiones cuyo mes quedó fuera de la retención.
+
+    Con archivar=True, cada partición se intercambia primero (EXCHANGE
+    PARTITION, operación de metadatos) con una tabla de paso vacía y sus
+    filas se copian a transaccion_historico antes de eliminarla. Si una
+    corrida anterior falló entre el intercambio y la copia, las filas que
+    quedaron en la tabla de paso se archivan antes de recrearla.
+
+    Una partición solo se elimina si su límite superior es anterior o igual
+    al inicio de la ventana de los reportes (hoy menos MESES_VENTANA meses,
+    como DATE_SUB): con una retención menor, las particiones que la ventana
+    todavía lee se conservan y se avisa.
+
+    Args:
+        retencion_meses: Meses completos a conservar, contando el actual
+            (default MESES_VENTANA + 1: la ventana empieza a mitad de mes)
+        archivar: Copiar las filas a transaccion_historico antes de eliminar
+        host: Servidor MySQL (opcional)
+        port: Puerto MySQL (opcional)
+        user: Usuario MySQL (opcional)
+        password: Contraseña MySQL (opcional)
+        database: Base de datos (opcional)
+
+    Returns:
+        List[str]: Nombres de las particiones eliminadas
+    """
+    try:
+        conn = get_connection(host, port, user, password, database)
+        cursor = conn.cursor()
+
+        hoy = dt.date.today()
+        corte = _sumar_meses(dt.date(hoy.year, hoy.month, 1), -(retencion_meses - 1))
+        inicio_ventana = _restar_meses(dt.datetime.now(), MESES_VENTANA).date()
+        vencidas = []
+        for nombre, descripcion in _particiones_actuales(cursor):
+            limite = _limite_particion(descripcion) or dt.date.max
+            if limite > corte:
+                continue
+            if limite > inicio_ventana:
+                print(f"⚠️  {nombre} no se elimina: los reportes leen desde {inicio_ventana}")
+                continue
+            vencidas.append(nombre)
+
+        if vencidas and archivar:
+            cursor.execute("CREATE TABLE IF NOT EXISTS transaccion_historico LIKE transaccion")
+            if _es_particionada(cursor, 'transaccion_historico'):
+                cursor.execute("ALTER TABLE transaccion_historico REMOVE PARTITIONING")
+            _recuperar_paso(cursor)
+            conn.commit()
+            cursor.execute("DROP TABLE IF EXISTS transaccion_paso")
+            cursor.execute("CREATE TABLE transaccion_paso LIKE transaccion")
+            cursor.execute("ALTER TABLE transaccion_paso REMOVE PARTITIONING")
+
+        for nombre in vencidas:
+            if archivar:
+                cursor.execute(f"ALTER TABLE transaccion EXCHANGE PARTITION {nombre} "
+                               f"WITH TABLE transaccion_paso")
+                cursor.execute("INSERT INTO transaccion_historico SELECT * FROM transaccion_paso")
+                conn.commit()
+                cursor.execute("TRUNCATE TABLE transaccion_paso")
+            cursor.execute(f"ALTER TABLE transaccion DROP PARTITION {nombre}")
+
+        if vencidas and archivar:
+            cursor.execute("DROP TABLE IF EXISTS transaccion_paso")
+
+        cursor.close()
+        conn.close()
+        return vencidas
+
+    except Exception as e:
+        print(f"❌ Error en purgar_particiones: {e}")
+        return []
+
+
+def _recuperar_paso(cursor) -> int:
+    """Archiva las filas que una corrida fallida dejó en transaccion_paso.
+
+    INSERT IGNORE porque la corrida pudo fallar después de copiarlas (antes
+    del TRUNCATE): las que ya están en transaccion_historico no se duplican.
+
+    Returns:
+        int: Filas recuperadas
+    """
+    cursor.execute("""
+        SELECT COUNT(*)
+        FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = DATABASE()
+          AND TABLE_NAME = 'transaccion_paso'
+    """)
+    if not cursor.fetchone()[0]:
+        return 0
+    cursor.execute("INSERT IGNORE INTO transaccion_historico SELECT * FROM transaccion_paso")
+    recuperadas = cursor.rowcount
+    if recuperadas:
+        print(f"⚠️  {recuperadas} filas de una purga anterior recuperadas desde transaccion_paso")
+    return recuperadas
+
+
+def _es_particionada(cursor, tabla: str) -> bool:
+    """Indica si una tabla del esquema actual tiene particiones."""
+    cursor.execute("""
+        SELECT COUNT(*)
+        FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE()
+          AND TABLE_NAME = %s
+          AND PARTITION_NAME IS NOT NULL
+    """, (tabla,))
+    return cursor.fetchone()[0] > 0
+
+
+def verificar_poda(consultas: Optional[Dict[str, str]] = None,
+                   host: str = None, port: int = None,
+                   user: str = None, password: str = None,
+                   database: str = None) -> List[Dict[str, str]]:
+    """Verifica con EXPLAIN que las consultas de reportes poden particiones.
+
+    Args:
+        consultas: Consultas a verificar (default: CONSULTAS_VERIFICADAS)
+        host: Servidor MySQL (opcional)
+        port: Puerto MySQL (opcional)
+        user: Usuario MySQL (opcional)
+        password: Contraseña MySQL (opcional)
+        database: Base de datos (opcional)
+
+    Returns:
+        List[Dict[str, str]]: Lista de diccionarios con las claves:
+            - 'Consulta': Nombre de la consulta
+            - 'Particiones Leídas': Cantidad de particiones en el plan
+            - 'Total Particiones': Particiones de la tabla
+            - 'Poda': 'sí' si se leen menos particiones que el total
+    """
+    try:
+        conn = get_connection(host, port, user, password, database)
+        cursor = conn.cursor()
+
+        total = len(_particiones_actuales(cursor))
+        result: List[Dict[str, str]] = []
+        for nombre, sql in (consultas or CONSULTAS_VERIFICADAS).items():
+            cursor.execute(f"EXPLAIN {sql}")
+            columnas = [c.lower() for c in cursor.column_names]
+            filas = cursor.fetchall()
+            leidas = 0
+            for fila in filas:
+                registro = dict(zip(columnas, fila))
+                if registro.get('table') == 't' and registro.get('partitions'):
+                    leidas = len(registro['partitions'].split(','))
+            result.append({
+                'Consulta': nombre,
+                'Particiones Leídas': str(leidas),
+                'Total Particiones': str(total),
+                'Poda': 'sí' if 0 < leidas < total else 'no'
+            })
+
+        cursor.close()
+        conn.close()
+        return result
+
+    except Exception as e:
+        print(f"❌ Error en verificar_poda: {e}")
+        return []
+
+
+def main():
+    """Mantenimiento periódico: crea particiones futuras, purga y verifica."""
+    print("="*70)
+    print("  MANTENIMIENTO DE PARTICIONES DE TRANSACCION")
+    print("="*70)
+
+    if not particionar_transaccion():
+        return
+
+    nuevas = agregar_particiones_futuras()
+    print(f"\n✅ Particiones creadas: {', '.join(nuevas) or 'ninguna'}")
+
+    purgadas = purgar_particiones()
+    print(f"✅ Particiones purgadas: {', '.join(purgadas) or 'ninguna'}")
+
+    print(f"\n{'Consulta':<32} {'Leídas':>8} {'Total':>8} {'Poda':>6}")
+    print("-"*70)
+    for item in verificar_poda():
+        print(f"{item['Consulta']:<32} {item['Particiones Leídas']:>8} "
+              f"{item['Total Particiones']:>8} {item['Poda']:>6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+perfil_cliente.py
+
+Perfil 360 de un cliente a partir de su DNI en un solo viaje a la base de
+datos.
+
+El DNI se traduce a id_usuario con el índice en memoria (indice_dni.py), de
+modo que un DNI desconocido no consulta la base. Para un DNI conocido se
+envía un único lote de seis SELECT (multi-statement) sobre una conexión,
+todos filtrados por id_usuario y resueltos con índices; nombres de ciudad,
+país, sede y moneda se completan con la caché de catálogos: las cuotas se
+muestran en la moneda de su préstamo, el límite de una tarjeta en la de su
+cuenta y las transacciones en la de su cuenta origen (o destino, si no tienen
+origen).
+
+Los índices que necesita el perfil se crean con crear_indices_perfil().
+"""
+from typing import List, Dict, Union
+import time
+from database import get_connection
+from catalogos import obtener_catalogos
+from indice_dni import obtener_indice_dni
+
+
+INDICES_PERFIL = [
+    "CREATE INDEX idx_cuenta_usuario ON cuenta (id_usuario)",
+    "CREATE INDEX idx_tarjeta_usuario ON tarjeta (id_usuario)",
+    "CREATE INDEX idx_prestamo_usuario_estado ON prestamo (id_usuario, estado)",
+    "CREATE INDEX idx_cuota_prestamo_estado ON cuota (id_prestamo, estado)",
+    "CREATE INDEX idx_transaccion_origen_fecha ON transaccion (id_cuenta_origen, fecha)",
+    "CREATE INDEX idx_transaccion_destino_fecha ON transaccion (id_cuenta_destino, fecha)",
+]
+
+CONSULTA_PERFIL = """
+    SELECT id_usuario, nombre, apellido, dni, email, telefono, id_ciudad
+    FROM usuario
+    WHERE id_usuario = %(id)s;
+
+    SELECT id_cuenta, numero_cuenta, saldo, fecha_apertura, id_producto, id_sede
+    FROM cuenta
+    WHERE id_usuario = %(id)s
+    ORDER BY id_cuenta;
+
+    SELECT tj.numero_tarjeta, tj.tipo, tj.limite_credito, tj.fecha_vencimiento,
+           c.id_producto
+    FROM tarjeta tj
+    LEFT JOIN cuenta c ON c.id_cuenta = tj.id_cuenta
+    WHERE tj.id_usuario = %(id)s
+    ORDER BY tj.fecha_vencimiento;
+
+    SELECT id_prestamo, monto_total, tasa_interes, fecha_inicio, fecha_fin, id_moneda
+    FROM prestamo
+    WHERE id_usuario = %(id)s AND estado = 'activo'
+    ORDER BY fecha_inicio DESC;
+
+    SELECT c.id_prestamo, c.numero_cuota, c.monto, c.fecha_vencimiento, c.estado,
+           p.id_moneda
+    FROM prestamo p
+    JOIN cuota c ON c.id_prestamo = p.id_prestamo
+    WHERE p.id_usuario = %(id)s AND c.estado IN ('pendiente', 'vencida')
+    ORDER BY c.fecha_vencimiento;
+
+    SELECT r.id_transaccion, r.fecha, r.tipo, r.monto, r.id_cuenta_origen,
+           r.id_cuenta_destino, COALESCE(co.id_producto, cd.id_producto)
+    FROM (
+        (SELECT t.id_transaccion, t.fecha, t.tipo, t.monto,
+                t.id_cuenta_origen, t.id_cuenta_destino
+         FROM cuenta c
+         JOIN transaccion t ON t.id_cuenta_origen = c.id_cuenta
+         WHERE c.id_usuario = %(id)s
+         ORDER BY t.fecha DESC
+         LIMIT %(n)s)
+        UNION
+        (SELECT t.id_transaccion, t.fecha, t.tipo, t.monto,
+                t.id_cuenta_origen, t.id_cuenta_destino
+         FROM cuenta c
+         JOIN transaccion t ON t.id_cuenta_destino = c.id_cuenta
+         WHERE c.id_usuario = %(id)s
+         ORDER BY t.fecha DESC
+         LIMIT %(n)s)
+    ) r
+    LEFT JOIN cuenta co ON co.id_cuenta = r.id_cuenta_origen
+    LEFT JOIN cuenta cd ON cd.id_cuenta = r.id_cuenta_destino
+    ORDER BY r.fecha DESC
+    LIMIT %(n)s
+"""
+
+
+def crear_indices_perfil(host: str = None, port: int = None,
+                         user: str = None, password: str = None,
+                         database: str = None) -> int:
+    """Crea los índices que usa el perfil (ignora los que ya existen).
+
+    Returns:
+        int: Cantidad de índices creados
+    """
+    creados = 0
+    conn = get_connection(host, port, user, password, database)
+    cursor = conn.cursor()
+    try:
+        for ddl in INDICES_PERFIL:
+            try:
+                cursor.execute(ddl)
+                creados += 1
+            except Exception as e:
+                # 1061: Duplicate key name (el índice ya existe)
+                if getattr(e, 'errno', None) != 1061:
+                    raise
+    finally:
+        cursor.close()
+        conn.close()
+    return creados
+
+
+def _conjuntos_resultados(cursor, sql: str, params: Dict) -> List[List[tuple]]:
+    """Ejecuta un lote multi-statement y retorna las filas de cada SELECT.
+
+    Soporta ambas APIs de mysql-connector: `multi=True` (8.x) y
+    `map_results=True` + nextset() (9.2+).
+    """
+    conjuntos: List[List[tuple]] = []
+    try:
+        for resultado in cursor.execute(sql, params, multi=True):
+            if resultado.with_rows:
+                conjuntos.append(resultado.fetchall())
+    except TypeError:
+        cursor.execute(sql, params, map_results=True)
+        while True:
+            if cursor.with_rows:
+                conjuntos.append(cursor.fetchall())
+            if not cursor.nextset():
+                break
+    return conjuntos
+
+
+def perfil_cliente(dni: str, n_transacciones: int = 10,
+                   host: str = None, port: int = None,
+                   user: str = None, password: str = None,
+                   database: str = None) -> Union[Dict, None, bool]:
+    """Obtiene el perfil completo de un cliente por DNI.
+
+    Args:
+        dni: DNI del cliente
+        n_transacciones: Cantidad de transacciones recientes a incluir
+        host: Servidor MySQL (opcional)
+        port: Puerto MySQL (opcional)
+        user: Usuario MySQL (opcional)
+        password: Contraseña MySQL (opcional)
+        database: Base de datos (opcional)
+
+    Returns:
+        Union[Dict, None, bool]: Diccionario con las claves:
+            - 'Cliente': Dict con 'Nombre Completo', 'DNI', 'Email',
+              'Teléfono', 'Ciudad', 'País'
+            - 'Cuentas': Lista con 'Número', 'Saldo', 'Moneda', 'Sede'
+            - 'Tarjetas': Lista con 'Número', 'Tipo', 'Límite', 'Vencimiento'
+            - 'Préstamos': Lista con 'ID Préstamo', 'Monto Total',
+              'Tasa Interés', 'Fecha Inicio', 'Fecha Fin', 'Moneda'
+            - 'Cuotas': Lista con 'Préstamo', 'Cuota', 'Monto',
+              'Vencimiento', 'Estado'
+            - 'Transacciones': Lista con 'ID', 'Fecha', 'Tipo', 'Monto',
+              'Origen', 'Destino'
+            - 'Latencia (ms)': Tiempo total de la consulta
+
+        Retorna None si el DNI no existe y False si hubo un error (por
+        ejemplo, la base no responde).
+
+    Ejemplo:
+        >>> perfil = perfil_cliente('20000001')
+        >>> perfil['Cliente']['Nombre Completo']
+        'Luis Molina'
+    """
+    try:
+        inicio = time.perf_counter()
+        indice = obtener_indice_dni(host, port, database)
+        id_usuario = indice.buscar(dni, host, port, user, password, database)
+        if id_usuario is None:
+            return None
+        catalogos = obtener_catalogos(host, port, user, password, database)
+
+        conn = get_connection(host, port, user, password, database,
+                              lectura=True)
+        cursor = conn.cursor()
+        conjuntos = _conjuntos_resultados(
+            cursor, CONSULTA_PERFIL, {'id': id_usuario, 'n': n_transacciones})
+        cursor.close()
+        conn.close()
+
+        usuarios, cuentas, tarjetas, prestamos, cuotas, transacciones = conjuntos
+        if not usuarios:
+            return None
+
+        _, nombre, apellido, dni_db, email, telefono, id_ciudad = usuarios[0]
+        perfil: Dict = {
+            'Cliente': {
+                'Nombre Completo': f"{nombre} {apellido}",
+                'DNI': dni_db,
+                'Email': email,
+                'Teléfono': telefono,
+                'Ciudad': catalogos.ciudad[id_ciudad].nombre,
+                'País': catalogos.pais_de_ciudad(id_ciudad).nombre
+            },
+            'Cuentas': [],
+            'Tarjetas': [],
+            'Préstamos': [],
+            'Cuotas': [],
+            'Transacciones': []
+        }
+
+        for _, numero, saldo, _, id_producto, id_sede in cuentas:
+            moneda = catalogos.moneda_de_producto(id_producto)
+            perfil['Cuentas'].append({
+                'Número': numero,
+                'Saldo': f"{moneda.simbolo} {saldo:,.2f}",
+                'Moneda': moneda.codigo,
+                'Sede': catalogos.sede[id_sede].nombre
+            })
+
+        for numero, tipo, limite, vencimiento, id_producto in tarjetas:
+            if limite is None:
+                limite_texto = '-'
+            elif id_producto is None:
+                limite_texto = f"{limite:,.2f}"
+            else:
+                simbolo = catalogos.moneda_de_producto(id_producto).simbolo
+                limite_texto = f"{simbolo} {limite:,.2f}"
+            perfil['Tarjetas'].append({
+                'Número': f"**** {numero[-4:]}",
+                'Tipo': tipo,
+                'Límite': limite_texto,
+                'Vencimiento': str(vencimiento)
+            })
+
+        for id_prestamo, monto, tasa, fecha_inicio, fecha_fin, id_moneda in prestamos:
+            moneda = catalogos.moneda[id_moneda]
+            perfil['Préstamos'].append({
+                'ID Préstamo': str(id_prestamo),
+                'Monto Total': f"{moneda.simbolo} {monto:,.2f}",
+                'Tasa Interés': f"{tasa:.2f}%",
+                'Fecha Inicio': str(fecha_inicio),
+                'Fecha Fin': str(fecha_fin),
+                'Moneda': moneda.codigo
+            })
+
+        for id_prestamo, numero_cuota, monto, vencimiento, estado, id_moneda in cuotas:
+            perfil['Cuotas'].append({
+                'Préstamo': str(id_prestamo),
+                'Cuota': str(numero_cuota),
+                'Monto': f"{catalogos.moneda[id_moneda].simbolo} {monto:,.2f}",
+                'Vencimiento': str(vencimiento),
+                'Estado': estado
+            })
+
+        for id_transaccion, fecha, tipo, monto, origen, destino, id_producto in transacciones:
+            moneda = catalogos.moneda_de_producto(id_producto)
+            perfil['Transacciones'].append({
+                'ID': str(id_transaccion),
+                'Fecha': str(fecha),
+                'Tipo': tipo,
+                'Monto': f"{moneda.simbolo} {monto:,.2f}",
+                'Origen': str(origen) if origen is not None else '-',
+                'Destino': str(destino) if destino is not None else '-'
+            })
+
+        perfil['Latencia (ms)'] = round((time.perf_counter() - inicio) * 1000, 2)
+        return perfil
+
+    except Exception as e:
+        print(f"❌ Error en perfil_cliente: {e}")
+        return False
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+planificador.py
+
+Planificador de reportes modelado como un grafo de dependencias (DAG).
+
+- Los nodos sin dependencias pendientes se ejecutan en paralelo.
+- Cada reporte declara sus tablas de entrada; antes de ejecutarlo se calcula
+  una huella con CHECKSUM TABLE y, si coincide con la de la última corrida
+  exitosa y su CSV sigue existiendo, se omite y se conserva el CSV previo.
+  Las tablas de solo inserción (TABLAS_SOLO_INSERCION) no se recorren: su
+  huella es MIN/MAX del id más la lista de particiones, que cambian con cada
+  inserción, purga o archivado sin leer la tabla.
+- Cada ejecución queda registrada en historial_reportes.jsonl con su
+  duración, para planificación de capacidad.
+
+Ejemplo de dependencia: crear_vista → ver_resumen.
+"""
+from typing import List, Dict, Callable, Optional
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import datetime as dt
+import hashlib
+import json
+import os
+import time
+from database import get_connection
+from salida import ruta_salida
+from consultas import (
+    clientes_por_ubicacion,
+    saldo_por_moneda,
+    top_clientes_transacciones,
+    cuotas_pendientes,
+    crear_vista,
+    ver_resumen
+)
+
+
+# tabla → columna id. Tablas que solo reciben inserciones y bajas de los ids
+# más viejos (purga y archivo en frío), nunca UPDATE.
+TABLAS_SOLO_INSERCION: Dict[str, str] = {
+    'transaccion': 'id_transaccion',
+}
+
+
+class Nodo:
+    """Reporte planificable dentro del DAG.
+
+    Attributes:
+        nombre: Identificador único del nodo
+        funcion: Función de consultas.py a ejecutar (sin argumentos)
+        tablas: Tablas de entrada usadas para la huella
+        csv: Archivo generado (None si el nodo no produce CSV)
+        dependencias: Nombres de nodos que deben terminar antes
+        siempre: Ejecutar siempre, sin comparar huellas
+        por_fecha: La salida depende de la fecha actual (p. ej. ventanas con
+            NOW()), por lo que la fecha forma parte de la huella
+    """
+
+    def __init__(self, nombre: str, funcion: Callable, tablas: List[str],
+                 csv: Optional[str] = None, dependencias: List[str] = None,
+                 siempre: bool = False, por_fecha: bool = False):
+        self.nombre = nombre
+        self.funcion = funcion
+        self.tablas = tablas
+        self.csv = csv
+        self.dependencias = dependencias or []
+        self.siempre = siempre
+        self.por_fecha = por_fecha
+
+
+NODOS_REPORTES: List[Nodo] = [
+    Nodo('clientes_por_ubicacion', clientes_por_ubicacion,
+         ['usuario', 'ciudad', 'pais'], 'clientes_ubicacion.csv'),
+    Nodo('saldo_por_moneda', saldo_por_moneda,
+         ['cuenta', 'usuario', 'ciudad', 'pais', 'producto', 'tipo_moneda'],
+         'saldo_por_moneda.csv'),
+    Nodo('top_clientes_transacciones', top_clientes_transacciones,
+         ['transaccion', 'cuenta', 'usuario'], 'top_clientes.csv',
+         por_fecha=True),
+    Nodo('cuotas_pendientes', cuotas_pendientes,
+         ['cuota', 'prestamo', 'usuario'], 'cuotas_pendientes.csv'),
+    Nodo('crear_vista', crear_vista, [], siempre=True),
+    Nodo('ver_resumen', ver_resumen,
+         ['usuario', 'cuenta', 'prestamo'], 'resumen_cliente.csv',
+         dependencias=['crear_vista']),
+]
+
+
+class Planificador:
+    """Ejecuta un DAG de reportes con omisión por huella sin cambios.
+
+    Las huellas de la última corrida exitosa se guardan en
+    `.planificador_estado.json` y el historial en `historial_reportes.jsonl`,
+    ambos junto a este módulo salvo que se indique otra carpeta.
+    """
+
+    def __init__(self, nodos: List[Nodo] = None, max_paralelo: int = 4,
+                 carpeta: Optional[str] = None):
+        self.nodos: Dict[str, Nodo] = {n.nombre: n for n in (nodos or NODOS_REPORTES)}
+        self.max_paralelo = max_paralelo
+        self.carpeta = carpeta or os.path.dirname(os.path.abspath(__file__))
+        self.ruta_estado = os.path.join(self.carpeta, '.planificador_estado.json')
+        self.ruta_historial = os.path.join(self.carpeta, 'historial_reportes.jsonl')
+        self._validar()
+
+    def _validar(self) -> None:
+        """Verifica que las dependencias existan y que no haya ciclos.
+
+        Raises:
+            ValueError: Si una dependencia no existe o el grafo tiene ciclos
+        """
+        for nodo in self.nodos.values():
+            for dep in nodo.dependencias:
+                if dep not in self.nodos:
+                    raise ValueError(f"Dependencia desconocida: {nodo.nombre} → {dep}")
+        visitados, en_curso = set(), set()
+
+        def visitar(nombre: str) -> None:
+            if nombre in en_curso:
+                raise ValueError(f"Ciclo de dependencias en {nombre}")
+            if nombre in visitados:
+                return
+            en_curso.add(nombre)
+            for dep in self.nodos[nombre].dependencias:
+                visitar(dep)
+            en_curso.discard(nombre)
+            visitados.add(nombre)
+
+        for nombre in self.nodos:
+            visitar(nombre)
+
+    def _cargar_estado(self) -> Dict[str, str]:
+        """Lee las huellas de la última corrida exitosa de cada nodo."""
+        if not os.path.exists(self.ruta_estado):
+            return {}
+        with open(self.ruta_estado, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _guardar_estado(self, estado: Dict[str, str]) -> None:
+        """Persiste las huellas de forma atómica."""
+        temporal = self.ruta_estado + '.tmp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(estado, f, indent=2)
+        os.replace(temporal, self.ruta_estado)
+
+    def _registrar(self, entrada: Dict) -> None:
+        """Agrega una ejecución al historial."""
+        with open(self.ruta_historial, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entrada, ensure_ascii=False) + '\n')
+
+    @staticmethod
+    def _checksums(tablas: List[str], host: str = None, port: int = None,
+                   user: str = None, password: str = None,
+                   database: str = None) -> Dict[str, str]:
+        """Obtiene la huella de cada tabla.
+
+        CHECKSUM TABLE (una sola sentencia) para las tablas comunes; para las
+        de TABLAS_SOLO_INSERCION, MIN/MAX del id (que se resuelven con el
+        índice) y las particiones actuales.
+        """
+        if not tablas:
+            return {}
+        conn = get_connection(host, port, user, password, database)
+        cursor = conn.cursor()
+        try:
+            sumas: Dict[str, str] = {}
+            comunes = sorted(t for t in tablas if t not in TABLAS_SOLO_INSERCION)
+            if comunes:
+                cursor.execute(f"CHECKSUM TABLE {', '.join(comunes)}")
+                sumas.update({nombre.split('.')[-1]: str(suma)
+                              for nombre, suma in cursor.fetchall()})
+            for tabla in sorted(set(tablas) & set(TABLAS_SOLO_INSERCION)):
+                columna_id = TABLAS_SOLO_INSERCION[tabla]
+                cursor.execute(f"SELECT MIN({columna_id}), MAX({columna_id}) FROM {tabla}")
+                minimo, maximo = cursor.fetchone()
+                cursor.execute("""
+                    SELECT COALESCE(GROUP_CONCAT(partition_name ORDER BY partition_ordinal_position), '')
+                    FROM information_schema.partitions
+                    WHERE table_schema = DATABASE() AND table_name = %s
+                """, (tabla,))
+                (particiones,) = cursor.fetchone()
+                sumas[tabla] = f"{minimo}-{maximo}-{particiones}"
+            return sumas
+        finally:
+            cursor.close()
+            conn.close()
+
+    def _huella(self, nodo: Nodo, checksums: Dict[str, str]) -> str:
+        """Combina los checksums de las tablas de entrada en una huella."""
+        partes = [f"{t}={checksums.get(t)}" for t in sorted(nodo.tablas)]
+        if nodo.por_fecha:
+            partes.append(f"fecha={dt.date.today().isoformat()}")
+        return hashlib.sha256('|'.join(partes).encode('utf-8')).hexdigest()
+
+    def _csv_existe(self, nodo: Nodo) -> bool:
+        """Indica si el CSV previo del nodo sigue disponible."""
+        if nodo.csv is None:
+            return True
+        here = os.path.dirname(os.path.abspath(__file__))
+        return os.path.exists(ruta_salida(os.path.join(here, nodo.csv)))
+
+    def _ejecutar_nodo(self, nodo: Nodo) -> Dict:
+        """Ejecuta un nodo y retorna su entrada de historial."""
+        comienzo = dt.datetime.now().isoformat(timespec='seconds')
+        inicio = time.perf_counter()
+        try:
+            resultado = nodo.funcion()
+        except Exception as e:
+            print(f"❌ Error en {nodo.nombre}: {e}")
+            return {'reporte': nodo.nombre, 'estado': 'fallido', 'filas': None,
+                    'duracion_s': round(time.perf_counter() - inicio, 4),
+                    'inicio': comienzo}
+        duracion = time.perf_counter() - inicio
+        if resultado is False:
+            estado = 'fallido'
+        elif getattr(resultado, 'obsoleto', False):
+            # Excedió su presupuesto de latencia (presupuestos.py)
+            estado = 'excedido'
+        elif resultado == []:
+            # Las funciones de consultas.py retornan [] también ante errores:
+            # no se guarda la huella para reintentar en la próxima corrida.
+            estado = 'vacío'
+        else:
+            estado = 'ejecutado'
+        return {
+            'reporte': nodo.nombre,
+            'estado': estado,
+            'filas': len(resultado) if isinstance(resultado, list) else None,
+            'duracion_s': round(duracion, 4),
+            'inicio': comienzo,
+        }
+
+    def ejecutar(self, forzar: bool = False, host: str = None, port: int = None,
+                 user: str = None, password: str = None,
+                 database: str = None) -> List[Dict]:
+        """Ejecuta el DAG completo.
+
+        Args:
+            forzar: Ejecutar todos los nodos aunque sus huellas no cambien
+            host: Servidor MySQL para las huellas (opcional)
+            port: Puerto MySQL (opcional)
+            user: Usuario MySQL (opcional)
+            password: Contraseña MySQL (opcional)
+            database: Base de datos (opcional)
+
+        Returns:
+            List[Dict]: Entradas de historial de esta corrida, con las claves
+                'reporte', 'estado' ('ejecutado', 'omitido', 'vacío', 'excedido',
+                'fallido' o 'bloqueado'), 'filas', 'duracion_s' e 'inicio'
+        """
+        estado = self._cargar_estado()
+        tablas = {t for nodo in self.nodos.values() for t in nodo.tablas}
+        checksums = self._checksums(list(tablas), host, port, user, password, database)
+        huellas = {n: self._huella(nodo, checksums) for n, nodo in self.nodos.items()}
+
+        pendientes = dict(self.nodos)
+        terminados: Dict[str, str] = {}
+        corrida: List[Dict] = []
+
+        def cerrar(entrada: Dict) -> None:
+            # Los nodos omitidos o bloqueados "empiezan" al decidirse
+            entrada.setdefault('inicio', dt.datetime.now().isoformat(timespec='seconds'))
+            terminados[entrada['reporte']] = entrada['estado']
+            corrida.append(entrada)
+            self._registrar(entrada)
+            if entrada['estado'] == 'ejecutado':
+                estado[entrada['reporte']] = huellas[entrada['reporte']]
+            elif entrada['estado'] in ('fallido', 'vacío', 'excedido'):
+                estado.pop(entrada['reporte'], None)
+
+        with ThreadPoolExecutor(max_workers=self.max_paralelo) as executor:
+            en_curso = {}
+            while pendientes or en_curso:
+                for nombre, nodo in list(pendientes.items()):
+                    deps = [terminados.get(d) for d in nodo.dependencias]
+                    if any(d in ('fallido', 'bloqueado') for d in deps):
+                        del pendientes[nombre]
+                        cerrar({'reporte': nombre, 'estado': 'bloqueado',
+                                'filas': None, 'duracion_s': 0.0})
+                        continue
+                    if any(d is None for d in deps):
+                        continue
+                    del pendientes[nombre]
+                    sin_cambios = (not forzar and not nodo.siempre
+                                   and estado.get(nombre) == huellas[nombre]
+                                   and self._csv_existe(nodo))
+                    if sin_cambios:
+                        cerrar({'reporte': nombre, 'estado': 'omitido',
+                                'filas': None, 'duracion_s': 0.0})
+                    else:
+                        en_curso[executor.submit(self._ejecutar_nodo, nodo)] = nombre
+
+                if not en_curso:
+                    continue
+                listos, _ = wait(en_curso, return_when=FIRST_COMPLETED)
+                for futuro in listos:
+                    nombre = en_curso.pop(futuro)
+                    try:
+                        cerrar(futuro.result())
+                    except Exception as e:
+                        print(f"❌ Error en {nombre}: {e}")
+                        cerrar({'reporte': nombre, 'estado': 'fallido',
+                                'filas': None, 'duracion_s': 0.0})
+
+        self._guardar_estado(estado)
+        return corrida
+
+    def estadisticas(self) -> List[Dict[str, str]]:
+        """Resume el historial de ejecuciones por reporte.
+
+        Returns:
+            List[Dict[str, str]]: Lista de diccionarios con las claves:
+                - 'Reporte': Nombre del nodo
+                - 'Ejecuciones': Corridas efectivas
+                - 'Omitidas': Corridas evitadas por huella sin cambios
+                - 'Duración Promedio': Segundos promedio por ejecución
+                - 'Duración Máxima': Segundos de la ejecución más lenta
+        """
+        if not os.path.exists(self.ruta_historial):
+            return []
+        acumulado: Dict[str, Dict] = {}
+        with open(self.ruta_historial, 'r', encoding='utf-8') as f:
+            for linea in f:
+                entrada = json.loads(linea)
+                datos = acumulado.setdefault(entrada['reporte'],
+                                             {'duraciones': [], 'omitidas': 0})
+                if entrada['estado'] == 'ejecutado':
+                    datos['duraciones'].append(entrada['duracion_s'])
+                elif entrada['estado'] == 'omitido':
+                    datos['omitidas'] += 1
+
+        result: List[Dict[str, str]] = []
+        for reporte, datos in sorted(acumulado.items()):
+            duraciones = datos['duraciones']
+            promedio = sum(duraciones) / len(duraciones) if duraciones else 0.0
+            result.append({
+                'Reporte': reporte,
+                'Ejecuciones': str(len(duraciones)),
+                'Omitidas': str(datos['omitidas']),
+                'Duración Promedio': f"{promedio:.3f}s",
+                'Duración Máxima': f"{max(duraciones, default=0.0):.3f}s"
+            })
+        return result
+
+
+def main():
+    """Ejecuta todos los reportes respetando dependencias y huellas."""
+    print("="*70)
+    print("  PLANIFICADOR DE REPORTES")
+    print("="*70)
+
+    planificador = Planificador()
+    try:
+        corrida = planificador.ejecutar()
+    except Exception as e:
+        print(f"❌ Error en el planificador: {e}")
+        return
+
+    print(f"\n{'Reporte':<30} {'Estado':<12} {'Filas':>8} {'Duración':>10}")
+    print("-"*70)
+    for entrada in corrida:
+        filas = '' if entrada['filas'] is None else str(entrada['filas'])
+        print(f"{entrada['reporte']:<30} {entrada['estado']:<12} "
+              f"{filas:>8} {entrada['duracion_s']:>9.3f}s")
+
+
+if __name__ == '__main__':
+    main()
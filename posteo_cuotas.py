@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+posteo_cuotas.py
+
+Posteo masivo de los pagos 'pago cuota' de Transaccion sobre las cuotas.
+
+Cada pago se imputa, en orden de fecha, a las cuotas impagas ('pendiente' o
+'vencida') más antiguas de los préstamos del cliente dueño de la cuenta
+origen que están en la misma moneda que esa cuenta (la de su producto). Un
+pago hecho desde una cuenta en otra moneda que la de los préstamos del
+cliente queda sin imputar: no hay conversión implícita. La imputación es por monto: un pago puede cubrir parte de una cuota y
+parte de la siguiente, y una cuota puede completarse con varios pagos. Cada
+imputación queda en pago_cuota_aplicado (id_transaccion, id_cuota,
+monto_aplicado, fecha_pago), de modo que una nueva corrida solo usa los
+restos no imputados de pagos y cuotas. La fecha del pago se copia a la
+imputación: el estado de las cuotas no depende de que la transacción siga en
+Transaccion (purga de particiones, archivo en frío).
+
+La imputación se resuelve por conjuntos: para un bloque de clientes se cargan
+dos tablas temporales con los restos de pagos y de cuotas y sus sumas
+acumuladas por cliente y moneda (SUM() OVER). Cada pago ocupa el intervalo
+(desde, hasta] de su acumulado y cada cuota el suyo; el monto imputado es la
+intersección de ambos intervalos, y todas las imputaciones del bloque se
+insertan con un solo INSERT ... SELECT. Después, un UPDATE ... JOIN marca como
+'pagada' las cuotas cubiertas (fecha_pago = fecha del último pago imputado) y
+otro marca como 'pagado' los préstamos sin cuotas impagas. Cada bloque es una
+transacción que empieza bloqueando (SELECT ... FOR UPDATE) las cuotas impagas
+de sus clientes: dos corridas simultáneas sobre los mismos clientes se
+serializan y la segunda ve las imputaciones de la primera, en lugar de
+imputar dos veces los mismos pagos.
+"""
+from typing import Dict, Optional
+import random
+import time
+from database import get_connection
+
+
+# Errores de MySQL que abortan el bloque y justifican reintentarlo
+ERRORES_REINTENTABLES = {1205, 1213}  # lock wait timeout, deadlock
+
+
+CREAR_TABLA_APLICADO = """
+    CREATE TABLE IF NOT EXISTS pago_cuota_aplicado (
+        id_transaccion INT NOT NULL,
+        id_cuota INT NOT NULL,
+        monto_aplicado DECIMAL(15, 2) NOT NULL,
+        fecha_pago DATETIME NULL,
+        PRIMARY KEY (id_transaccion, id_cuota),
+        KEY idx_pago_cuota_aplicado_cuota (id_cuota)
+    )
+"""
+
+BLOQUEAR_CUOTAS = """
+    SELECT c.id_cuota
+    FROM prestamo p
+    JOIN cuota c ON c.id_prestamo = p.id_prestamo
+    WHERE p.id_usuario BETWEEN %s AND %s
+      AND c.estado IN ('pendiente', 'vencida')
+    FOR UPDATE
+"""
+
+CARGAR_PAGOS = """
+    CREATE TEMPORARY TABLE tmp_pago (
+        KEY (id_usuario, id_moneda, desde)
+    ) AS
+    SELECT id_transaccion, id_usuario, id_moneda, fecha,
+           SUM(resto) OVER w - resto AS desde,
+           SUM(resto) OVER w AS hasta
+    FROM (
+        SELECT t.id_transaccion, cu.id_usuario, pr.id_moneda, t.fecha,
+               t.monto - COALESCE((SELECT SUM(a.monto_aplicado)
+                                   FROM pago_cuota_aplicado a
+                                   WHERE a.id_transaccion = t.id_transaccion), 0) AS resto
+        FROM transaccion t
+        JOIN cuenta cu ON cu.id_cuenta = t.id_cuenta_origen
+        JOIN producto pr ON pr.id_producto = cu.id_producto
+        WHERE t.tipo = 'pago cuota'
+          AND cu.id_usuario BETWEEN %s AND %s
+          AND t.fecha >= %s
+    ) p
+    WHERE resto > 0
+    WINDOW w AS (PARTITION BY id_usuario, id_moneda ORDER BY fecha, id_transaccion)
+"""
+
+CARGAR_CUOTAS = """
+    CREATE TEMPORARY TABLE tmp_cuota (
+        KEY (id_usuario, id_moneda, desde)
+    ) AS
+    SELECT id_cuota, id_usuario, id_moneda, monto,
+           SUM(resto) OVER w - resto AS desde,
+           SUM(resto) OVER w AS hasta
+    FROM (
+        SELECT c.id_cuota, p.id_usuario, p.id_moneda, c.monto, c.fecha_vencimiento,
+               c.monto - COALESCE((SELECT SUM(a.monto_aplicado)
+                                   FROM pago_cuota_aplicado a
+                                   WHERE a.id_cuota = c.id_cuota), 0) AS resto
+        FROM cuota c
+        JOIN prestamo p ON p.id_prestamo = c.id_prestamo
+        WHERE c.estado IN ('pendiente', 'vencida')
+          AND p.id_usuario BETWEEN %s AND %s
+    ) q
+    WHERE resto > 0
+    WINDOW w AS (PARTITION BY id_usuario, id_moneda ORDER BY fecha_vencimiento, id_cuota)
+"""
+
+IMPUTAR = """
+    INSERT INTO pago_cuota_aplicado (id_transaccion, id_cuota, monto_aplicado, fecha_pago)
+    SELECT tp.id_transaccion, tc.id_cuota,
+           LEAST(tp.hasta, tc.hasta) - GREATEST(tp.desde, tc.desde),
+           tp.fecha
+    FROM tmp_pago tp
+    JOIN tmp_cuota tc
+      ON tc.id_usuario = tp.id_usuario
+     AND tc.id_moneda = tp.id_moneda
+     AND tc.desde < tp.hasta
+     AND tp.desde < tc.hasta
+    ON DUPLICATE KEY UPDATE monto_aplicado = monto_aplicado + VALUES(monto_aplicado),
+                            fecha_pago = VALUES(fecha_pago)
+"""
+
+MARCAR_CUOTAS = """
+    UPDATE cuota c
+    JOIN (
+        SELECT a.id_cuota, SUM(a.monto_aplicado) AS aplicado, MAX(a.fecha_pago) AS ultimo_pago
+        FROM tmp_cuota tc
+        JOIN pago_cuota_aplicado a ON a.id_cuota = tc.id_cuota
+        GROUP BY a.id_cuota
+    ) x ON x.id_cuota = c.id_cuota
+    SET c.estado = 'pagada', c.fecha_pago = DATE(x.ultimo_pago)
+    WHERE x.aplicado >= c.monto
+"""
+
+CANCELAR_PRESTAMOS = """
+    UPDATE prestamo p
+    SET p.estado = 'pagado'
+    WHERE p.id_usuario BETWEEN %s AND %s
+      AND p.estado <> 'pagado'
+      AND EXISTS (SELECT 1 FROM cuota c WHERE c.id_prestamo = p.id_prestamo)
+      AND NOT EXISTS (SELECT 1 FROM cuota c
+                      WHERE c.id_prestamo = p.id_prestamo AND c.estado <> 'pagada')
+"""
+
+
+def _preparar_aplicado(cursor) -> None:
+    """Crea pago_cuota_aplicado o le agrega fecha_pago si es de una versión previa.
+
+    Al agregar la columna se completa una sola vez desde Transaccion; las
+    imputaciones cuyo pago ya no está ahí quedan con fecha_pago NULL.
+    """
+    cursor.execute(CREAR_TABLA_APLICADO)
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE()
+          AND TABLE_NAME = 'pago_cuota_aplicado'
+          AND COLUMN_NAME = 'fecha_pago'
+    """)
+    if cursor.fetchone()[0]:
+        return
+    cursor.execute("ALTER TABLE pago_cuota_aplicado ADD COLUMN fecha_pago DATETIME NULL")
+    cursor.execute("""
+        UPDATE pago_cuota_aplicado a
+        JOIN transaccion t ON t.id_transaccion = a.id_transaccion
+        SET a.fecha_pago = t.fecha
+    """)
+
+
+def _postear_bloque(cursor, desde_usuario: int, hasta_usuario: int,
+                    desde_fecha: str) -> Dict[str, int]:
+    """Imputa los pagos de un bloque de clientes (sin COMMIT).
+
+    Debe ser la primera sentencia de su transacción: el bloqueo de las cuotas
+    va antes de la primera lectura, así la foto de las tablas temporales
+    incluye lo que haya confirmado otra corrida sobre los mismos clientes.
+    """
+    try:
+        cursor.execute(BLOQUEAR_CUOTAS, (desde_usuario, hasta_usuario))
+        cursor.fetchall()
+        cursor.execute(CARGAR_PAGOS, (desde_usuario, hasta_usuario, desde_fecha))
+        pagos = cursor.rowcount
+        cursor.execute(CARGAR_CUOTAS, (desde_usuario, hasta_usuario))
+        cursor.execute(IMPUTAR)
+        imputaciones = cursor.rowcount
+        cursor.execute(MARCAR_CUOTAS)
+        cuotas = cursor.rowcount
+        cursor.execute(CANCELAR_PRESTAMOS, (desde_usuario, hasta_usuario))
+        prestamos = cursor.rowcount
+    finally:
+        cursor.execute("DROP TEMPORARY TABLE IF EXISTS tmp_pago, tmp_cuota")
+    return {'Pagos': max(pagos, 0), 'Imputaciones': max(imputaciones, 0),
+            'Cuotas Pagadas': cuotas, 'Préstamos Cancelados': prestamos}
+
+
+def postear_pagos_cuotas(tam_bloque: int = 1_000, desde_fecha: str = '1900-01-01',
+                         reintentos: int = 3, host: str = None, port: int = None,
+                         user: str = None, password: str = None,
+                         database: str = None) -> Optional[Dict]:
+    """Imputa los pagos 'pago cuota' pendientes de imputar a las cuotas impagas.
+
+    Se puede correr en paralelo con otras instancias: cada bloque bloquea las
+    cuotas de sus clientes y un bloque abortado por deadlock o timeout de
+    bloqueo se reintenta.
+
+    Args:
+        tam_bloque: Clientes (rango de id_usuario) por transacción
+        desde_fecha: Ignora los pagos anteriores a esta fecha 'YYYY-MM-DD'
+        reintentos: Reintentos de un bloque abortado por deadlock o timeout
+        host: Servidor MySQL (opcional)
+        port: Puerto MySQL (opcional)
+        user: Usuario MySQL (opcional)
+        password: Contraseña MySQL (opcional)
+        database: Base de datos (opcional)
+
+    Returns:
+        Optional[Dict]: Diccionario con 'Bloques', 'Pagos' (con resto por
+            imputar), 'Imputaciones', 'Cuotas Pagadas', 'Préstamos
+            Cancelados', 'Segundos' y 'Cuotas/s', o None si hubo un error.
+            Los bloques confirmados antes del error quedan aplicados.
+
+    Ejemplo:
+        >>> r = postear_pagos_cuotas()
+        >>> r['Cuotas Pagadas'], r['Préstamos Cancelados']
+        (412, 9)
+    """
+    resumen = {'Bloques': 0, 'Pagos': 0, 'Imputaciones': 0,
+               'Cuotas Pagadas': 0, 'Préstamos Cancelados': 0}
+    inicio = time.perf_counter()
+    try:
+        conn = get_connection(host, port, user, password, database)
+        cursor = conn.cursor()
+        _preparar_aplicado(cursor)
+        cursor.execute("SELECT MIN(id_usuario), MAX(id_usuario) FROM usuario")
+        minimo, maximo = cursor.fetchone()
+        conn.commit()
+
+        if minimo is not None:
+            for desde_usuario in range(minimo, maximo + 1, tam_bloque):
+                hasta_usuario = min(desde_usuario + tam_bloque - 1, maximo)
+                for intento in range(reintentos + 1):
+                    try:
+                        bloque = _postear_bloque(cursor, desde_usuario, hasta_usuario,
+                                                 desde_fecha)
+                        conn.commit()
+                        break
+                    except Exception as e:
+                        conn.rollback()
+                        if getattr(e, 'errno', None) not in ERRORES_REINTENTABLES \
+                                or intento == reintentos:
+                            raise
+                        time.sleep(random.uniform(0, 0.05 * 2 ** intento))
+                for clave, valor in bloque.items():
+                    resumen[clave] += valor
+                resumen['Bloques'] += 1
+
+        cursor.close()
+        conn.close()
+
+    except Exception as e:
+        print(f"❌ Error en postear_pagos_cuotas: {e}")
+        return None
+
+    segundos = time.perf_counter() - inicio
+    resumen['Segundos'] = round(segundos, 3)
+    resumen['Cuotas/s'] = round(resumen['Cuotas Pagadas'] / segundos, 1)
+    return resumen
+
+
+def main():
+    """Imputa los pagos pendientes y muestra el rendimiento."""
+    print("="*70)
+    print("  POSTEO DE PAGOS DE CUOTAS")
+    print("="*70)
+
+    r = postear_pagos_cuotas()
+    if r is None:
+        return
+
+    print(f"\n🧾 Pagos con saldo por imputar: {r['Pagos']}")
+    print(f"🔗 Imputaciones: {r['Imputaciones']}")
+    print(f"✅ Cuotas pagadas: {r['Cuotas Pagadas']}")
+    print(f"🏦 Préstamos cancelados: {r['Préstamos Cancelados']}")
+    print(f"⏱️  {r['Bloques']} bloques en {r['Segundos']} s "
+          f"({r['Cuotas/s']} cuotas/s)")
+
+
+if __name__ == '__main__':
+    main()
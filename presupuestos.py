@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+presupuestos.py
+
+Presupuestos de latencia por reporte.
+
+Un reporte decorado con @con_presupuesto corre en un hilo de trabajo con un
+plazo. Mientras corre, cada conexión que abre fija MAX_EXECUTION_TIME con el
+tiempo restante (ver database.limite_consulta) y no se abren conexiones nuevas
+una vez vencido el plazo; el código de larga duración puede además consultar
+cancelado() para cortar antes.
+
+Si el plazo vence, quien llamó recibe el último resultado bueno marcado como
+obsoleto (ResultadoObsoleto): primero el guardado en memoria y, si no hay,
+el último CSV generado por el reporte. Ambos respaldos son por base de datos
+(host, port, database): el CSV solo se usa si lo generó una corrida contra
+la misma base en este proceso o, si ninguna lo generó todavía, cuando se
+pide la base por defecto de get_db_config(). En memoria se guardan a lo sumo
+MAX_ULTIMOS resultados (los de uso menos reciente se descartan primero).
+Cada exceso se registra en presupuestos_excedidos.jsonl junto con la
+duración real si la consulta termina más tarde, para poder ajustar los
+presupuestos.
+
+El hilo de un reporte abandonado sigue corriendo hasta que sus consultas
+terminan; abandonado() le indica que ya nadie espera su resultado, y los
+reportes lo consultan para no imprimir errores sobre el menú.
+
+Los presupuestos por defecto están en PRESUPUESTOS y se pueden cambiar con
+variables de entorno PRESUPUESTO_<REPORTE> en segundos, por ejemplo
+PRESUPUESTO_TOP_CLIENTES_TRANSACCIONES=60.
+"""
+from typing import Callable, Dict, List, Optional, Union
+from collections import OrderedDict
+import contextvars
+import datetime as dt
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from database import destino_conexion, get_db_config, limite_consulta
+from salida import leer_csv, ruta_salida
+
+
+PRESUPUESTOS: Dict[str, float] = {
+    'clientes_por_ubicacion': 10.0,
+    'saldo_por_moneda': 10.0,
+    'prestamos_activos': 5.0,
+    'top_clientes_transacciones': 30.0,
+    'cuotas_pendientes': 15.0,
+    'ver_resumen': 15.0,
+}
+PRESUPUESTO_DEFAULT = 30.0
+MAX_ULTIMOS = 64  # resultados buenos guardados en memoria (LRU)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+HISTORIAL_EXCEDIDOS = os.path.join(HERE, 'presupuestos_excedidos.jsonl')
+
+
+class ResultadoObsoleto(list):
+    """Último resultado bueno de un reporte que excedió su presupuesto.
+
+    Attributes:
+        obsoleto: Siempre True (los resultados frescos son listas comunes)
+        generado: Momento en que se obtuvo el resultado (None si no había)
+        origen: 'memoria', 'csv' o 'ninguno'
+        archivo: CSV del último resultado bueno, si se conoce
+    """
+    obsoleto = True
+
+    def __init__(self, filas: List, generado: Optional[dt.datetime], origen: str,
+                 archivo: Optional[str] = None):
+        super().__init__(filas)
+        self.generado = generado
+        self.origen = origen
+        self.archivo = archivo
+
+
+_ultimos: 'OrderedDict[tuple, tuple]' = OrderedDict()
+_destino_csv: Dict[str, tuple] = {}  # ruta → destino de la última corrida buena
+_lock = threading.Lock()
+# Event del hilo de trabajo actual: se activa cuando quien llamó deja de esperar
+_abandono: contextvars.ContextVar = contextvars.ContextVar('abandono', default=None)
+
+
+def presupuesto_de(nombre: str) -> float:
+    """Retorna el presupuesto en segundos de un reporte."""
+    valor = os.getenv(f"PRESUPUESTO_{nombre.upper()}")
+    if valor:
+        return float(valor)
+    return PRESUPUESTOS.get(nombre, PRESUPUESTO_DEFAULT)
+
+
+def cancelado() -> bool:
+    """Indica si el presupuesto del reporte en curso ya venció."""
+    limite = limite_consulta.get()
+    return limite is not None and time.monotonic() >= limite
+
+
+def abandonado() -> bool:
+    """Indica si el reporte en curso excedió su presupuesto y nadie espera ya su resultado."""
+    evento = _abandono.get()
+    return evento is not None and evento.is_set()
+
+
+def _destino(funcion: Callable, args: tuple, kwargs: Dict) -> tuple:
+    """Destino (host, port, database) al que apunta una llamada a un reporte."""
+    try:
+        parametros = inspect.signature(funcion).bind_partial(*args, **kwargs).arguments
+    except TypeError:
+        parametros = kwargs
+    return destino_conexion(parametros.get('host'), parametros.get('port'),
+                            parametros.get('database'))
+
+
+def _ruta_csv(csv: Union[str, Callable], args: tuple, kwargs: Dict) -> str:
+    """Ruta real del CSV de respaldo de una llamada."""
+    nombre_csv = csv(*args, **kwargs) if callable(csv) else csv
+    return ruta_salida(os.path.join(HERE, nombre_csv))
+
+
+def _registrar(evento: Dict) -> None:
+    """Agrega un evento al historial de excesos."""
+    evento = {'fecha': dt.datetime.now().isoformat(timespec='seconds'), **evento}
+    with _lock:
+        with open(HISTORIAL_EXCEDIDOS, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(evento, ensure_ascii=False) + '\n')
+
+
+def _respaldo(clave: tuple, destino: tuple, csv: Union[str, Callable, None],
+              args: tuple, kwargs: Dict) -> ResultadoObsoleto:
+    """Busca el último resultado bueno en memoria o en el último CSV del mismo destino."""
+    with _lock:
+        guardado = _ultimos.get(clave)
+        if guardado is not None:
+            _ultimos.move_to_end(clave)
+    if guardado is not None:
+        generado, filas = guardado
+        return ResultadoObsoleto(filas, generado, 'memoria',
+                                 getattr(filas, 'archivo', None))
+    if csv is not None:
+        ruta = _ruta_csv(csv, args, kwargs)
+        # Sin corridas en este proceso, el CSV en disco se asume de la base por defecto
+        config = get_db_config()
+        generado_para = _destino_csv.get(
+            ruta, (config['host'], config['port'], config['database']))
+        if generado_para == destino and os.path.exists(ruta):
+            try:
+                generado = dt.datetime.fromtimestamp(os.path.getmtime(ruta))
+                return ResultadoObsoleto(leer_csv(ruta), generado, 'csv', ruta)
+            except Exception as e:
+                print(f"⚠️  No se pudo leer el respaldo {ruta}: {e}")
+    return ResultadoObsoleto([], None, 'ninguno')
+
+
+def con_presupuesto(nombre: str, csv: Union[str, Callable, None] = None):
+    """Decorador que aplica el presupuesto de latencia de un reporte.
+
+    Args:
+        nombre: Nombre del reporte (clave de PRESUPUESTOS)
+        csv: CSV que genera el reporte, o función que lo calcula a partir de
+            los argumentos del reporte; se usa como respaldo si no hay un
+            resultado en memoria
+
+    Ejemplo:
+        >>> @con_presupuesto('cuotas_pendientes', 'cuotas_pendientes.csv')
+        ... def cuotas_pendientes(...): ...
+        >>> r = cuotas_pendientes()
+        >>> getattr(r, 'obsoleto', False)
+        False
+    """
+    def decorador(funcion: Callable) -> Callable:
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            segundos = presupuesto_de(nombre)
+            destino = _destino(funcion, args, kwargs)
+            clave = (nombre, destino, args, tuple(sorted(kwargs.items())))
+            limite = time.monotonic() + segundos
+            externo = limite_consulta.get()
+            if externo is not None:
+                limite = min(limite, externo)
+
+            terminado = threading.Event()
+            salida: Dict = {}
+            excedido = threading.Event()
+
+            def trabajar():
+                inicio = time.perf_counter()
+                limite_consulta.set(limite)
+                _abandono.set(excedido)
+                try:
+                    resultado = funcion(*args, **kwargs)
+                except BaseException as e:
+                    salida['error'] = e
+                    terminado.set()
+                    return
+                if resultado is not None and resultado is not False and resultado != []:
+                    ruta = _ruta_csv(csv, args, kwargs) if csv is not None else None
+                    with _lock:
+                        _ultimos[clave] = (dt.datetime.now(), resultado)
+                        _ultimos.move_to_end(clave)
+                        while len(_ultimos) > MAX_ULTIMOS:
+                            _ultimos.popitem(last=False)
+                        if ruta is not None:
+                            _destino_csv[ruta] = destino
+                salida['resultado'] = resultado
+                terminado.set()
+                if excedido.is_set():
+                    _registrar({'reporte': nombre, 'evento': 'completado_tarde',
+                                'duracion_s': round(time.perf_counter() - inicio, 3)})
+
+            contexto = contextvars.copy_context()
+            threading.Thread(target=contexto.run, args=(trabajar,),
+                             name=f'presupuesto-{nombre}', daemon=True).start()
+
+            if terminado.wait(max(limite - time.monotonic(), 0)):
+                if 'error' in salida:
+                    raise salida['error']
+                return salida['resultado']
+
+            excedido.set()
+            if terminado.is_set() and 'resultado' in salida:
+                return salida['resultado']
+            respaldo = _respaldo(clave, destino, csv, args, kwargs)
+            print(f"⏱️  {nombre} excedió su presupuesto de {segundos:g}s; "
+                  f"se usa el último resultado ({respaldo.origen})")
+            _registrar({'reporte': nombre, 'evento': 'excedido',
+                        'presupuesto_s': segundos, 'respaldo': respaldo.origen})
+            return respaldo
+        return envoltura
+    return decorador
+
+
+def estadisticas_presupuestos() -> List[Dict]:
+    """Resume el historial de excesos por reporte.
+
+    Returns:
+        List[Dict]: Diccionarios con 'Reporte', 'Presupuesto (s)', 'Excesos',
+            'Completados Tarde' y 'Duración Máxima (s)'
+    """
+    resumen: Dict[str, Dict] = {}
+    if os.path.exists(HISTORIAL_EXCEDIDOS):
+        with open(HISTORIAL_EXCEDIDOS, encoding='utf-8') as f:
+            for linea in f:
+                evento = json.loads(linea)
+                r = resumen.setdefault(evento['reporte'], {
+                    'Reporte': evento['reporte'],
+                    'Presupuesto (s)': presupuesto_de(evento['reporte']),
+                    'Excesos': 0, 'Completados Tarde': 0, 'Duración Máxima (s)': None})
+                if evento['evento'] == 'excedido':
+                    r['Excesos'] += 1
+                else:
+                    r['Completados Tarde'] += 1
+                    r['Duración Máxima (s)'] = max(r['Duración Máxima (s)'] or 0,
+                                                   evento['duracion_s'])
+    return sorted(resumen.values(), key=lambda r: -r['Excesos'])
@@ -11,11 +11,11 @@ diccionarios y usa JOINs explícitos en la consulta. El script es
 completamente ejecutable por sí mismo.
 """
 from typing import List, Dict
-import csv
 import os
 import argparse
 import traceback
-import mysql.connector
+from salida import escribir_csv
+from demonio import ejecutar
 
 
 def clientes_por_ubicacion(host: str = None, port: int = None,
@@ -49,6 +49,8 @@ def clientes_por_ubicacion(host: str = None, port: int = None,
     database = database or os.getenv('MYSQL_DB', 'bancos')
 
     try:
+        # Importación diferida: si responde el demonio no hace falta el conector
+        import mysql.connector
         conn = mysql.connector.connect(host=host, port=port, user=user,
                                        password=password, database=database)
     except Exception as e:
@@ -116,18 +118,12 @@ def clientes_por_ubicacion(host: str = None, port: int = None,
         return []
 
 
-def _write_csv(data: List[Dict[str, str]], output_path: str) -> None:
+def _write_csv(data: List[Dict[str, str]], output_path: str) -> str:
     """Escribe la lista de diccionarios en un CSV con encabezado Cliente, Ciudad, País.
     Usa UTF-8-sig para compatibilidad con Excel (BOM).
     """
     fieldnames = ['Cliente', 'Ciudad', 'País']
-    # Ensure output directory exists
-    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
-    with open(output_path, 'w', encoding='utf-8-sig', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        for row in data:
-            writer.writerow(row)
+    return escribir_csv(data, output_path, fieldnames)
 
 
 def main():
@@ -145,16 +141,24 @@ def main():
     out_file = os.path.join(here, 'clientes_ubicacion.csv')
 
     print("🔎 Ejecutando consulta de clientes por ubicación...")
-    data = clientes_por_ubicacion(host=args.host, port=args.port, user=args.user,
-                                  password=args.password, database=args.database,
-                                  verbose=args.verbose)
+    local = any((args.host, args.port, args.user, args.password, args.database, args.verbose))
+    if local:
+        data = clientes_por_ubicacion(host=args.host, port=args.port, user=args.user,
+                                      password=args.password, database=args.database,
+                                      verbose=args.verbose)
+    else:
+        data = ejecutar('clientes_por_ubicacion')
     if not data:
         print("⚠️  No se generaron datos (posible error de conexión o consulta).")
         if args.verbose:
             print("Sugerencias: revisar que el servidor MySQL esté en ejecución, las credenciales, y que la base 'bancos' exista con las tablas cargadas.")
         return
 
-    _write_csv(data, out_file)
+    # ejecutar() ya escribió el CSV (consultas.py); la función local no escribe
+    if local:
+        out_file = _write_csv(data, out_file)
+    else:
+        out_file = getattr(data, 'archivo', None) or out_file
     print(f"✅ Archivo generado: {out_file} ({len(data)} filas)")
 
 
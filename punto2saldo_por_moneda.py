@@ -11,9 +11,8 @@ con el total de saldos agrupados por moneda. La función está diseñada para
 ser importada fácilmente por otros módulos.
 """
 from typing import List, Dict
-import csv
 import os
-import mysql.connector
+from demonio import ejecutar
 
 
 def saldo_por_moneda(host: str = None, port: int = None,
@@ -71,6 +70,8 @@ def saldo_por_moneda(host: str = None, port: int = None,
     """
 
     try:
+        # Importación diferida: si responde el demonio no hace falta el conector
+        import mysql.connector
         conn = mysql.connector.connect(
             host=host,
             port=port,
@@ -121,22 +122,6 @@ def saldo_por_moneda(host: str = None, port: int = None,
         return []
 
 
-def _write_csv(data: List[Dict[str, str]], output_path: str) -> None:
-    """Escribe la lista de diccionarios en un CSV.
-    
-    Args:
-        data: Lista de diccionarios con las claves 'País', 'Moneda' y 'Saldo Total'
-        output_path: Ruta completa del archivo CSV a crear
-    """
-    fieldnames = ['País', 'Moneda', 'Saldo Total']
-    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
-    
-    with open(output_path, 'w', encoding='utf-8-sig', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        for row in data:
-            writer.writerow(row)
-
 
 def main():
     """Función principal que ejecuta el cálculo y guarda el resultado en CSV."""
@@ -144,13 +129,14 @@ def main():
     out_file = os.path.join(here, 'saldo_por_moneda.csv')
 
     print("🔎 Calculando saldo total por país y moneda...")
-    data = saldo_por_moneda()
+    data = ejecutar('saldo_por_moneda')
     
     if not data:
         print("⚠️  No se generaron datos (posible error de conexión o consulta).")
         return
 
-    _write_csv(data, out_file)
+    # consultas.py ya escribió el CSV al generar el reporte
+    out_file = getattr(data, 'archivo', None) or out_file
     print(f"✅ Archivo generado: {out_file}")
     print(f"\n📊 Resumen de saldos por país y moneda:")
     print("-" * 80)
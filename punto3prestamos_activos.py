@@ -10,9 +10,8 @@ Contiene la función prestamos_activos(dni: str) que valida la existencia del DN
 y retorna la información de los préstamos activos del cliente.
 """
 from typing import List, Dict, Optional
-import csv
 import os
-import mysql.connector
+from demonio import ejecutar
 
 
 def prestamos_activos(dni: str, host: str = None, port: int = None,
@@ -61,6 +60,8 @@ def prestamos_activos(dni: str, host: str = None, port: int = None,
     database = database or os.getenv('MYSQL_DB', 'bancos')
 
     try:
+        # Importación diferida: si responde el demonio no hace falta el conector
+        import mysql.connector
         conn = mysql.connector.connect(
             host=host,
             port=port,
@@ -144,23 +145,6 @@ def prestamos_activos(dni: str, host: str = None, port: int = None,
         return None
 
 
-def _write_csv(data: List[Dict[str, str]], output_path: str, cliente_info: str) -> None:
-    """Escribe la lista de diccionarios en un CSV.
-    
-    Args:
-        data: Lista de diccionarios con los préstamos activos
-        output_path: Ruta completa del archivo CSV a crear
-        cliente_info: Información del cliente para incluir como comentario
-    """
-    fieldnames = ['ID Préstamo', 'Monto Total', 'Tasa Interés', 'Fecha Inicio', 'Fecha Fin', 'Moneda']
-    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
-    
-    with open(output_path, 'w', encoding='utf-8-sig', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        for row in data:
-            writer.writerow(row)
-
 
 def main():
     """Función principal que solicita el DNI por consola y genera el reporte."""
@@ -178,7 +162,7 @@ def main():
     print(f"\n🔎 Buscando préstamos activos para DNI: {dni}...")
     
     # Consultar préstamos activos
-    prestamos = prestamos_activos(dni)
+    prestamos = ejecutar('prestamos_activos', dni)
     
     if prestamos is None:
         print(f"\n❌ Error: Cliente no encontrado")
@@ -188,11 +172,10 @@ def main():
         print(f"\n✅ Cliente encontrado, pero no tiene préstamos activos")
         return
     
-    # Generar archivo CSV
+    # consultas.py ya escribió el CSV al generar el reporte
     here = os.path.dirname(os.path.abspath(__file__))
-    out_file = os.path.join(here, f'prestamos_activos_{dni}.csv')
-    
-    _write_csv(prestamos, out_file, f"DNI: {dni}")
+    out_file = getattr(prestamos, 'archivo', None) or \
+        os.path.join(here, f'prestamos_activos_{dni}.csv')
     
     # Mostrar resultados
     print(f"\n✅ Se encontraron {len(prestamos)} préstamo(s) activo(s)")
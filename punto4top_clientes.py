@@ -10,10 +10,9 @@ Contiene la función top_clientes_transacciones() que calcula el ranking de clie
 según el volumen de dinero movido en transferencias y retiros.
 """
 from typing import List, Dict
-import csv
 import os
-import mysql.connector
 from datetime import datetime
+from demonio import ejecutar
 
 
 def top_clientes_transacciones(host: str = None, port: int = None,
@@ -51,6 +50,8 @@ def top_clientes_transacciones(host: str = None, port: int = None,
     database = database or os.getenv('MYSQL_DB', 'bancos')
 
     try:
+        # Importación diferida: si responde el demonio no hace falta el conector
+        import mysql.connector
         conn = mysql.connector.connect(
             host=host,
             port=port,
@@ -120,22 +121,6 @@ def top_clientes_transacciones(host: str = None, port: int = None,
         return []
 
 
-def _write_csv(data: List[Dict[str, str]], output_path: str) -> None:
-    """Escribe la lista de diccionarios en un CSV.
-    
-    Args:
-        data: Lista de diccionarios con el ranking de clientes
-        output_path: Ruta completa del archivo CSV a crear
-    """
-    fieldnames = ['Puesto', 'Cliente', 'Total Movido']
-    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
-    
-    with open(output_path, 'w', encoding='utf-8-sig', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        for row in data:
-            writer.writerow(row)
-
 
 def main():
     """Función principal que ejecuta el cálculo y guarda el resultado en CSV."""
@@ -149,13 +134,14 @@ def main():
     print("   • Tipos de transacción: transferencia, retiro")
     print("   • Periodo: Últimos 48 meses desde hoy")
     
-    data = top_clientes_transacciones()
+    data = ejecutar('top_clientes_transacciones')
     
     if not data:
         print("\n⚠️  No se generaron datos (posible error de conexión o consulta).")
         return
 
-    _write_csv(data, out_file)
+    # consultas.py ya escribió el CSV al generar el reporte
+    out_file = getattr(data, 'archivo', None) or out_file
     print(f"\n✅ Archivo generado: {out_file}")
     print(f"\n📊 TOP 5 CLIENTES MÁS ACTIVOS:")
     print("-"*70)
@@ -10,9 +10,8 @@ Contiene la función cuotas_pendientes() que agrupa por préstamo y cliente,
 calculando el total de cuotas pendientes y el monto total a pagar.
 """
 from typing import List, Dict
-import csv
 import os
-import mysql.connector
+from demonio import ejecutar
 
 
 def cuotas_pendientes(host: str = None, port: int = None,
@@ -51,6 +50,8 @@ def cuotas_pendientes(host: str = None, port: int = None,
     database = database or os.getenv('MYSQL_DB', 'bancos')
 
     try:
+        # Importación diferida: si responde el demonio no hace falta el conector
+        import mysql.connector
         conn = mysql.connector.connect(
             host=host,
             port=port,
@@ -118,22 +119,6 @@ def cuotas_pendientes(host: str = None, port: int = None,
         return []
 
 
-def _write_csv(data: List[Dict[str, str]], output_path: str) -> None:
-    """Escribe la lista de diccionarios en un CSV.
-    
-    Args:
-        data: Lista de diccionarios con el reporte de cuotas pendientes
-        output_path: Ruta completa del archivo CSV a crear
-    """
-    fieldnames = ['Préstamo', 'DNI Cliente', 'Cuotas Pendientes', 'Monto Total a Pagar']
-    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
-    
-    with open(output_path, 'w', encoding='utf-8-sig', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        for row in data:
-            writer.writerow(row)
-
 
 def main():
     """Función principal que ejecuta el cálculo y guarda el resultado en CSV."""
@@ -145,13 +130,14 @@ def main():
     print("="*70)
     print("\n🔎 Generando reporte de préstamos con cuotas pendientes...")
     
-    data = cuotas_pendientes()
+    data = ejecutar('cuotas_pendientes')
     
     if not data:
         print("\n⚠️  No se encontraron préstamos con cuotas pendientes.")
         return
 
-    _write_csv(data, out_file)
+    # consultas.py ya escribió el CSV al generar el reporte
+    out_file = getattr(data, 'archivo', None) or out_file
     print(f"\n✅ Archivo generado: {out_file}")
     print(f"   Total de préstamos con cuotas pendientes: {len(data)}")
     
@@ -11,9 +11,8 @@ Contiene las funciones:
 - ver_resumen(): Consulta la vista y genera resumen_cliente.csv
 """
 from typing import List, Dict, Optional
-import csv
 import os
-import mysql.connector
+from demonio import ejecutar
 
 
 def crear_vista(host: str = None, port: int = None,
@@ -51,6 +50,8 @@ def crear_vista(host: str = None, port: int = None,
     database = database or os.getenv('MYSQL_DB', 'bancos')
 
     try:
+        # Importación diferida: si responde el demonio no hace falta el conector
+        import mysql.connector
         conn = mysql.connector.connect(
             host=host,
             port=port,
@@ -139,6 +140,7 @@ def ver_resumen(host: str = None, port: int = None,
     database = database or os.getenv('MYSQL_DB', 'bancos')
 
     try:
+        import mysql.connector
         conn = mysql.connector.connect(
             host=host,
             port=port,
@@ -197,22 +199,6 @@ def ver_resumen(host: str = None, port: int = None,
         return []
 
 
-def _write_csv(data: List[Dict[str, str]], output_path: str) -> None:
-    """Escribe la lista de diccionarios en un CSV.
-    
-    Args:
-        data: Lista de diccionarios con el resumen de clientes
-        output_path: Ruta completa del archivo CSV a crear
-    """
-    fieldnames = ['Nombre Completo', 'Cantidad Cuentas', 'Cantidad Préstamos', 'Saldo Total']
-    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
-    
-    with open(output_path, 'w', encoding='utf-8-sig', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        for row in data:
-            writer.writerow(row)
-
 
 def main():
     """Función principal que crea la vista y genera el archivo CSV."""
@@ -225,7 +211,7 @@ def main():
     
     # Paso 1: Crear o reemplazar la vista
     print("\n🔧 Creando vista v_resumen_cliente...")
-    if not crear_vista():
+    if not ejecutar('crear_vista'):
         print("\n❌ Error: No se pudo crear la vista.")
         return
     
@@ -233,13 +219,14 @@ def main():
     
     # Paso 2: Consultar la vista y generar el CSV
     print("\n🔎 Consultando vista y generando reporte...")
-    data = ver_resumen()
+    data = ejecutar('ver_resumen')
     
     if not data:
         print("\n⚠️  No se encontraron registros en la vista.")
         return
 
-    _write_csv(data, out_file)
+    # consultas.py ya escribió el CSV al generar el reporte
+    out_file = getattr(data, 'archivo', None) or out_file
     print(f"\n✅ Archivo generado: {out_file}")
     print(f"   Total de clientes: {len(data)}")
     
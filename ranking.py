@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ranking.py
+
+Ranking completo de clientes por monto movido (transferencias y retiros en
+los últimos 48 meses, el mismo criterio que el Punto 4).
+
+El ranking se calcula una vez por refresco: una agregación por cliente en
+MySQL (más el archivo en frío si la ventana lo alcanza, ver archivo_frio.py)
+y un ordenamiento vectorizado con NumPy. Se guarda en arreglos paralelos
+ordenados por puesto (id_usuario, total en centavos, puesto) y en un índice
+id_usuario → posición ordenado por id, igual que indice_dni.py. Con eso:
+- top(n) es un slice de los arreglos,
+- puesto_de(id_usuario) es una búsqueda binaria (O(log n)),
+- umbral_percentil(p) es un acceso directo por posición,
+sin volver a la base hasta el siguiente refresco (cada `ttl` segundos).
+
+El puesto sigue la semántica de RANK(): los clientes con el mismo total
+comparten puesto y el siguiente salta (1, 2, 2, 4).
+"""
+from typing import Dict, List, Optional, Tuple
+from decimal import Decimal
+import datetime as dt
+import math
+import threading
+import time
+import numpy as np
+from database import destino_conexion, get_connection
+from archivo_frio import ventana_con_archivo, sumar_por_cuenta_origen
+from consultas import _write_csv, _restar_meses, MESES_VENTANA
+from indice_dni import obtener_indice_dni
+from salida import ResultadoError
+
+
+TIPOS = ('transferencia', 'retiro')
+
+
+def _monto(centavos) -> Decimal:
+    """Convierte centavos enteros en Decimal con dos decimales."""
+    return Decimal(int(centavos)).scaleb(-2)
+
+
+class RankingClientes:
+    """Ranking de clientes por monto movido, refrescado por TTL.
+
+    Attributes:
+        ttl: Segundos de validez del ranking
+        meses: Ventana de meses considerada
+        generado: Momento del último refresco (None si nunca se calculó)
+    """
+
+    def __init__(self, ttl: float = 300.0, meses: int = MESES_VENTANA):
+        self.ttl = ttl
+        self.meses = meses
+        self.generado: Optional[dt.datetime] = None
+        # (ids, totales, puestos, nombres, indice_ids, indice_pos) se reemplazan
+        # juntos para que las consultas concurrentes vean una sola versión.
+        self.arreglos: Tuple[np.ndarray, ...] = (
+            np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.int32), np.empty(0, dtype=object),
+            np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32))
+        self._refrescado = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.arreglos[0])
+
+    def refrescar(self, host: str = None, port: int = None,
+                  user: str = None, password: str = None,
+                  database: str = None) -> int:
+        """Recalcula el ranking completo.
+
+        Args:
+            host: Servidor MySQL (opcional)
+            port: Puerto MySQL (opcional)
+            user: Usuario MySQL (opcional)
+            password: Contraseña MySQL (opcional)
+            database: Base de datos (opcional)
+
+        Returns:
+            int: Cantidad de clientes rankeados
+        """
+        with self._lock:
+            desde = _restar_meses(dt.datetime.now(), self.meses)
+            ultimo_id = ventana_con_archivo(desde, host, port, user, password, database)
+
+            conn = get_connection(host, port, user, password, database, lectura=True)
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    SELECT c.id_usuario, CAST(ROUND(SUM(t.monto) * 100) AS SIGNED)
+                    FROM transaccion t
+                    JOIN cuenta c ON t.id_cuenta_origen = c.id_cuenta
+                    WHERE t.tipo IN (%s, %s)
+                      AND t.fecha >= %s
+                    GROUP BY c.id_usuario
+                """, (*TIPOS, desde))
+                filas = cursor.fetchall()
+                ids = np.fromiter((f[0] for f in filas), dtype=np.int64, count=len(filas))
+                totales = np.fromiter((f[1] for f in filas), dtype=np.int64, count=len(filas))
+
+                if ultimo_id is not None:
+                    archivadas = sumar_por_cuenta_origen(
+                        desde, TIPOS, ultimo_id=ultimo_id, host=host, port=port,
+                        user=user, password=password, database=database)
+                    cursor.execute("SELECT id_cuenta, id_usuario FROM cuenta")
+                    cuenta_usuario = dict(cursor.fetchall())
+                    extra_ids = np.fromiter(
+                        (cuenta_usuario.get(k, -1) for k in archivadas), dtype=np.int64,
+                        count=len(archivadas))
+                    extra_totales = np.fromiter(
+                        (int(v.scaleb(2)) for v in archivadas.values()), dtype=np.int64,
+                        count=len(archivadas))
+                    validos = extra_ids >= 0
+                    todos = np.concatenate([totales, extra_totales[validos]])
+                    ids, inversa = np.unique(np.concatenate([ids, extra_ids[validos]]),
+                                             return_inverse=True)
+                    totales = np.zeros(len(ids), dtype=np.int64)
+                    np.add.at(totales, inversa, todos)
+
+                cursor.execute("SELECT id_usuario, nombre, apellido FROM usuario")
+                nombres = {i: f"{n} {a}" for i, n, a in cursor.fetchall()}
+            finally:
+                cursor.close()
+                conn.close()
+
+            # Orden: total descendente, id ascendente para desempatar
+            orden = np.lexsort((ids, -totales))
+            ids, totales = ids[orden], totales[orden]
+            nuevo = np.ones(len(totales), dtype=bool)
+            nuevo[1:] = totales[1:] != totales[:-1]
+            puestos = (np.maximum.accumulate(np.where(nuevo, np.arange(len(totales)), 0))
+                       + 1).astype(np.int32)
+            nombres_r = np.array([nombres.get(int(i), '') for i in ids], dtype=object)
+            indice_pos = np.argsort(ids, kind='stable').astype(np.int32)
+            self.arreglos = (ids, totales, puestos, nombres_r, ids[indice_pos], indice_pos)
+
+            self.generado = dt.datetime.now()
+            self._refrescado = time.monotonic()
+            return len(ids)
+
+    def asegurar(self, host: str = None, port: int = None,
+                 user: str = None, password: str = None,
+                 database: str = None) -> 'RankingClientes':
+        """Refresca el ranking si nunca se calculó o venció su TTL."""
+        if self.generado is None or time.monotonic() - self._refrescado >= self.ttl:
+            self.refrescar(host, port, user, password, database)
+        return self
+
+    def top(self, n: int = 5) -> List[Dict[str, str]]:
+        """Primeros `n` clientes del ranking.
+
+        Returns:
+            List[Dict[str, str]]: 'Puesto', 'Cliente' y 'Total Movido', como
+                consultas.top_clientes_transacciones()
+        """
+        ids, totales, puestos, nombres, _, _ = self.arreglos
+        return [{'Puesto': str(p), 'Cliente': c, 'Total Movido': f"$ {_monto(t):,.2f}"}
+                for p, c, t in zip(puestos[:n], nombres[:n], totales[:n])]
+
+    def puesto_de(self, id_usuario: int) -> Optional[Dict[str, str]]:
+        """Puesto de un cliente (búsqueda binaria).
+
+        Returns:
+            Optional[Dict[str, str]]: 'Puesto', 'De' (clientes rankeados),
+                'Cliente', 'Total Movido' y 'Percentil' (porcentaje de clientes
+                con puesto igual o peor), o None si el cliente no movió dinero
+                en la ventana
+        """
+        ids, totales, puestos, nombres, indice_ids, indice_pos = self.arreglos
+        k = int(np.searchsorted(indice_ids, id_usuario))
+        if k == len(indice_ids) or indice_ids[k] != id_usuario:
+            return None
+        pos = int(indice_pos[k])
+        puesto, n = int(puestos[pos]), len(ids)
+        return {
+            'Puesto': str(puesto),
+            'De': str(n),
+            'Cliente': nombres[pos],
+            'Total Movido': f"$ {_monto(totales[pos]):,.2f}",
+            'Percentil': f"{100 * (n - puesto + 1) / n:.1f}"
+        }
+
+    def puesto_de_dni(self, dni: str, host: str = None, port: int = None,
+                      user: str = None, password: str = None,
+                      database: str = None) -> Optional[Dict[str, str]]:
+        """Puesto de un cliente a partir de su DNI (ver puesto_de())."""
+        indice = obtener_indice_dni(host, port, database)
+        id_usuario = indice.buscar(dni, host, port, user, password, database)
+        return None if id_usuario is None else self.puesto_de(id_usuario)
+
+    def umbral_percentil(self, p: float) -> Optional[Decimal]:
+        """Total mínimo para estar en el `p`% superior del ranking.
+
+        Ejemplo:
+            >>> obtener_ranking().asegurar().umbral_percentil(10)
+            Decimal('185230.44')
+        """
+        totales = self.arreglos[1]
+        if len(totales) == 0 or not 0 < p <= 100:
+            return None
+        k = max(math.ceil(len(totales) * p / 100), 1)
+        return _monto(totales[k - 1])
+
+
+_rankings: Dict[Tuple[str, int, str], RankingClientes] = {}
+_rankings_lock = threading.Lock()
+
+
+def obtener_ranking(host: str = None, port: int = None,
+                    database: str = None) -> RankingClientes:
+    """Retorna el ranking de una base de datos.
+
+    El proceso mantiene un ranking por destino (host, port, database); los
+    parámetros omitidos se completan con get_db_config().
+    """
+    clave = destino_conexion(host, port, database)
+    ranking = _rankings.get(clave)
+    if ranking is None:
+        with _rankings_lock:
+            ranking = _rankings.setdefault(clave, RankingClientes())
+    return ranking
+
+
+def exportar_ranking(host: str = None, port: int = None,
+                     user: str = None, password: str = None,
+                     database: str = None) -> List[Dict[str, str]]:
+    """Escribe el ranking completo.
+
+    Returns:
+        List[Dict[str, str]]: Igual que RankingClientes.top() con todos los
+            clientes, o un ResultadoError (lista vacía) si hubo un error
+
+    CSV generado: ranking_clientes.csv
+    """
+    try:
+        ranking = obtener_ranking(host, port, database)
+        ranking.asegurar(host, port, user, password, database)
+        data = ranking.top(len(ranking))
+        _write_csv(data, 'ranking_clientes.csv', ['Puesto', 'Cliente', 'Total Movido'])
+        return data
+
+    except Exception as e:
+        print(f"❌ Error en exportar_ranking: {e}")
+        return ResultadoError(str(e))
+
+
+def main():
+    """Calcula el ranking y muestra el top 10 y algunos umbrales."""
+    print("="*70)
+    print("  RANKING DE CLIENTES POR MONTO MOVIDO")
+    print("="*70)
+
+    inicio = time.perf_counter()
+    data = exportar_ranking()
+    if not data:
+        return
+    ranking = obtener_ranking()
+    print(f"\n✅ {len(ranking)} clientes rankeados en {time.perf_counter() - inicio:.2f}s")
+
+    print("\n🏆 TOP 10:")
+    for item in ranking.top(10):
+        print(f"  {item['Puesto']:>4}. {item['Cliente']:<30} {item['Total Movido']:>18}")
+
+    print("\n📈 UMBRALES:")
+    for p in (1, 10, 50):
+        print(f"  Top {p:>2}%: desde {ranking.umbral_percentil(p):,.2f}")
+
+    print("\n✅ Archivo generado: ranking_clientes.csv")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+red_transferencias.py
+
+Analítica de la red de transferencias entre cuentas (id_cuenta_origen →
+id_cuenta_destino de la tabla Transaccion).
+
+Las transferencias de una ventana de fechas se cargan en una adyacencia CSR
+compacta con arreglos NumPy:
+- indptr[c]:indptr[c+1] delimita las aristas salientes de la cuenta c
+- destino[k] y monto[k] describen la arista k
+
+La carga se hace en dos pasadas sin materializar listas de Python: primero se
+obtiene el grado de salida de cada cuenta con un GROUP BY y luego se leen las
+aristas por lotes colocándolas directamente en su posición final. La memoria
+es de ~12 bytes por arista más un lote, lo que permite decenas de millones de
+transferencias.
+
+Si la ventana abarca transacciones movidas al archivo en frío
+(archivo_frio.py), sus transferencias se leen de los Parquet y se suman a
+las de la tabla viva.
+
+Sobre la red se calculan contrapartes principales por cliente, componentes
+conexas, flujos de entrada/salida y detección de ciclos.
+"""
+from typing import List, Dict, Optional
+import datetime as dt
+import numpy as np
+from database import get_connection
+from archivo_frio import ventana_con_archivo, transferencias_archivadas
+from consultas import _write_csv, _restar_meses
+
+
+class RedTransferencias:
+    """Grafo dirigido de transferencias en formato CSR.
+
+    Los nodos son id_cuenta (se indexan directamente, por lo que el tamaño de
+    los arreglos por nodo es el mayor id_cuenta de Cuenta o de las
+    transferencias, más uno). cuenta_usuario traduce cada cuenta a su
+    id_usuario (-1 si la cuenta no existe).
+    """
+
+    def __init__(self, indptr: np.ndarray, destino: np.ndarray,
+                 monto: np.ndarray, cuenta_usuario: np.ndarray):
+        self.indptr = indptr
+        self.destino = destino
+        self.monto = monto
+        self.cuenta_usuario = cuenta_usuario
+
+    @property
+    def n_nodos(self) -> int:
+        """Cantidad de posiciones de nodo (mayor id_cuenta + 1)."""
+        return len(self.indptr) - 1
+
+    @property
+    def n_aristas(self) -> int:
+        """Cantidad de transferencias cargadas."""
+        return len(self.destino)
+
+    def origenes(self) -> np.ndarray:
+        """Expande indptr a un arreglo con la cuenta origen de cada arista."""
+        grados = np.diff(self.indptr)
+        return np.repeat(np.arange(self.n_nodos, dtype=np.int32), grados)
+
+    @classmethod
+    def desde_db(cls, fecha_desde=None, fecha_hasta=None,
+                 tam_lote: int = 100_000,
+                 host: str = None, port: int = None,
+                 user: str = None, password: str = None,
+                 database: str = None) -> 'RedTransferencias':
+        """Construye la red leyendo las transferencias de la base de datos.
+
+        Args:
+            fecha_desde: Fecha mínima (inclusiva) de las transferencias (opcional)
+            fecha_hasta: Fecha máxima (exclusiva) de las transferencias (opcional)
+            tam_lote: Filas leídas por cada fetchmany
+            host: Servidor MySQL (opcional)
+            port: Puerto MySQL (opcional)
+            user: Usuario MySQL (opcional)
+            password: Contraseña MySQL (opcional)
+            database: Base de datos (opcional)
+
+        Returns:
+            RedTransferencias: Red lista para consultar
+        """
+        ultimo_id = ventana_con_archivo(fecha_desde or dt.datetime.min,
+                                        host, port, user, password, database)
+        archivadas = None
+        if ultimo_id is not None:
+            tabla = transferencias_archivadas(fecha_desde, fecha_hasta, ultimo_id, host,
+                                              port, user, password, database)
+            if tabla is not None and tabla.num_rows:
+                archivadas = (
+                    tabla.column('id_cuenta_origen').to_numpy().astype(np.int64),
+                    tabla.column('id_cuenta_destino').to_numpy().astype(np.int32),
+                    np.asarray([float(v) for v in tabla.column('monto').to_pylist()],
+                               dtype=np.float64))
+
+        conn = get_connection(host, port, user, password, database,
+                              lectura=True)
+        cursor = conn.cursor()
+        try:
+            # Fijar el límite superior de id para que ambas pasadas vean
+            # exactamente el mismo conjunto de transferencias.
+            cursor.execute("SELECT COALESCE(MAX(id_transaccion), 0) FROM transaccion")
+            (max_id,) = cursor.fetchone()
+
+            filtro = ["t.tipo = 'transferencia'",
+                      "t.id_cuenta_destino IS NOT NULL",
+                      "t.id_transaccion <= %s"]
+            params: list = [max_id]
+            if fecha_desde is not None:
+                filtro.append("t.fecha >= %s")
+                params.append(fecha_desde)
+            if fecha_hasta is not None:
+                filtro.append("t.fecha < %s")
+                params.append(fecha_hasta)
+            where = " AND ".join(filtro)
+
+            cursor.execute("SELECT id_cuenta, id_usuario FROM cuenta")
+            cuentas = cursor.fetchall()
+
+            # Pasada 1: grado de salida por cuenta → indptr. También trae el
+            # mayor destino de cada origen: sin FKs (particiones.py) puede
+            # haber cuentas de Transaccion que ya no están en Cuenta.
+            cursor.execute(f"""
+                SELECT t.id_cuenta_origen, COUNT(*), MAX(t.id_cuenta_destino)
+                FROM transaccion t
+                WHERE {where}
+                GROUP BY t.id_cuenta_origen
+            """, tuple(params))
+            salientes = cursor.fetchall()
+
+            max_cuenta = max(max((c[0] for c in cuentas), default=0),
+                             max((s[0] for s in salientes), default=0),
+                             max((s[2] for s in salientes), default=0))
+            if archivadas is not None:
+                max_cuenta = max(max_cuenta, int(archivadas[0].max()),
+                                 int(archivadas[1].max()))
+            cuenta_usuario = np.full(max_cuenta + 1, -1, dtype=np.int32)
+            for id_cuenta, id_usuario in cuentas:
+                cuenta_usuario[id_cuenta] = id_usuario
+
+            grados = np.zeros(max_cuenta + 1, dtype=np.int64)
+            for id_cuenta, cantidad, _ in salientes:
+                grados[id_cuenta] = cantidad
+            if archivadas is not None:
+                grados += np.bincount(archivadas[0], minlength=max_cuenta + 1)
+            indptr = np.zeros(max_cuenta + 2, dtype=np.int64)
+            np.cumsum(grados, out=indptr[1:])
+
+            n_aristas = int(indptr[-1])
+            destino = np.empty(n_aristas, dtype=np.int32)
+            monto = np.empty(n_aristas, dtype=np.float64)
+            siguiente = indptr[:-1].copy()
+
+            def colocar(o: np.ndarray, d: np.ndarray, m: np.ndarray) -> None:
+                """Ubica un lote de aristas directamente en su posición CSR."""
+                orden = np.argsort(o, kind='stable')
+                o_ord = o[orden]
+                inicios = np.flatnonzero(np.r_[True, o_ord[1:] != o_ord[:-1]])
+                tamanos = np.diff(np.r_[inicios, len(o_ord)])
+                rango = np.arange(len(o_ord)) - np.repeat(inicios, tamanos)
+
+                pos = siguiente[o_ord] + rango
+                destino[pos] = d[orden]
+                monto[pos] = m[orden]
+                siguiente[o_ord[inicios]] += tamanos
+
+            if archivadas is not None:
+                colocar(*archivadas)
+
+            # Pasada 2: cada lote se ubica directamente en su posición CSR
+            cursor.execute(f"""
+                SELECT t.id_cuenta_origen, t.id_cuenta_destino, t.monto
+                FROM transaccion t
+                WHERE {where}
+            """, tuple(params))
+            while True:
+                lote = cursor.fetchmany(tam_lote)
+                if not lote:
+                    break
+                colocar(np.fromiter((r[0] for r in lote), dtype=np.int64, count=len(lote)),
+                        np.fromiter((r[1] for r in lote), dtype=np.int32, count=len(lote)),
+                        np.fromiter((float(r[2]) for r in lote), dtype=np.float64,
+                                    count=len(lote)))
+        finally:
+            cursor.close()
+            conn.close()
+
+        return cls(indptr, destino, monto, cuenta_usuario)
+
+    def flujos(self) -> Dict[str, np.ndarray]:
+        """Calcula totales de salida y entrada por cuenta.
+
+        Returns:
+            Dict[str, np.ndarray]: Arreglos indexados por id_cuenta con las claves
+                'salida', 'entrada', 'n_salida', 'n_entrada'
+        """
+        n = self.n_nodos
+        return {
+            'salida': np.bincount(self.origenes(), weights=self.monto, minlength=n),
+            'entrada': np.bincount(self.destino, weights=self.monto, minlength=n),
+            'n_salida': np.diff(self.indptr),
+            'n_entrada': np.bincount(self.destino, minlength=n),
+        }
+
+    def contrapartes_principales(self, n: int = 3) -> Dict[int, List[tuple]]:
+        """Obtiene las principales contrapartes de cada cliente.
+
+        Se consideran transferencias enviadas y recibidas; el volumen de una
+        contraparte es la suma de ambos sentidos. Las transferencias entre
+        cuentas del mismo cliente se ignoran.
+
+        Args:
+            n: Cantidad de contrapartes por cliente
+
+        Returns:
+            Dict[int, List[tuple]]: id_usuario → [(id_usuario_contraparte, volumen), ...]
+                ordenado de mayor a menor volumen
+        """
+        u_ori = self.cuenta_usuario[self.origenes()].astype(np.int64)
+        u_des = self.cuenta_usuario[self.destino].astype(np.int64)
+        validas = (u_ori >= 0) & (u_des >= 0) & (u_ori != u_des)
+
+        # Cada transferencia cuenta para ambos clientes involucrados
+        cliente = np.concatenate([u_ori[validas], u_des[validas]])
+        contraparte = np.concatenate([u_des[validas], u_ori[validas]])
+        volumen = np.concatenate([self.monto[validas], self.monto[validas]])
+        if len(cliente) == 0:
+            return {}
+
+        base = int(max(cliente.max(), contraparte.max())) + 1
+        claves, inversa = np.unique(cliente * base + contraparte, return_inverse=True)
+        totales = np.bincount(inversa, weights=volumen)
+        par_cliente = claves // base
+        par_contraparte = claves % base
+
+        orden = np.lexsort((-totales, par_cliente))
+        par_cliente = par_cliente[orden]
+        inicios = np.flatnonzero(np.r_[True, par_cliente[1:] != par_cliente[:-1]])
+        rango = np.arange(len(orden)) - np.repeat(
+            inicios, np.diff(np.r_[inicios, len(orden)]))
+        elegidos = orden[rango < n]
+
+        result: Dict[int, List[tuple]] = {}
+        for k in elegidos:
+            result.setdefault(int(claves[k] // base), []).append(
+                (int(par_contraparte[k]), float(totales[k])))
+        return result
+
+    def componentes_conexas(self) -> np.ndarray:
+        """Etiqueta las componentes débilmente conexas de la red.
+
+        Usa propagación de la etiqueta mínima por las aristas combinada con
+        saltos de puntero, todo vectorizado. Las cuentas sin transferencias
+        quedan como componentes de un solo nodo.
+
+        Returns:
+            np.ndarray: Etiqueta de componente por id_cuenta (la menor cuenta
+                de la componente)
+        """
+        etiqueta = np.arange(self.n_nodos, dtype=np.int64)
+        if self.n_aristas == 0:
+            return etiqueta
+        ori = self.origenes()
+        des = self.destino
+        while True:
+            anterior = etiqueta.copy()
+            minimo = np.minimum(etiqueta[ori], etiqueta[des])
+            np.minimum.at(etiqueta, ori, minimo)
+            np.minimum.at(etiqueta, des, minimo)
+            # Saltos de puntero: cada nodo adopta la etiqueta de su etiqueta
+            while True:
+                saltada = etiqueta[etiqueta]
+                if np.array_equal(saltada, etiqueta):
+                    break
+                etiqueta = saltada
+            if np.array_equal(etiqueta, anterior):
+                return etiqueta
+
+    def nodos_en_ciclos(self) -> np.ndarray:
+        """Detecta las cuentas que participan en ciclos de transferencias.
+
+        Elimina en oleadas vectorizadas las cuentas sin entradas o sin salidas
+        activas (algoritmo de Kahn en ambos sentidos). Lo que sobrevive es el
+        núcleo cíclico: cuentas en ciclos o en caminos entre ciclos.
+
+        Returns:
+            np.ndarray: id_cuenta de las cuentas del núcleo cíclico
+        """
+        n = self.n_nodos
+        ori = self.origenes()
+        des = self.destino
+        activa = np.ones(len(des), dtype=bool)
+        while True:
+            entrada = np.bincount(des[activa], minlength=n)
+            salida = np.bincount(ori[activa], minlength=n)
+            vivo = (entrada > 0) & (salida > 0)
+            nueva = activa & vivo[ori] & vivo[des]
+            if np.array_equal(nueva, activa):
+                break
+            activa = nueva
+        return np.flatnonzero(np.bincount(ori[activa], minlength=n) > 0)
+
+
+def reporte_red_transferencias(fecha_desde=None, fecha_hasta=None,
+                               n_contrapartes: int = 3,
+                               red: Optional[RedTransferencias] = None,
+                               host: str = None, port: int = None,
+                               user: str = None, password: str = None,
+                               database: str = None) -> List[Dict[str, str]]:
+    """Genera el reporte de contrapartes principales por cliente.
+
+    Args:
+        fecha_desde: Fecha mínima (inclusiva) de las transferencias (opcional)
+        fecha_hasta: Fecha máxima (exclusiva) de las transferencias (opcional)
+        n_contrapartes: Contrapartes a listar por cliente
+        red: Red ya cargada para reutilizar (opcional)
+        host: Servidor MySQL (opcional)
+        port: Puerto MySQL (opcional)
+        user: Usuario MySQL (opcional)
+        password: Contraseña MySQL (opcional)
+        database: Base de datos (opcional)
+
+    Returns:
+        List[Dict[str, str]]: Lista de diccionarios con las claves:
+            - 'Cliente': id_usuario del cliente
+            - 'Puesto': Posición de la contraparte (1..n)
+            - 'Contraparte': id_usuario de la contraparte
+            - 'Volumen': Monto transferido en ambos sentidos
+
+    CSV generado: contrapartes_principales.csv
+    """
+    try:
+        if red is None:
+            red = RedTransferencias.desde_db(fecha_desde, fecha_hasta, host=host,
+                                             port=port, user=user,
+                                             password=password, database=database)
+        contrapartes = red.contrapartes_principales(n_contrapartes)
+
+        result: List[Dict[str, str]] = []
+        for id_usuario in sorted(contrapartes):
+            for puesto, (contraparte, volumen) in enumerate(contrapartes[id_usuario], 1):
+                result.append({
+                    'Cliente': str(id_usuario),
+                    'Puesto': str(puesto),
+                    'Contraparte': str(contraparte),
+                    'Volumen': f"$ {volumen:,.2f}"
+                })
+
+        _write_csv(result, 'contrapartes_principales.csv',
+                   ['Cliente', 'Puesto', 'Contraparte', 'Volumen'])
+
+        return result
+
+    except Exception as e:
+        print(f"❌ Error en reporte_red_transferencias: {e}")
+        return []
+
+
+def main():
+    """Carga la red de los últimos 48 meses y muestra un resumen."""
+    print("="*70)
+    print("  RED DE TRANSFERENCIAS ENTRE CUENTAS")
+    print("="*70)
+
+    desde = _restar_meses(dt.datetime.now(), 48)
+    print(f"\n🔎 Cargando transferencias desde {desde:%Y-%m-%d}...")
+    try:
+        red = RedTransferencias.desde_db(fecha_desde=desde)
+    except Exception as e:
+        print(f"❌ Error al cargar la red: {e}")
+        return
+
+    flujos = red.flujos()
+    etiquetas = red.componentes_conexas()
+    con_aristas = (flujos['n_salida'] + flujos['n_entrada']) > 0
+    componentes = np.unique(etiquetas[con_aristas])
+    ciclo = red.nodos_en_ciclos()
+
+    print(f"\n📈 ESTADÍSTICAS:")
+    print(f"   • Transferencias: {red.n_aristas}")
+    print(f"   • Cuentas con transferencias: {int(con_aristas.sum())}")
+    print(f"   • Componentes conexas: {len(componentes)}")
+    print(f"   • Cuentas en ciclos: {len(ciclo)}")
+    print(f"   • Volumen total: $ {flujos['salida'].sum():,.2f}")
+
+    data = reporte_red_transferencias(fecha_desde=desde, red=red)
+    print(f"\n✅ Archivo generado: contrapartes_principales.csv ({len(data)} filas)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+salida.py
+
+Escritura de reportes CSV con compresión en streaming y reemplazo atómico.
+
+La compresión se elige por la extensión del archivo (.gz, .zst, .xz), por el
+parámetro `compresion` o por la variable de entorno REPORTES_COMPRESION
+(gzip, zstd, xz). Sin ninguna de ellas se escribe el CSV plano de siempre.
+
+Las filas se formatean en el hilo que llama y se pasan en bloques, por una
+cola acotada, a un hilo que comprime y escribe en un archivo temporal de la
+misma carpeta. Así el fetch de la consulta y el compresor avanzan en
+paralelo (zlib, lzma y zstd liberan el GIL) y la memoria usada no depende del
+tamaño del reporte. Al terminar se hace fsync y os.replace, de modo que un
+lector nunca ve un reporte a medio escribir.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+import csv
+import gzip
+import io
+import lzma
+import os
+import queue
+import tempfile
+import threading
+
+
+EXTENSIONES = {
+    'gzip': '.gz',
+    'zstd': '.zst',
+    'xz': '.xz',
+}
+
+TAM_BLOQUE = 1 << 20  # bytes de CSV por bloque enviado al compresor
+MAX_BLOQUES = 8       # bloques en vuelo entre productor y compresor
+
+
+def _zstandard():
+    """Importa zstandard o informa cómo instalarlo."""
+    try:
+        import zstandard
+        return zstandard
+    except ImportError as e:
+        raise ImportError("La compresión zstd requiere zstandard: "
+                          "pip install zstandard") from e
+
+
+def compresion_de(ruta: str) -> Optional[str]:
+    """Retorna el algoritmo que corresponde a la extensión de la ruta."""
+    for nombre, extension in EXTENSIONES.items():
+        if ruta.endswith(extension):
+            return nombre
+    return None
+
+
+def ruta_salida(ruta: str, compresion: Optional[str] = None) -> str:
+    """Agrega la extensión de compresión a la ruta si corresponde.
+
+    Args:
+        ruta: Ruta del CSV (puede incluir ya .gz, .zst o .xz)
+        compresion: 'gzip', 'zstd', 'xz' o 'ninguna' (default: REPORTES_COMPRESION)
+
+    Returns:
+        str: Ruta final del archivo
+
+    Ejemplo:
+        >>> ruta_salida('top_clientes.csv', 'gzip')
+        'top_clientes.csv.gz'
+    """
+    if compresion_de(ruta):
+        return ruta
+    compresion = compresion or os.getenv('REPORTES_COMPRESION', '')
+    compresion = compresion.strip().lower()
+    if compresion in ('', 'ninguna', 'none'):
+        return ruta
+    if compresion not in EXTENSIONES:
+        raise ValueError(f"Compresión no soportada: {compresion} "
+                         f"(opciones: {', '.join(EXTENSIONES)})")
+    return ruta + EXTENSIONES[compresion]
+
+
+class ResultadoCSV(list):
+    """Filas de un reporte junto con la ruta del CSV que se escribió.
+
+    Attributes:
+        archivo: Ruta retornada por escribir_csv (None si no se escribió)
+        pendiente: (ruta, fieldnames) del CSV postergado, que escribe
+            guardar() (None si no hay nada pendiente)
+    """
+
+    def __init__(self, filas: Iterable = (), archivo: Optional[str] = None):
+        super().__init__(filas)
+        self.archivo = archivo
+        self.pendiente: Optional[Tuple[str, List[str]]] = None
+
+    def guardar(self) -> Optional[str]:
+        """Escribe el CSV postergado, si lo hay, y retorna la ruta del CSV."""
+        if self.pendiente is not None:
+            ruta, fieldnames = self.pendiente
+            self.archivo = escribir_csv(self, ruta, fieldnames)
+            self.pendiente = None
+        return self.archivo
+
+
+class ResultadoError(list):
+    """Resultado de un reporte que falló.
+
+    Es una lista vacía, así que quien solo pregunta `if not data` lo trata
+    igual que antes; quien necesita distinguir un error de un reporte sin
+    filas (cli.py) mira su tipo.
+
+    Attributes:
+        error: Mensaje del error
+    """
+
+    def __init__(self, error: str):
+        super().__init__()
+        self.error = error
+
+
+def _abrir_compresor(archivo, compresion: Optional[str]):
+    """Envuelve el archivo binario con el compresor indicado."""
+    if compresion == 'gzip':
+        return gzip.GzipFile(fileobj=archivo, mode='wb', compresslevel=6, mtime=0)
+    if compresion == 'xz':
+        return lzma.LZMAFile(archivo, mode='wb', preset=6)
+    if compresion == 'zstd':
+        zstd = _zstandard()
+        return zstd.ZstdCompressor(level=3, threads=-1).stream_writer(archivo, closefd=False)
+    return None
+
+
+def leer_csv(ruta: str) -> List[Dict[str, str]]:
+    """Lee un CSV escrito por escribir_csv (comprimido o no).
+
+    Args:
+        ruta: Ruta del archivo; la compresión se deduce de la extensión
+
+    Returns:
+        List[Dict[str, str]]: Filas del archivo
+    """
+    algoritmo = compresion_de(ruta)
+    if algoritmo == 'gzip':
+        archivo = gzip.open(ruta, 'rb')
+    elif algoritmo == 'xz':
+        archivo = lzma.open(ruta, 'rb')
+    elif algoritmo == 'zstd':
+        archivo = _zstandard().ZstdDecompressor().stream_reader(open(ruta, 'rb'),
+                                                                closefd=True)
+    else:
+        archivo = open(ruta, 'rb')
+    with archivo, io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='') as texto:
+        return list(csv.DictReader(texto))
+
+
+def _compresor(bloques: 'queue.Queue', archivo, compresion: Optional[str],
+               errores: List[BaseException]) -> None:
+    """Hilo consumidor: comprime y escribe los bloques hasta recibir None."""
+    fin = False
+    try:
+        destino = _abrir_compresor(archivo, compresion)
+        salida = destino or archivo
+        while True:
+            bloque = bloques.get()
+            if bloque is None:
+                fin = True
+                break
+            salida.write(bloque)
+        if destino is not None:
+            destino.close()
+    except BaseException as e:
+        errores.append(e)
+        # Vaciar la cola para que el productor no quede bloqueado
+        while not fin:
+            fin = bloques.get() is None
+
+
+def escribir_csv(filas: Iterable[Dict], ruta: str, fieldnames: List[str],
+                 compresion: Optional[str] = None) -> str:
+    """Escribe filas en un CSV (UTF-8 con BOM), opcionalmente comprimido.
+
+    Args:
+        filas: Diccionarios a escribir; puede ser un generador sobre un cursor
+        ruta: Ruta del CSV
+        fieldnames: Columnas en orden
+        compresion: 'gzip', 'zstd', 'xz' o 'ninguna' (default: según la
+            extensión o REPORTES_COMPRESION)
+
+    Returns:
+        str: Ruta final del archivo escrito
+
+    Raises:
+        Exception: Cualquier error de escritura o compresión; en ese caso el
+            archivo previo, si existía, queda intacto.
+    """
+    ruta = ruta_salida(ruta, compresion)
+    algoritmo = compresion_de(ruta)
+    carpeta = os.path.dirname(ruta) or '.'
+    os.makedirs(carpeta, exist_ok=True)
+
+    fd, temporal = tempfile.mkstemp(prefix='.' + os.path.basename(ruta) + '.',
+                                    suffix='.tmp', dir=carpeta)
+    try:
+        os.chmod(temporal, 0o644)
+        with os.fdopen(fd, 'wb') as archivo:
+            bloques: 'queue.Queue' = queue.Queue(maxsize=MAX_BLOQUES)
+            errores: List[BaseException] = []
+            hilo = threading.Thread(target=_compresor, name='compresor-csv',
+                                    args=(bloques, archivo, algoritmo, errores),
+                                    daemon=True)
+            hilo.start()
+            try:
+                buffer = io.StringIO()
+                buffer.write('\ufeff')
+                writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+                writer.writeheader()
+                for fila in filas:
+                    writer.writerow(fila)
+                    if buffer.tell() >= TAM_BLOQUE:
+                        bloques.put(buffer.getvalue().encode('utf-8'))
+                        buffer.seek(0)
+                        buffer.truncate()
+                        if errores:
+                            break
+                if buffer.tell():
+                    bloques.put(buffer.getvalue().encode('utf-8'))
+            finally:
+                bloques.put(None)
+                hilo.join()
+            if errores:
+                raise errores[0]
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        os.replace(temporal, ruta)
+    except BaseException:
+        try:
+            os.remove(temporal)
+        except OSError:
+            pass
+        raise
+    return ruta
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+tarjetas.py
+
+Reporte de tarjetas: utilización del límite de crédito, gasto mensual por
+tarjeta y tarjetas próximas a vencer.
+
+Las transacciones 'compra tarjeta' registran la cuenta origen, no la tarjeta.
+Cada compra se asigna a la tarjeta de esa cuenta vigente a la fecha de la
+compra (fecha_emision <= fecha <= fecha_vencimiento; si hay varias, la de
+mayor id). Las compras sin tarjeta vigente no se asignan.
+
+El gasto se mantiene agregado por tarjeta y mes en gasto_tarjeta_mensual,
+que se actualiza de forma incremental con una marca de agua sobre
+id_transaccion (tabla cubo_estado, compartida con cubo_olap.py) que avanza
+hasta cambios.tope_seguro(). El reporte solo lee ese agregado y usa el índice
+sobre tarjeta.fecha_vencimiento, así que su costo no crece con el volumen de
+compras.
+
+Las tablas e índices se crean con preparar_tarjetas(), una sola vez por
+proceso y base de datos. Después de actualizar el agregado, el reporte lee del primario: una
+réplica atrasada todavía no vería las compras recién agregadas.
+"""
+from typing import List, Dict, Optional, Set, Tuple
+import datetime as dt
+import threading
+from database import destino_conexion, get_connection
+from catalogos import obtener_catalogos
+from cubo_olap import CREAR_TABLA_ESTADO
+from cambios import tope_seguro
+from consultas import _write_csv, _restar_meses
+from salida import ResultadoError
+
+
+CREAR_TABLA_GASTO = """
+    CREATE TABLE IF NOT EXISTS gasto_tarjeta_mensual (
+        id_tarjeta INT NOT NULL,
+        mes DATE NOT NULL,
+        compras INT NOT NULL,
+        monto DECIMAL(18, 2) NOT NULL,
+        PRIMARY KEY (id_tarjeta, mes),
+        KEY idx_gasto_tarjeta_mes (mes)
+    )
+"""
+
+INDICES_TARJETA = [
+    "CREATE INDEX idx_tarjeta_vencimiento ON tarjeta (fecha_vencimiento)",
+    "CREATE INDEX idx_tarjeta_cuenta_vigencia ON tarjeta (id_cuenta, fecha_emision, fecha_vencimiento)",
+]
+
+AGREGAR_COMPRAS = """
+    INSERT INTO gasto_tarjeta_mensual (id_tarjeta, mes, compras, monto)
+    SELECT
+        tj.id_tarjeta,
+        DATE_FORMAT(t.fecha, '%%Y-%%m-01') AS mes,
+        COUNT(*),
+        SUM(t.monto)
+    FROM transaccion t
+    JOIN tarjeta tj ON tj.id_tarjeta = (
+        SELECT MAX(v.id_tarjeta)
+        FROM tarjeta v
+        WHERE v.id_cuenta = t.id_cuenta_origen
+          AND DATE(t.fecha) BETWEEN v.fecha_emision AND v.fecha_vencimiento
+    )
+    WHERE t.tipo = 'compra tarjeta'
+      AND t.id_transaccion > %s AND t.id_transaccion <= %s
+    GROUP BY tj.id_tarjeta, mes
+    ON DUPLICATE KEY UPDATE
+        compras = compras + VALUES(compras),
+        monto = monto + VALUES(monto)
+"""
+
+CONTAR_COMPRAS = """
+    SELECT COUNT(*)
+    FROM transaccion
+    WHERE tipo = 'compra tarjeta'
+      AND id_transaccion > %s AND id_transaccion <= %s
+"""
+
+
+_preparados: Set[Tuple[str, int, str]] = set()
+_preparado_lock = threading.Lock()
+
+
+def preparar_tarjetas(host: str = None, port: int = None,
+                      user: str = None, password: str = None,
+                      database: str = None) -> None:
+    """Crea el agregado, su marca de agua y los índices de tarjeta.
+
+    Se ejecuta una sola vez por proceso y destino (host, port, database); las
+    llamadas siguientes contra la misma base de datos no hacen nada.
+    """
+    destino = destino_conexion(host, port, database)
+    with _preparado_lock:
+        if destino in _preparados:
+            return
+        conn = get_connection(host, port, user, password, database)
+        cursor = conn.cursor()
+        try:
+            cursor.execute(CREAR_TABLA_GASTO)
+            cursor.execute(CREAR_TABLA_ESTADO)
+            cursor.execute("INSERT IGNORE INTO cubo_estado (cubo, ultimo_id) "
+                           "VALUES ('gasto_tarjeta', 0)")
+            for ddl in INDICES_TARJETA:
+                try:
+                    cursor.execute(ddl)
+                except Exception as e:
+                    # 1061: Duplicate key name (el índice ya existe)
+                    if getattr(e, 'errno', None) != 1061:
+                        raise
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+        _preparados.add(destino)
+
+
+def actualizar_gasto_tarjetas(tam_lote: int = 200_000, host: str = None,
+                              port: int = None, user: str = None,
+                              password: str = None, database: str = None) -> int:
+    """Agrega las compras con tarjeta nuevas al gasto mensual por tarjeta.
+
+    Solo se agrega hasta el tope seguro (ver cambios.tope_seguro); si hay
+    escrituras abiertas que no terminan a tiempo, la corrida no agrega nada.
+
+    Args:
+        tam_lote: Ids de transacción por lote
+        host: Servidor MySQL (opcional)
+        port: Puerto MySQL (opcional)
+        user: Usuario MySQL (opcional)
+        password: Contraseña MySQL (opcional)
+        database: Base de datos (opcional)
+
+    Returns:
+        int: Compras con tarjeta procesadas (asignadas o no a una tarjeta),
+            o -1 si hubo un error
+    """
+    try:
+        preparar_tarjetas(host, port, user, password, database)
+        conn = get_connection(host, port, user, password, database)
+        cursor = conn.cursor()
+
+        tope = tope_seguro(conn, 'transaccion', 'id_transaccion')
+        if tope is None:
+            print("⚠️  Hay escrituras en curso sobre transaccion; el gasto se "
+                  "actualizará en la próxima corrida")
+            cursor.close()
+            conn.close()
+            return 0
+
+        procesados = 0
+        while True:
+            cursor.execute("SELECT ultimo_id FROM cubo_estado "
+                           "WHERE cubo = 'gasto_tarjeta' FOR UPDATE")
+            marca = cursor.fetchone()[0]
+            if marca >= tope:
+                conn.rollback()
+                break
+            hasta = min(marca + tam_lote, tope)
+            # Los ids tienen huecos y otros tipos: se cuentan las compras reales
+            cursor.execute(CONTAR_COMPRAS, (marca, hasta))
+            compras = cursor.fetchone()[0]
+            cursor.execute(AGREGAR_COMPRAS, (marca, hasta))
+            cursor.execute("UPDATE cubo_estado SET ultimo_id = %s, actualizado = NOW() "
+                           "WHERE cubo = 'gasto_tarjeta'", (hasta,))
+            conn.commit()
+            procesados += compras
+
+        cursor.close()
+        conn.close()
+        return procesados
+
+    except Exception as e:
+        print(f"❌ Error en actualizar_gasto_tarjetas: {e}")
+        return -1
+
+
+def reporte_tarjetas(mes: Optional[str] = None, meses: int = 12,
+                     dias_vencimiento: int = 90, actualizar: bool = True,
+                     host: str = None, port: int = None,
+                     user: str = None, password: str = None,
+                     database: str = None) -> Dict[str, List[Dict[str, str]]]:
+    """Genera el reporte de tarjetas.
+
+    Args:
+        mes: Mes de referencia 'YYYY-MM' (default: último mes con compras)
+        meses: Meses de historia del gasto mensual, terminando en `mes`
+        dias_vencimiento: Ventana de días para "próximas a vencer"
+        actualizar: Si True, agrega antes las compras nuevas y lee del
+            primario; si False, lee de una réplica
+        host: Servidor MySQL (opcional)
+        port: Puerto MySQL (opcional)
+        user: Usuario MySQL (opcional)
+        password: Contraseña MySQL (opcional)
+        database: Base de datos (opcional)
+
+    Returns:
+        Dict[str, List[Dict[str, str]]]: Diccionario con las claves:
+            - 'Utilización': Tarjetas de crédito con 'Tarjeta', 'Cliente',
+              'Límite', 'Gasto del Mes', 'Utilización' (gasto / límite)
+            - 'Gasto Mensual': 'Tarjeta', 'Tipo', 'Mes', 'Compras', 'Monto'
+            - 'Por Vencer': 'Tarjeta', 'Tipo', 'Cliente', 'Vencimiento',
+              'Días Restantes'
+
+        Si hubo un error, cada clave tiene un ResultadoError (lista vacía).
+
+    CSV generados: tarjetas_utilizacion.csv, tarjetas_gasto_mensual.csv,
+    tarjetas_por_vencer.csv
+    """
+    resultado: Dict[str, List[Dict[str, str]]] = {
+        'Utilización': [], 'Gasto Mensual': [], 'Por Vencer': []}
+    try:
+        if actualizar and actualizar_gasto_tarjetas(
+                host=host, port=port, user=user, password=password,
+                database=database) < 0:
+            return {clave: ResultadoError("no se pudo actualizar el gasto de tarjetas")
+                    for clave in resultado}
+        catalogos = obtener_catalogos(host, port, user, password, database)
+
+        # Recién actualizado, una réplica puede no tener todavía el agregado
+        conn = get_connection(host, port, user, password, database,
+                              lectura=not actualizar)
+        cursor = conn.cursor()
+
+        if mes is None:
+            cursor.execute("SELECT MAX(mes) FROM gasto_tarjeta_mensual")
+            ultimo = cursor.fetchone()[0]
+            referencia = ultimo or dt.date.today().replace(day=1)
+        else:
+            referencia = dt.datetime.strptime(mes, '%Y-%m').date()
+        inicio = _restar_meses(dt.datetime.combine(referencia, dt.time()), meses - 1).date()
+
+        # Utilización del límite en el mes de referencia
+        cursor.execute("""
+            SELECT tj.numero_tarjeta, u.nombre, u.apellido, tj.limite_credito,
+                   c.id_producto, COALESCE(g.monto, 0)
+            FROM tarjeta tj
+            JOIN usuario u ON tj.id_usuario = u.id_usuario
+            JOIN cuenta c ON tj.id_cuenta = c.id_cuenta
+            LEFT JOIN gasto_tarjeta_mensual g
+                   ON g.id_tarjeta = tj.id_tarjeta AND g.mes = %s
+            WHERE tj.tipo = 'crédito' AND tj.limite_credito > 0
+              AND tj.fecha_vencimiento >= %s
+            ORDER BY COALESCE(g.monto, 0) / tj.limite_credito DESC, tj.id_tarjeta
+        """, (referencia, referencia))
+        for numero, nombre, apellido, limite, id_producto, gasto in cursor.fetchall():
+            simbolo = catalogos.moneda_de_producto(id_producto).simbolo
+            resultado['Utilización'].append({
+                'Tarjeta': f"**** {numero[-4:]}",
+                'Cliente': f"{nombre} {apellido}",
+                'Límite': f"{simbolo} {limite:,.2f}",
+                'Gasto del Mes': f"{simbolo} {gasto:,.2f}",
+                'Utilización': f"{gasto / limite * 100:.1f}%"
+            })
+
+        # Gasto mensual por tarjeta (solo el agregado)
+        cursor.execute("""
+            SELECT tj.numero_tarjeta, tj.tipo, c.id_producto, g.mes, g.compras, g.monto
+            FROM gasto_tarjeta_mensual g
+            JOIN tarjeta tj ON g.id_tarjeta = tj.id_tarjeta
+            JOIN cuenta c ON tj.id_cuenta = c.id_cuenta
+            WHERE g.mes BETWEEN %s AND %s
+            ORDER BY tj.id_tarjeta, g.mes
+        """, (inicio, referencia))
+        for numero, tipo, id_producto, mes_gasto, compras, monto in cursor.fetchall():
+            simbolo = catalogos.moneda_de_producto(id_producto).simbolo
+            resultado['Gasto Mensual'].append({
+                'Tarjeta': f"**** {numero[-4:]}",
+                'Tipo': tipo,
+                'Mes': mes_gasto.strftime('%Y-%m'),
+                'Compras': str(compras),
+                'Monto': f"{simbolo} {monto:,.2f}"
+            })
+
+        # Próximas a vencer (rango sobre idx_tarjeta_vencimiento)
+        hoy = dt.date.today()
+        cursor.execute("""
+            SELECT tj.numero_tarjeta, tj.tipo, u.nombre, u.apellido, tj.fecha_vencimiento
+            FROM tarjeta tj
+            JOIN usuario u ON tj.id_usuario = u.id_usuario
+            WHERE tj.fecha_vencimiento BETWEEN %s AND %s
+            ORDER BY tj.fecha_vencimiento, tj.id_tarjeta
+        """, (hoy, hoy + dt.timedelta(days=dias_vencimiento)))
+        for numero, tipo, nombre, apellido, vencimiento in cursor.fetchall():
+            resultado['Por Vencer'].append({
+                'Tarjeta': f"**** {numero[-4:]}",
+                'Tipo': tipo,
+                'Cliente': f"{nombre} {apellido}",
+                'Vencimiento': str(vencimiento),
+                'Días Restantes': str((vencimiento - hoy).days)
+            })
+
+        cursor.close()
+        conn.close()
+
+        # Guardar en CSV
+        _write_csv(resultado['Utilización'], 'tarjetas_utilizacion.csv',
+                   ['Tarjeta', 'Cliente', 'Límite', 'Gasto del Mes', 'Utilización'])
+        _write_csv(resultado['Gasto Mensual'], 'tarjetas_gasto_mensual.csv',
+                   ['Tarjeta', 'Tipo', 'Mes', 'Compras', 'Monto'])
+        _write_csv(resultado['Por Vencer'], 'tarjetas_por_vencer.csv',
+                   ['Tarjeta', 'Tipo', 'Cliente', 'Vencimiento', 'Días Restantes'])
+
+        return resultado
+
+    except Exception as e:
+        print(f"❌ Error en reporte_tarjetas: {e}")
+        return {clave: ResultadoError(str(e))
+                for clave in ('Utilización', 'Gasto Mensual', 'Por Vencer')}
+
+
+def main():
+    """Actualiza el agregado y muestra el reporte de tarjetas."""
+    print("="*70)
+    print("  REPORTE DE TARJETAS")
+    print("="*70)
+
+    reporte = reporte_tarjetas()
+
+    print(f"\n💳 UTILIZACIÓN DEL LÍMITE (Top 10 de {len(reporte['Utilización'])}):")
+    print("-"*70)
+    for item in reporte['Utilización'][:10]:
+        print(f"  {item['Tarjeta']:<10} {item['Cliente']:<25} {item['Límite']:>15} "
+              f"{item['Utilización']:>8}")
+
+    print(f"\n📅 PRÓXIMAS A VENCER ({len(reporte['Por Vencer'])}):")
+    print("-"*70)
+    for item in reporte['Por Vencer'][:10]:
+        print(f"  {item['Tarjeta']:<10} {item['Tipo']:<8} {item['Cliente']:<25} "
+              f"{item['Vencimiento']} ({item['Días Restantes']} días)")
+
+    print(f"\n✅ Archivos generados: tarjetas_utilizacion.csv, "
+          f"tarjetas_gasto_mensual.csv, tarjetas_por_vencer.csv")
+
+
+if __name__ == '__main__':
+    main()